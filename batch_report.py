@@ -0,0 +1,179 @@
+"""
+batch_report.py
+
+Headless report mode: no Tk, no display. For every store it loads the data through overall_insights,
+takes the same top item/ingredient lists and predictions the dashboard shows and writes
+
+    <out>/<store>/report.json         everything below in one file
+    <out>/<store>/earnings.csv        earnings per month
+    <out>/<store>/monthly_top.csv     top items/ingredients and category shares per month, overall and predicted
+    <out>/<store>/predictions.csv     same layout as the dashboard's "Export predictions"
+    <out>/<store>/*.png               earnings line, per-month and predicted bar charts
+    <out>/index.json                  one summary line per store
+
+Charts are rendered with the Agg backend in a process pool. Example (nightly cron):
+
+    python batch_report.py --out reports/$(date +%F) --stores stores.json --workers 8
+
+stores.json maps a store name to {"sale_files": [...], "ingredient_file": ..., "shipment_file": ...};
+without it the bundled Mai Shen Yun files are used.
+"""
+
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from data_loading import SHIPMENT_FILE_NAME, INGREDIENT_FILE_NAME, resolve_workers
+from display_earnings import create_earnings_figure
+from instrumentation import instrumented
+from overall_insights import overall_insights
+from report_data import *
+from store_aggregation import get_file_label, get_month_key, get_month_label, load_stores
+
+TOP_N = 7
+
+# ---------------------------
+# Report data, the same lists the dashboard tabs show
+# ---------------------------
+
+@instrumented()
+def build_store_report(store_name:str, store:dict, top_n:int = TOP_N, use_cache:bool = True) -> dict:
+    insights = overall_insights(use_cache=use_cache, sale_file_names=store["sale_files"], compact=True,
+                                shipment_file_name=store.get("shipment_file", SHIPMENT_FILE_NAME),
+                                ingredient_file_name=store.get("ingredient_file", INGREDIENT_FILE_NAME))
+    overall = get_overall_data(insights, top_n)
+    month = get_month_data(insights, top_n)
+    future = get_future_data(insights, top_n)
+    return {"store": store_name,
+            "months": [get_month_label(path) for path in insights.sale_file_names],
+            "month_keys": [get_month_key(path, store.get("year")) for path in insights.sale_file_names],
+            "earnings": list(overall["profits_data"]),
+            "total_earnings": insights.total_earnings,
+            "overall_top_items": overall["overall_top_items"],
+            "overall_top_ingredients": overall["overall_top_ingredients"],
+            "category_shares": overall["category_shares"],
+            "month_views": month["month_views"],
+            "predicted_profit": future["predicted_profit"],
+            "predicted_top_items": future["predicted_top_items"],
+            "predicted_top_ingredients": future["predicted_top_ingredients"],
+            "all_predicted_items": get_predicted_items(insights, None),
+            "all_predicted_ingredients": get_top(insights, "projected_ingredients", None)}
+
+def write_store_files(report:dict, store_dir:str) -> list:
+    '''Writes the JSON/CSV outputs, returns their paths'''
+    os.makedirs(store_dir, exist_ok=True)
+    paths = [os.path.join(store_dir, name) for name in ("report.json", "earnings.csv", "monthly_top.csv", "predictions.csv")]
+    with open(paths[0], "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(paths[1], "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["month", "earnings"])
+        writer.writerows(zip(report["months"], report["earnings"]))
+    with open(paths[2], "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["month", "kind", "rank", "name", "value"])
+        sections = [("overall", "item", report["overall_top_items"]), ("overall", "ingredient", report["overall_top_ingredients"]),
+                    ("overall", "category_share", report["category_shares"])]
+        for label, view in zip(report["months"], report["month_views"]):
+            sections += [(label, "item", view["items"]), (label, "ingredient", view["ingredients"]),
+                         (label, "category_share", view["categories"])]
+        sections += [("predicted", "item", report["predicted_top_items"]), ("predicted", "ingredient", report["predicted_top_ingredients"])]
+        for label, kind, rows in sections:
+            for rank, (name, value) in enumerate(rows, 1):
+                writer.writerow([label, kind, rank, name, value])
+    write_predictions_csv(paths[3], report["predicted_profit"], report["all_predicted_items"], report["all_predicted_ingredients"])
+    return paths
+
+# ---------------------------
+# Charts: plain picklable jobs so any worker can render them
+# ---------------------------
+
+def get_chart_jobs(report:dict, store_dir:str) -> list:
+    '''(kind, path, title, data) for every chart of one store'''
+    jobs = [("earnings", os.path.join(store_dir, "earnings.png"), f"{report['store']}: Total Monthly Earnings",
+             (report["months"], report["earnings"]))]
+    taken = set()
+    for index, (label, key, view) in enumerate(zip(report["months"], report["month_keys"], report["month_views"])):
+        month_file = get_file_label(key)
+        if month_file in taken: #Same month twice without a year to tell them apart
+            month_file = f"{month_file}_{index + 1}"
+        taken.add(month_file)
+        jobs.append(("bar", os.path.join(store_dir, f"month_{month_file}_items.png"), f"Top Items in {label}", view["items"]))
+        jobs.append(("bar", os.path.join(store_dir, f"month_{month_file}_ingredients.png"), f"Top Ingredients in {label}", view["ingredients"]))
+    jobs.append(("bar", os.path.join(store_dir, "predicted_items.png"), "Predicted Top Menu Items", report["predicted_top_items"]))
+    jobs.append(("bar", os.path.join(store_dir, "predicted_ingredients.png"), "Predicted Top Ingredients", report["predicted_top_ingredients"]))
+    return jobs
+
+def create_bar_figure(title:str, rows:list) -> Figure:
+    fig = Figure(figsize=(8, 4.5), dpi=100)
+    ax = fig.add_subplot()
+    ax.bar(range(len(rows)), [v for n,v in rows])
+    ax.set_xticks(range(len(rows)), [n for n,v in rows], rotation=30, ha='right', fontsize=8)
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
+
+def render_chart(job:tuple) -> str:
+    kind, path, title, data = job
+    if kind == "earnings":
+        months, earnings = data
+        fig = create_earnings_figure(earnings)
+        ax = fig.axes[0]
+        ax.set_title(title)
+        ax.set_xticks(range(len(months)), months, rotation=30, ha='right')
+        fig.tight_layout()
+    else:
+        fig = create_bar_figure(title, data)
+    fig.savefig(path)
+    return path
+
+@instrumented()
+def render_charts(jobs:list, workers = None) -> list:
+    workers = min(resolve_workers(workers), max(1, len(jobs)))
+    if workers <= 1:
+        return [render_chart(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_chart, jobs, chunksize=max(1, len(jobs)//(workers*4))))
+
+# ---------------------------
+# Whole run
+# ---------------------------
+
+def run_reports(out_dir:str, stores:dict, top_n:int = TOP_N, workers = None, use_cache:bool = True) -> dict:
+    '''Reports for every store, returns the index written to out_dir/index.json'''
+    os.makedirs(out_dir, exist_ok=True)
+    index = {"stores": {}}
+    jobs = []
+    for store_name, store in stores.items():
+        store_dir = os.path.join(out_dir, get_file_label(store_name))
+        report = build_store_report(store_name, store, top_n, use_cache)
+        files = write_store_files(report, store_dir)
+        store_jobs = get_chart_jobs(report, store_dir)
+        jobs += store_jobs
+        index["stores"][store_name] = {"directory": store_dir, "months": report["months"],
+                                       "total_earnings": report["total_earnings"],
+                                       "predicted_profit": report["predicted_profit"],
+                                       "files": files + [job[1] for job in store_jobs]}
+    render_charts(jobs, workers) #One pool for every store's charts
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Write CSV/JSON/PNG reports for every store without opening the dashboard")
+    parser.add_argument("--out", default="reports", help="output directory")
+    parser.add_argument("--stores", default=None, help="JSON file mapping store name -> {sale_files, ingredient_file, shipment_file}")
+    parser.add_argument("--top", type=int, default=TOP_N, help="items/ingredients per ranking")
+    parser.add_argument("--workers", type=int, default=None, help="chart rendering processes (default: one per core)")
+    parser.add_argument("--no-cache", action="store_true", help="re-parse every source file")
+    args = parser.parse_args()
+    index = run_reports(args.out, load_stores(args.stores), args.top, args.workers, not args.no_cache)
+    for store_name, store in index["stores"].items():
+        print(f"{store_name}: {len(store['files'])} files in {store['directory']}")
+
+if __name__ == "__main__":
+    main()
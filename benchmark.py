@@ -0,0 +1,146 @@
+"""
+benchmark.py
+
+Times and memory-profiles each stage of the ingest-to-dashboard pipeline on synthetic data.
+
+    python benchmark.py --items 500 --ingredients 40 --months 24 --stores 4
+
+Every stage is run --repeat times for wall/CPU time (best run kept) and once more under
+tracemalloc for peak memory. tracemalloc only sees this process, so a stage's parent_peak_mb leaves
+out whatever its pool workers allocated; worker_max_rss_mb is the largest resident size any worker
+process reached over the whole run (from getrusage, where the platform has it). Results go to
+benchmark_results/<timestamp>.json so runs can be compared over time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from calculate_total import *
+from estimate_future_values import *
+from ingredient_matrix import *
+from ingredient_popularity import *
+from ingredients_processing import process_ingredient_data
+from overall_insights import overall_insights
+from sale_processing import process_sale_data
+from shipment_processing import process_shipment_data
+from store_aggregation import store_rollup
+from synthetic_data import generate_dataset
+
+try:
+    import resource
+except ImportError: #Windows
+    resource = None
+
+RESULTS_DIR = "benchmark_results"
+
+def measure(stage, repeat:int = 3, memory:bool = True) -> tuple:
+    '''Runs stage() and returns (its result, {"wall_s", "cpu_s", "parent_peak_mb"})'''
+    best_wall = best_cpu = None
+    result = None
+    for _ in range(max(1, repeat)):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = stage()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    stats = {"wall_s": best_wall, "cpu_s": best_cpu}
+    if memory:
+        #Separate run so tracemalloc's own overhead doesn't leak into the timings
+        tracemalloc.start()
+        stage()
+        stats["parent_peak_mb"] = tracemalloc.get_traced_memory()[1]/2**20 #This process only, not pool workers
+        tracemalloc.stop()
+    return result, stats
+
+def get_worker_max_rss_mb() -> float:
+    '''Largest resident size of any finished child process so far, None where getrusage isn't available'''
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max_rss/2**20 if sys.platform == "darwin" else max_rss/2**10 #Bytes on macOS, KiB on Linux
+
+def run_benchmarks(dataset:dict, repeat:int = 3, memory:bool = True, workers = None) -> dict:
+    '''Benchmarks every stage separately on the first store, then end to end on all stores'''
+    store = next(iter(dataset["stores"].values()))
+    sale_files = store["sale_files"]
+    stages = {}
+    def run(name, stage):
+        result, stages[name] = measure(stage, repeat, memory)
+        print(f"{name:40s} {stages[name]['wall_s']*1000:10.1f} ms")
+        return result
+
+    sales_data = run("process_sale_data", lambda: [process_sale_data(path) for path in sale_files])
+    ingredient_data = run("process_ingredient_data", lambda: process_ingredient_data(dataset["ingredient_file"]))
+    run("process_shipment_data", lambda: process_shipment_data(dataset["shipment_file"]))
+    monthly_sales = [month_data[1] for month_data in sales_data]
+    item_pops = run("get_monthly_item_popularity", lambda: [get_monthly_item_popularity(sales) for sales in monthly_sales])
+    run("get_monthly_ingredient_popularity", lambda: [get_monthly_ingredient_popularity(sales, ingredient_data) for sales in monthly_sales])
+    ingredient_pops = run("get_all_ingredient_popularities", lambda: get_all_ingredient_popularities(monthly_sales, ingredient_data))
+    yearly_earnings = run("calculate_yearly_earnings", lambda: calculate_yearly_earnings(sales_data))
+    run("calculate_total_item_popularities", lambda: calculate_total_item_popularities(item_pops))
+    run("calculate_total_ingredient_popularities", lambda: calculate_total_ingredient_popularities(ingredient_pops))
+    run("predict_next_monthly_earnings", lambda: predict_next_monthly_earnings(len(yearly_earnings), yearly_earnings))
+    run("predict_all_item_popularities", lambda: predict_all_item_popularities(item_pops, len(item_pops)))
+    run("predict_all_ingredient_popularities", lambda: predict_all_ingredient_popularities(ingredient_pops, len(ingredient_pops)))
+    run("forecast_popularities", lambda: forecast_popularities(item_pops))
+
+    def end_to_end(compact:bool = False):
+        insights = overall_insights(use_cache=False, sale_file_names=sale_files, compact=compact,
+                                    shipment_file_name=dataset["shipment_file"], ingredient_file_name=dataset["ingredient_file"])
+        #Touch what the dashboard reads so the lazy attributes are part of the measurement
+        insights.cube.top_items(3)
+        insights.cube.category_share()
+        insights.top_k("total_ingredients", 3)
+        insights.projected_earnings
+        insights.top_k("projected_ingredients", 7)
+        for month in range(len(insights.sales_data)):
+            insights.cube.top_items(7, month)
+            insights.cube.category_share(month)
+            insights.top_k("ingredients", 7, month)
+        return insights
+    run("end_to_end_single_store", end_to_end)
+    run("end_to_end_single_store_compact", lambda: end_to_end(compact=True)) #What the server and batch reports hold
+    run("end_to_end_all_stores", lambda: store_rollup(dataset["stores"], use_cache=False, workers=workers).month_lists)
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest-to-dashboard pipeline on synthetic data")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--ingredients", type=int, default=20)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--stores", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for the multi-store run")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help=f"result file, defaults to {RESULTS_DIR}/<timestamp>.json")
+    args = parser.parse_args()
+
+    sizes = {"items": args.items, "ingredients": args.ingredients, "months": args.months, "stores": args.stores}
+    with tempfile.TemporaryDirectory() as directory:
+        generate_time = time.perf_counter()
+        dataset = generate_dataset(directory, seed=args.seed, **sizes)
+        generate_time = time.perf_counter() - generate_time
+        print(f"generated {sizes} in {generate_time:.1f} s")
+        stages = run_benchmarks(dataset, args.repeat, not args.no_memory, args.workers)
+
+    results = {"timestamp": datetime.now().isoformat(timespec="seconds"), "sizes": sizes, "repeat": args.repeat,
+               "python": platform.python_version(), "machine": platform.machine(), "cpu_count": os.cpu_count(),
+               "stages": stages, "worker_max_rss_mb": get_worker_max_rss_mb()}
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+if __name__ == "__main__":
+    main()
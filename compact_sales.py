@@ -0,0 +1,191 @@
+from collections.abc import Mapping, Sequence
+import sys
+import numpy as np
+
+RECORD_FIELDS = ("name", "count", "amount")
+
+class name_catalog:
+    '''Interns item/ingredient names into small integer IDs, shared by every month that uses it'''
+
+    def __init__(self, names = ()):
+        self.names = []
+        self.ids = {}
+        self.intern_all(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name:str) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            name = sys.intern(name)
+            self.names.append(name)
+            self.ids[name] = name_id
+        return name_id
+
+    def intern_all(self, names) -> np.ndarray:
+        return np.fromiter((self.intern(name) for name in names), dtype=np.int32)
+
+    def get_name(self, name_id:int) -> str:
+        return self.names[name_id]
+
+#Default catalog when none is passed in; it lives as long as the process and only grows, so long-running
+#callers should pass their own (overall_insights keeps one per instance) or call clear_shared_catalog
+SHARED_CATALOG = name_catalog()
+
+def clear_shared_catalog():
+    '''Starts a fresh SHARED_CATALOG; rows and popularities built before keep the old one they reference'''
+    global SHARED_CATALOG
+    SHARED_CATALOG = name_catalog()
+
+# ---------------------------
+# Month sales: one table of name IDs, counts and amounts
+# ---------------------------
+
+class sale_record(Mapping):
+    '''Read-only {"name", "count", "amount"} view of one row, made on the fly while iterating'''
+    __slots__ = ("sales", "row")
+
+    def __init__(self, sales, row:int):
+        self.sales = sales
+        self.row = row
+
+    def __getitem__(self, field:str):
+        if field == "name":
+            return self.sales.catalog.names[self.sales.name_ids[self.row]]
+        if field == "count":
+            return int(self.sales.counts[self.row])
+        if field == "amount":
+            return float(self.sales.amounts[self.row])
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class month_sales(Sequence):
+    '''Sale rows of one table (group totals or item rows) as typed arrays.
+
+    Behaves like the list of {"name", "count", "amount"} dicts process_sale_data returns, read only,
+    so calculate_monthly_earnings, get_monthly_item_popularity and build_sales_matrix take it as is.
+    A row costs 16 bytes instead of a dict plus three boxed values.
+    '''
+
+    def __init__(self, name_ids:np.ndarray, counts:np.ndarray, amounts:np.ndarray, catalog:name_catalog = None):
+        self.catalog = catalog if catalog is not None else SHARED_CATALOG
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.int32)
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+
+    @classmethod
+    def from_records(cls, records, catalog:name_catalog = None):
+        catalog = catalog if catalog is not None else SHARED_CATALOG
+        return cls(catalog.intern_all(record["name"] for record in records),
+                   np.fromiter((record["count"] for record in records), dtype=np.int32),
+                   np.fromiter((record["amount"] for record in records), dtype=np.float64), catalog)
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return month_sales(self.name_ids[index], self.counts[index], self.amounts[index], self.catalog)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return sale_record(self, index)
+
+    def __iter__(self):
+        return (sale_record(self, row) for row in range(len(self)))
+
+    def get_names(self) -> list:
+        names = self.catalog.names
+        return [names[name_id] for name_id in self.name_ids.tolist()]
+
+    def to_records(self) -> list:
+        return [{"name": name, "count": count, "amount": amount}
+                for name, count, amount in zip(self.get_names(), self.counts.tolist(), self.amounts.tolist())]
+
+    @property
+    def nbytes(self) -> int:
+        return self.name_ids.nbytes + self.counts.nbytes + self.amounts.nbytes
+
+def compact_sale_data(sale_data:tuple, catalog:name_catalog = None) -> tuple:
+    '''(group rows, item rows) from process_sale_data as a pair of month_sales'''
+    return tuple(data if isinstance(data, month_sales) else month_sales.from_records(data, catalog)
+                 for data in sale_data)
+
+def expand_sale_data(sale_data:tuple) -> tuple:
+    '''Back to plain lists of dicts'''
+    return tuple(data.to_records() if isinstance(data, month_sales) else data for data in sale_data)
+
+# ---------------------------
+# Popularities: name -> value as parallel ID/value arrays
+# ---------------------------
+
+class compact_popularity(Mapping):
+    '''Read-only dict-like month popularity (item counts or ingredient usage) keyed through the catalog.
+
+    Keeps the insertion order of the dict it was built from, so rankings break ties the same way.
+    '''
+
+    def __init__(self, name_ids:np.ndarray, values:np.ndarray, catalog:name_catalog = None):
+        self.catalog = catalog if catalog is not None else SHARED_CATALOG
+        self.name_ids = np.asarray(name_ids, dtype=np.int32)
+        self.values_array = np.asarray(values)
+        self.sorted_rows = np.argsort(self.name_ids, kind="stable").astype(np.int32)
+
+    @classmethod
+    def from_dict(cls, popularity:dict, catalog:name_catalog = None):
+        catalog = catalog if catalog is not None else SHARED_CATALOG
+        values = list(popularity.values())
+        dtype = np.int64 if all(isinstance(v, (int, np.integer)) for v in values) else np.float64
+        return cls(catalog.intern_all(popularity.keys()), np.array(values, dtype=dtype), catalog)
+
+    def find_row(self, name) -> int:
+        name_id = self.catalog.ids.get(name)
+        if name_id is None:
+            return -1
+        position = np.searchsorted(self.name_ids, name_id, sorter=self.sorted_rows)
+        if position < len(self.sorted_rows) and self.name_ids[self.sorted_rows[position]] == name_id:
+            return int(self.sorted_rows[position])
+        return -1
+
+    def __getitem__(self, name):
+        row = self.find_row(name)
+        if row < 0:
+            raise KeyError(name)
+        return self.values_array[row].item()
+
+    def __contains__(self, name):
+        return self.find_row(name) >= 0
+
+    def __iter__(self):
+        names = self.catalog.names
+        return iter([names[name_id] for name_id in self.name_ids.tolist()])
+
+    def __len__(self):
+        return len(self.name_ids)
+
+    def keys(self) -> list:
+        return list(self)
+
+    def values(self) -> list:
+        return self.values_array.tolist()
+
+    def items(self) -> list:
+        return list(zip(self, self.values_array.tolist()))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.name_ids.nbytes + self.values_array.nbytes + self.sorted_rows.nbytes
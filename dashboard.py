@@ -10,17 +10,19 @@ Tkinter dashboard that:
 How to connect your processed data:
 - If you already have a matplotlib Figure object for profits, assign it to `profits_fig`
   (set USE_PROFITS_FIG=True and assign profits_fig).
-- Alternatively, save your figure as an image (png) and set PROFITS_IMAGE_PATH to point to it.
-- Or provide the data structures described below and let the script create the figure.
+- Otherwise the earnings Figure is built in memory from `profits_data` and updated in place on refresh.
+- Set PROFITS_IMAGE_PATH to also export the chart as an image (png).
 
 Expected data structures (examples shown in the demo below):
-- overall_top_items: list of (name, count) sorted descending (top 3 used)
+- overall_top_items: list of (name, count) sorted descending (top 3 used), from overall_insights.cube
 - overall_top_ingredients: list of (name, amount)
 - monthly_top_items: dict of month_str -> list of (name,count)
 - monthly_top_ingredients: dict of month_str -> list of (name,amount)
 - predicted_profit: float
 - predicted_top_items, predicted_top_ingredients: lists of (name,predicted_count/amount)
 
+Profiling: run with MSY_TRACE=trace.json to time every load/setup stage; a summary is printed on
+exit and trace.json opens in chrome://tracing or ui.perfetto.dev.
 """
 
 import tkinter as tk
@@ -32,9 +34,15 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use("TkAgg")
+import os
+import queue
 import random
+import threading
 from datetime import datetime
 from overall_insights import *
+from report_data import *
+from file_watcher import apply_changes, directory_watcher, has_changes
+from instrumentation import enable_from_env, format_summary, instrumented, stage, write_trace
 
 # ---------------------------
 # USER CONFIG / PLACE YOUR DATA HERE
@@ -42,33 +50,86 @@ from overall_insights import *
 
 # Option A: If you have a matplotlib Figure object already, set this to True and assign `profits_fig`.
 
-data_insights = overall_insights()
+data_insights = None  # filled in by the background loader once the files are parsed
 
 USE_PROFITS_FIG = False
 profits_fig = None  # replace with your matplotlib.figure.Figure if you have one
 
-# Option B: If you have a saved profit image, set this path (png/jpg)
-PROFITS_IMAGE_PATH = "total_earnings.png"  # e.g. "profits.png"
+# Option B: Set this path (png/jpg) to also write the earnings chart to disk, None skips the export
+PROFITS_IMAGE_PATH = None  # e.g. "total_earnings.png"
 
-profits_data = data_insights.yearly_earnings
+LOAD_WORKERS = 1  # >1 (or None for one per core) parses the month workbooks in a process pool
+WATCH_INTERVAL_MS = 2000  # how often mai-shen-yun-main is checked for new/changed files, None turns hot reload off
 
-# Example processed lists (replace with your actual processed results)
-overall_top_items = sorted(((k, int(v)) for k, v in data_insights.total_pop_items.items()), key=lambda kv: kv[1], reverse=True)
-overall_top_ingredients = sorted(((k, int(v)) for k, v in data_insights.total_pop_ingredients.items()), key=lambda kv: kv[1], reverse=True)
+# Processed lists, empty until the background load fills them in (see apply_data)
+profits_data = []
+overall_top_items = []
+overall_top_ingredients = []
 
-monthly_top_items = data_insights.item_pops
+monthly_top_items = []
+monthly_top_ingredients = []
+month_views = []  # per month: {"items": [(name,count)], "ingredients": [(name,amount)], "categories": [(name,%)]}, ranked ahead of time
+month_labels = []  # month names in the same order, from the workbook file names
 
+OVERALL_TOP_N = 3  # rows shown on the overall tab
+MONTH_TOP_N = 7  # bars / rows shown on the month-by-month tab
+FUTURE_TOP_N = 7  # bars shown on the future prediction tab (tables use the first 5)
 
-monthly_top_ingredients = data_insights.ingredient_pops
-
-predicted_profit = data_insights.projected_earnings
-predicted_top_items = items = sorted(((k, int(v)) for k, v in data_insights.projected_pop_items.items()), key=lambda kv: kv[1], reverse=True)
-predicted_top_ingredients = sorted(((k, int(v)) for k, v in data_insights.projected_pop_ingredients.items()), key=lambda kv: kv[1], reverse=True)
+predicted_profit = 0
+predicted_top_items = []
+predicted_top_ingredients = []
 
 # ---------------------------
 # End of user-editable data
 # ---------------------------
 
+def update_tree_rows(tree, rows):
+    '''Rewrites only the Treeview rows that changed instead of clearing and reinserting them all'''
+    children = tree.get_children()
+    for i, values in enumerate(rows):
+        if i < len(children):
+            if tuple(str(v) for v in tree.item(children[i], "values")) != tuple(str(v) for v in values):
+                tree.item(children[i], values=values)
+        else:
+            tree.insert("", "end", values=values)
+    if len(children) > len(rows):
+        tree.delete(*children[len(rows):])
+
+def apply_data(values:dict):
+    '''Swaps freshly loaded values into the module-level data the tabs read from (Tk thread only)'''
+    globals().update(values)
+
+# Background loading: runs on a worker thread, talks to the Tk thread only through a queue
+def load_data_in_background(messages:queue.Queue, load_id:int):
+    '''Parses everything and posts (load_id, kind, payload) messages as each part becomes ready'''
+    try:
+        insights = overall_insights(workers=LOAD_WORKERS,
+                                    progress=lambda file, done, total: messages.put((load_id, "progress", (file, done, total))))
+        messages.put((load_id, "overall", get_overall_data(insights, OVERALL_TOP_N)))
+        messages.put((load_id, "month", get_month_data(insights, MONTH_TOP_N)))
+        messages.put((load_id, "future", get_future_data(insights, FUTURE_TOP_N)))
+        messages.put((load_id, "done", insights))
+    except Exception as e:
+        messages.put((load_id, "error", e))
+
+def patch_in_background(messages:queue.Queue, load_id:int, patched, changes:dict):
+    '''Patches the copy of insights the Tk thread made with just the changed files and posts it with
+    fresh data for the fields that show them.
+
+    The Tk thread keeps reading the old insights until the "patched" message swaps the copy in.
+    '''
+    try:
+        result = apply_changes(patched, changes)
+        tab_data = {"overall": lambda: get_overall_data(patched, OVERALL_TOP_N),
+                    "month": lambda: get_month_data(patched, MONTH_TOP_N),
+                    "future": lambda: get_future_data(patched, FUTURE_TOP_N)}
+        for tab, fields in result["fields"].items():
+            data = tab_data[tab]()
+            messages.put((load_id, tab, {name: data[name] for name in fields}))
+        messages.put((load_id, "patched", (patched, changes)))
+    except Exception as e:
+        messages.put((load_id, "error", e))
+
 # Utility: create a matplotlib Figure if needed
 def create_profits_figure_from_list(profits_list):
     months = [m for m, v in profits_list]
@@ -88,21 +149,20 @@ def create_profits_figure_from_list(profits_list):
 def get_profits_figure():
     if USE_PROFITS_FIG and profits_fig is not None:
         return profits_fig
-    if PROFITS_IMAGE_PATH:
-        # load the image into a matplotlib figure
-        try:
-            import matplotlib.image as mpimg
-            arr = mpimg.imread(PROFITS_IMAGE_PATH)
-            fig, ax = plt.subplots(figsize=(6,3.5), dpi=100)
-            ax.axis('off')
-            ax.imshow(arr)
-            plt.tight_layout()
-            return fig
-        except Exception as e:
-            print("Failed to load profits image:", e)
+    return create_earnings_figure(profits_data)
+
+# Export the profits chart once it holds data
+def save_profits_figure(fig):
+    if not PROFITS_IMAGE_PATH or not profits_data:
+        return
+    try:
+        fig.savefig(PROFITS_IMAGE_PATH)
+    except Exception as e:
+        print("Failed to save profits image:", e)
 
 # GUI app
 class DashboardApp(ttk.Frame):
+    @instrumented()
     def __init__(self, root):
         super().__init__(root)
         self.root = root
@@ -115,6 +175,16 @@ class DashboardApp(ttk.Frame):
         except:
             pass
 
+        # Toolbar: reload button and load progress
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill='x', padx=6, pady=(6,0))
+        self.reload_btn = ttk.Button(toolbar, text="Reload data", command=self.start_load)
+        self.reload_btn.pack(side='left')
+        self.load_progress = ttk.Progressbar(toolbar, mode='determinate', length=200)
+        self.load_progress.pack(side='left', padx=8)
+        self.status_lbl = ttk.Label(toolbar, text="")
+        self.status_lbl.pack(side='left')
+
         # Notebook (tabs)
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill='both', expand=True, padx=6, pady=6)
@@ -134,19 +204,101 @@ class DashboardApp(ttk.Frame):
 
         self.pack(fill='both', expand=True)
 
+        # Tabs start empty and fill in as the worker thread reports back
+        self.messages = queue.Queue()
+        self.load_id = 0
+        self.loading = False
+        self.patching = False
+        self.watcher = None
+        self.start_load()
+        self.poll_messages()
+        if WATCH_INTERVAL_MS:
+            self.root.after(WATCH_INTERVAL_MS, self.poll_files)
+
+    # ---------------
+    # BACKGROUND LOAD
+    # ---------------
+    def start_load(self):
+        self.load_id += 1  # messages from an older load are ignored
+        self.reload_btn.config(state='disabled')
+        self.load_progress.config(value=0)
+        self.status_lbl.config(text="Loading data...")
+        self.loading = True
+        self.patching = False
+        self.watcher = directory_watcher(DATA_DIR)  # files as of this load, later edits show up as changes
+        threading.Thread(target=load_data_in_background, args=(self.messages, self.load_id), daemon=True).start()
+
+    def poll_messages(self):
+        try:
+            while True:
+                load_id, kind, payload = self.messages.get_nowait()
+                if load_id == self.load_id:
+                    self.handle_message(kind, payload)
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_messages)
+
+    def poll_files(self):
+        # Only a stat per file here, parsing happens on a worker thread
+        if data_insights is not None and not self.loading and not self.patching:
+            changes = self.watcher.poll()
+            if has_changes(changes):
+                self.patching = True
+                self.status_lbl.config(text="Updating changed files...")
+                # Copied here, the worker must not read data_insights while this thread fills in its lazy attributes
+                threading.Thread(target=patch_in_background, args=(self.messages, self.load_id, data_insights.copy(), changes),
+                                 daemon=True).start()
+        self.root.after(WATCH_INTERVAL_MS, self.poll_files)
+
+    def handle_message(self, kind, payload):
+        global data_insights
+        if kind == "progress":
+            file, done, total = payload
+            self.load_progress.config(maximum=total, value=done)
+            self.status_lbl.config(text=f"Loaded {os.path.basename(file)} ({done}/{total})")
+        elif kind == "overall":
+            apply_data(payload)
+            self.refresh_overall()
+        elif kind == "month":
+            apply_data(payload)
+            self.update_month_choices()
+            self.populate_month_view()
+        elif kind == "future":
+            apply_data(payload)
+            self.refresh_future()
+        elif kind == "done":
+            data_insights = payload
+            self.loading = False
+            self.reload_btn.config(state='normal')
+            self.status_lbl.config(text=f"Loaded {len(data_insights.sales_data)} months ({datetime.now().strftime('%H:%M:%S')})")
+        elif kind == "patched":
+            data_insights, changes = payload
+            self.watcher.commit(changes)  # uncommitted changes (a failed patch) are reported again
+            self.patching = False
+            names = [os.path.basename(path) for paths in changes.values() for path in paths]
+            self.status_lbl.config(text=f"Updated {', '.join(names)} ({datetime.now().strftime('%H:%M:%S')})")
+        elif kind == "error":
+            self.loading = False
+            self.patching = False
+            self.reload_btn.config(state='normal')
+            self.status_lbl.config(text="Loading failed")
+            messagebox.showerror("Error", f"Could not load data:\n{payload}")
+
     # ---------------
     # OVERALL
     # ---------------
+    @instrumented()
     def setup_overall_tab(self):
         left = ttk.Frame(self.tab_overall)
         right = ttk.Frame(self.tab_overall, width=280)
         left.pack(side='left', fill='both', expand=True, padx=(8,4), pady=8)
         right.pack(side='right', fill='y', padx=(4,8), pady=8)
 
-        # Matplotlib figure embed
-        fig = get_profits_figure()
-        self.canvas = FigureCanvasTkAgg(fig, master=left)
-        self.canvas.draw()
+        # Matplotlib figure embed, built once and updated in place by refresh_overall
+        self.profits_fig = get_profits_figure()
+        self.canvas = FigureCanvasTkAgg(self.profits_fig, master=left)
+        with stage("DashboardApp.canvas.draw", "render"):
+            self.canvas.draw()
         widget = self.canvas.get_tk_widget()
         widget.pack(fill='both', expand=True)
 
@@ -171,30 +323,27 @@ class DashboardApp(ttk.Frame):
 
         self.refresh_overall()
 
+    @instrumented()
     def refresh_overall(self):
         # populate top items
-        for r in self.items_tree.get_children():
-            self.items_tree.delete(r)
-        for name, cnt in (overall_top_items[:3] if overall_top_items else []):
-            self.items_tree.insert("", "end", values=(name, cnt))
+        update_tree_rows(self.items_tree, overall_top_items[:OVERALL_TOP_N])
 
         # populate top ingredients
-        for r in self.ing_tree.get_children():
-            self.ing_tree.delete(r)
-        for name, amt in (overall_top_ingredients[:3] if overall_top_ingredients else []):
-            self.ing_tree.insert("", "end", values=(name, amt))
+        update_tree_rows(self.ing_tree, overall_top_ingredients[:OVERALL_TOP_N])
 
-        # if profits fig is dynamic, re-embed
-        try:
-            fig = get_profits_figure()
-            self.canvas.figure = fig
-            self.canvas.draw()
-        except Exception as e:
-            print("Could not refresh figure:", e)
+        # if profits fig is dynamic, swap the new numbers into the existing line
+        if self.profits_fig is not profits_fig:
+            try:
+                update_earnings_figure(self.profits_fig, profits_data)
+                self.canvas.draw_idle()
+            except Exception as e:
+                print("Could not refresh figure:", e)
+        save_profits_figure(self.profits_fig)
 
     # ---------------
     # MONTH-BY-MONTH
     # ---------------
+    @instrumented()
     def setup_month_tab(self):
         top = ttk.Frame(self.tab_month)
         bot = ttk.Frame(self.tab_month)
@@ -209,11 +358,14 @@ class DashboardApp(ttk.Frame):
         if month_list:
             self.month_cb.set(month_list[0])
         self.month_cb.bind("<<ComboboxSelected>>", lambda e: self.populate_month_view())
+        self.month_categories = ttk.Label(top, text="", font=("Segoe UI", 9))
+        self.month_categories.pack(side='left', padx=(16,0))
 
 
         self.month_fig, self.month_ax = plt.subplots(figsize=(5,3), dpi=100)
         self.month_canvas = FigureCanvasTkAgg(self.month_fig, master=bot)
         self.month_canvas.get_tk_widget().pack(fill='both', expand=True, pady=(2,2))
+        self.setup_month_chart()
         # Two Treeviews side-by-side for items & ingredients
         left = ttk.Frame(bot)
         right = ttk.Frame(bot)
@@ -239,49 +391,73 @@ class DashboardApp(ttk.Frame):
         # populate initial
         self.populate_month_view()
 
+    @instrumented()
+    def setup_month_chart(self):
+        # One fixed set of bars reused for every month, only heights and labels change
+        positions = list(range(MONTH_TOP_N))
+        self.month_bars = self.month_ax.bar(positions, [0]*MONTH_TOP_N)
+        self.month_ax.set_xlim(-0.5, MONTH_TOP_N-0.5)
+        self.month_ax.set_ylabel("Count")
+        # Everything that changes between months is animated and blitted over a cached background
+        self.month_artists = list(self.month_bars) + [self.month_ax.title, self.month_ax.xaxis, self.month_ax.yaxis]
+        for artist in self.month_artists:
+            artist.set_animated(True)
+        self.month_background = None
+        self.month_canvas.mpl_connect('draw_event', self.on_month_draw)
+
+    def on_month_draw(self, event):
+        # full redraws (first show, resize) refresh the cached background
+        self.month_background = self.month_canvas.copy_from_bbox(self.month_fig.bbox)
+        for artist in self.month_artists:
+            self.month_fig.draw_artist(artist)
+
+    def update_month_choices(self):
+        # months can be added or removed by a reload or a hot-patched workbook
+        if month_labels and list(self.month_cb.cget("values")) != month_labels:
+            current = self.month_cb.get()
+            self.month_cb.config(values=month_labels)
+            self.month_cb.set(current if current in month_labels else month_labels[0])
+
+    @instrumented()
     def populate_month_view(self):
         m = self.month_cb.get()
-        month_names = {"May": 0, "June": 1, "July": 2, "August": 3, "September": 4, "October": 5}
-
-        month_index = month_names[m]
-        d = monthly_top_items[month_index]
-        items = sorted(((k, int(v)) for k, v in d.items()), key=lambda kv: kv[1], reverse=True)[:7]
-
-        # Clear old plot
-        self.month_ax.clear()
-        if items:
-            names = [x[0] for x in items]
-            counts = [x[1] for x in items]
-            self.month_ax.bar(names, counts)
-            self.month_ax.set_title(f"Top Items in {m}")
-            self.month_ax.set_ylabel("Count")
-            self.month_ax.set_xticklabels(names, rotation=0, ha='center')
-
-        self.month_canvas.draw()
-        # clear
-        for r in self.month_items.get_children(): self.month_items.delete(r)
-        for r in self.month_ings.get_children(): self.month_ings.delete(r)
-
-        d = monthly_top_items[month_names[m]]
-        items = [(k, int(v)) for k, v in sorted(d.items(), key=lambda kv: kv[1], reverse=True)]
-        d = monthly_top_ingredients[month_names[m]]
-        ings = [(k, int(v)) for k, v in sorted(d.items(), key=lambda kv: kv[1], reverse=True)]
-
-        if not items:
-            # fallback: empty placeholders
-            items = []
-        if not ings:
-            ings = []
-
-        for name, cnt in items[:7]:
-            self.month_items.insert("", "end", values=(name, cnt))
-        for name, amt in ings[:7]:
-            self.month_ings.insert("", "end", values=(name, amt))
+        if month_labels:
+            month_names = {label: i for i, label in enumerate(month_labels)}
+        else:
+            month_names = {"May": 0, "June": 1, "July": 2, "August": 3, "September": 4, "October": 5}
+
+        month_index = month_names.get(m, len(month_views))
+        view = month_views[month_index] if month_index < len(month_views) else {"items": [], "ingredients": [], "categories": []}
+        items = view["items"]
+
+        # Update the existing bars in place
+        for i, bar in enumerate(self.month_bars):
+            bar.set_height(items[i][1] if i < len(items) else 0)
+            bar.set_visible(i < len(items))
+        names = [x[0] for x in items]
+        self.month_ax.set_xticks(list(range(len(items))), names, rotation=0, ha='center')
+        self.month_ax.set_ylim(0, max([x[1] for x in items], default=0)*1.05 or 1)
+        self.month_ax.set_title(f"Top Items in {m}" if items else "")
+
+        if self.month_background is None:
+            with stage("DashboardApp.month_canvas.draw", "render"):
+                self.month_canvas.draw()
+        else:
+            self.month_canvas.restore_region(self.month_background)
+            for artist in self.month_artists:
+                self.month_fig.draw_artist(artist)
+            self.month_canvas.blit(self.month_fig.bbox)
+
+        update_tree_rows(self.month_items, items)
+        update_tree_rows(self.month_ings, view["ingredients"])
+        categories = view.get("categories", [])[:3]
+        self.month_categories.config(text="Top categories: " + ", ".join(f"{n} {v}%" for n,v in categories) if categories else "")
 
 
     # ---------------
     # FUTURE PREDICTION
     # ---------------
+    @instrumented()
     def setup_future_tab(self):
         frame = ttk.Frame(self.tab_future, padding=10)
         frame.pack(fill='both', expand=True)
@@ -334,6 +510,7 @@ class DashboardApp(ttk.Frame):
 
         self.refresh_future()
 
+    @instrumented()
     def refresh_future(self):
         # predicted profit
         self.pred_profit_lbl.config(text=f"${predicted_profit:,.2f}")
@@ -347,24 +524,20 @@ class DashboardApp(ttk.Frame):
         self.pred_text.insert("1.0", s)
 
         # fill tables
-        for r in self.pred_items_view.get_children(): self.pred_items_view.delete(r)
-        for n,v in predicted_top_items[:5]:
-            self.pred_items_view.insert("", "end", values=(n, v))
-
-        for r in self.pred_ings_view.get_children(): self.pred_ings_view.delete(r)
-        for n,v in predicted_top_ingredients[:5]:
-            self.pred_ings_view.insert("", "end", values=(n, v))
+        update_tree_rows(self.pred_items_view, predicted_top_items[:5])
+        update_tree_rows(self.pred_ings_view, predicted_top_ingredients[:5])
 
         # Draw bar chart for predicted top items
         self.future_ax.clear()
-        names = [n for n,v in predicted_top_items[:7]]
-        vals = [v for n,v in predicted_top_items[:7]]
+        names = [n for n,v in predicted_top_items[:FUTURE_TOP_N]]
+        vals = [v for n,v in predicted_top_items[:FUTURE_TOP_N]]
         self.future_ax.bar(names, vals)
         self.future_ax.set_title("Predicted Top Menu Items")
         self.future_ax.set_ylabel("Projected Count")
         self.future_ax.set_xticklabels(names, rotation=0, ha='center')
         self.month_ax.tick_params(axis='x', labelsize=8)
-        self.future_canvas.draw()
+        with stage("DashboardApp.future_canvas.draw", "render"):
+            self.future_canvas.draw()
 
 
     def export_predictions(self):
@@ -373,27 +546,24 @@ class DashboardApp(ttk.Frame):
                                              title="Save predictions as...")
         if not fname:
             return
+        # the full ranking is only needed here, the tabs keep just the top few
+        all_items = get_predicted_items(data_insights, None) if data_insights else predicted_top_items
+        all_ingredients = get_top(data_insights, "projected_ingredients", None) if data_insights else predicted_top_ingredients
         try:
-            with open(fname, "w", newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Predicted profit", f"{predicted_profit:.2f}"])
-                writer.writerow([])
-                writer.writerow(["Predicted top items","predicted"])
-                for n,v in predicted_top_items:
-                    writer.writerow([n,v])
-                writer.writerow([])
-                writer.writerow(["Predicted top ingredients","predicted"])
-                for n,v in predicted_top_ingredients:
-                    writer.writerow([n,v])
+            write_predictions_csv(fname, predicted_profit, all_items, all_ingredients)
             messagebox.showinfo("Saved", f"Exported predictions to:\n{fname}")
         except Exception as e:
             messagebox.showerror("Error", f"Could not save file:\n{e}")
 
 # Run
 def main():
+    trace_path = enable_from_env()  # MSY_TRACE=trace.json records every stage of this run
     root = tk.Tk()
     app = DashboardApp(root)
     root.mainloop()
+    if trace_path:
+        print(format_summary())
+        print("Trace written to", write_trace(trace_path))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+import numpy as np
+from ingredients_processing import process_ingredient_data
+from sale_processing import SALE_LEVELS, levels_to_sale_data, process_sale_levels
+from shipment_processing import process_shipment_data
+
+CACHE_DIR = ".msy_cache"
+CACHE_VERSION = 4 #Bump when a parser's output changes so old entries stop matching
+
+def file_fingerprint(path:str) -> dict:
+    '''Path, size, mtime and content hash of a source file'''
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+def cache_key(kind:str, fingerprint:dict) -> str:
+    raw = f"{CACHE_VERSION}|{kind}|{fingerprint['path']}|{fingerprint['size']}|{fingerprint['mtime']}|{fingerprint['sha256']}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def slot_path(cache_dir:str, slot:str) -> str:
+    #One small pointer file per source, so parallel loaders never rewrite each other's entries
+    return os.path.join(cache_dir, hashlib.sha256(slot.encode()).hexdigest()[:32] + ".json")
+
+def load_slot(cache_dir:str, slot:str) -> dict:
+    try:
+        with open(slot_path(cache_dir, slot), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_tmp_path(path:str) -> str:
+    #pid + uuid: unique across pool workers and across threads of one process (reload vs hot patch)
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+def write_atomic(path:str, write, mode:str = "wb"):
+    '''write(f) into a private temp file, then rename it over path so readers never see half a file'''
+    tmp_path = get_tmp_path(path)
+    try:
+        with open(tmp_path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_slot(cache_dir:str, slot:str, entry:dict):
+    write_atomic(slot_path(cache_dir, slot), lambda f: json.dump(entry, f), "w")
+
+def entry_path(cache_dir:str, key:str) -> str:
+    return os.path.join(cache_dir, key + ".npz")
+
+def remove_entry(cache_dir:str, key:str):
+    try:
+        os.remove(entry_path(cache_dir, key))
+    except OSError:
+        pass
+
+# ---------------------------
+# Columnar encoders, one per parser output
+# ---------------------------
+
+def records_to_columns(records:list, prefix:str) -> dict:
+    return {prefix + "name": np.array([r["name"] for r in records], dtype=str),
+            prefix + "count": np.array([r["count"] for r in records], dtype=np.int64),
+            prefix + "amount": np.array([r["amount"] for r in records], dtype=np.float64)}
+
+def columns_to_records(columns, prefix:str) -> list:
+    names = columns[prefix + "name"].tolist()
+    counts = columns[prefix + "count"].tolist()
+    amounts = columns[prefix + "amount"].tolist()
+    return [{"name": name, "count": count, "amount": amount} for name, count, amount in zip(names, counts, amounts)]
+
+def encode_sale(levels:dict) -> dict:
+    columns = {}
+    for level in SALE_LEVELS:
+        columns.update(records_to_columns(levels[level], level + "_"))
+    return columns
+
+def decode_sale_levels(columns) -> dict:
+    return {level: columns_to_records(columns, level + "_") for level in SALE_LEVELS}
+
+def decode_sale(columns) -> tuple:
+    return levels_to_sale_data(decode_sale_levels(columns))
+
+def encode_shipment(data:list) -> dict:
+    return {"ingredient": np.array([d["ingredient"] for d in data], dtype=str),
+            "unit_of_shipment": np.array([d["unit_of_shipment"] for d in data], dtype=str),
+            "amount_per_month": np.array([d["amount_per_month"] for d in data], dtype=np.int64),
+            "quantity_per_shipment": np.array([d["quantity_per_shipment"] for d in data], dtype=np.int64),
+            "number_of_shipments": np.array([d["number_of_shipments"] for d in data], dtype=np.int64),
+            "frequency": np.array([d["frequency"] for d in data], dtype=str)}
+
+def decode_shipment(columns) -> list:
+    return [{"ingredient": ingredient, "unit_of_shipment": unit, "amount_per_month": amount,
+             "quantity_per_shipment": quantity, "number_of_shipments": shipments, "frequency": frequency}
+            for ingredient, unit, amount, quantity, shipments, frequency in zip(
+                columns["ingredient"].tolist(), columns["unit_of_shipment"].tolist(), columns["amount_per_month"].tolist(),
+                columns["quantity_per_shipment"].tolist(), columns["number_of_shipments"].tolist(), columns["frequency"].tolist())]
+
+def encode_ingredient(data:dict) -> dict:
+    items = list(data.keys())
+    ingredients = list(data[items[0]].keys()) if items else []
+    quantities = np.array([[data[item][ingredient] for ingredient in ingredients] for item in items], dtype=np.float64)
+    return {"items": np.array(items, dtype=str), "ingredients": np.array(ingredients, dtype=str),
+            "quantities": quantities.reshape(len(items), len(ingredients))}
+
+def decode_ingredient(columns) -> dict:
+    ingredients = columns["ingredients"].tolist()
+    return {item: dict(zip(ingredients, row)) for item, row in zip(columns["items"].tolist(), columns["quantities"].tolist())}
+
+CODECS = {"sale": (process_sale_levels, encode_sale, decode_sale),
+          "shipment": (process_shipment_data, encode_shipment, decode_shipment),
+          "ingredient": (process_ingredient_data, encode_ingredient, decode_ingredient)}
+
+# ---------------------------
+# Public loaders
+# ---------------------------
+
+def load_cached(kind:str, path:str, cache_dir:str = CACHE_DIR, decode = None):
+    '''Returns the parsed output for path, parsing and storing it only when the file changed.
+
+    decode picks another view of the same entry (e.g. decode_sale_levels), so it is parsed only once.
+    '''
+    parse, encode, default_decode = CODECS[kind]
+    decode = decode or default_decode
+    fingerprint = file_fingerprint(path)
+    key = cache_key(kind, fingerprint)
+    slot = f"{kind}|{fingerprint['path']}"
+    old_key = load_slot(cache_dir, slot).get("key")
+    if old_key == key:
+        try:
+            with np.load(entry_path(cache_dir, key), allow_pickle=False) as columns:
+                return decode(columns)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass #Missing or corrupt entry, fall through and rebuild it
+    data = parse(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    columns = encode(data)
+    write_atomic(entry_path(cache_dir, key), lambda f: np.savez(f, **columns))
+    if old_key is not None and old_key != key:
+        remove_entry(cache_dir, old_key) #Source changed, the old entry can never match again
+    save_slot(cache_dir, slot, {"slot": slot, "key": key, **fingerprint})
+    return decode(columns)
+
+def cached_sale_data(path:str, cache_dir:str = CACHE_DIR) -> tuple:
+    return load_cached("sale", path, cache_dir)
+
+def cached_sale_levels(path:str, cache_dir:str = CACHE_DIR) -> dict:
+    return load_cached("sale", path, cache_dir, decode_sale_levels)
+
+def cached_shipment_data(path:str, cache_dir:str = CACHE_DIR) -> list:
+    return load_cached("shipment", path, cache_dir)
+
+def cached_ingredient_data(path:str, cache_dir:str = CACHE_DIR) -> dict:
+    return load_cached("ingredient", path, cache_dir)
+
+def evict_stale_entries(cache_dir:str = CACHE_DIR) -> int:
+    '''Drops entries whose source file is gone or changed, plus orphaned entry files'''
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    live_keys = set()
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(cache_dir, file_name), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = {}
+        kind = entry.get("slot", "").split("|", 1)[0]
+        stale = kind not in CODECS or not os.path.exists(entry.get("path", ""))
+        if not stale:
+            stale = cache_key(kind, file_fingerprint(entry["path"])) != entry["key"]
+        if stale:
+            if "key" in entry:
+                remove_entry(cache_dir, entry["key"])
+            os.remove(os.path.join(cache_dir, file_name))
+            removed += 1
+        else:
+            live_keys.add(entry["key"])
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".npz") and file_name[:-4] not in live_keys:
+            remove_entry(cache_dir, file_name[:-4])
+            removed += 1
+    return removed
@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_cache import cached_ingredient_data, cached_sale_data, cached_sale_levels, cached_shipment_data
+from ingredients_processing import process_ingredient_data
+from instrumentation import add_events, call_recorded, count_rows, is_enabled, stage
+from sale_processing import process_sale_data, process_sale_levels
+from shipment_processing import process_shipment_data
+
+DATA_DIR = "mai-shen-yun-main"
+DATA_YEAR = 2025 #Year of the bundled exports, most of their file names don't carry one
+SALE_FILE_NAMES = [os.path.join(DATA_DIR, name) for name in ["May_Data_Matrix (1).xlsx", "June_Data_Matrix.xlsx",
+                   "July_Data_Matrix (1).xlsx", "August_Data_Matrix (1).xlsx",
+                   "September_Data_Matrix.xlsx", "October_Data_Matrix_20251103_214000.xlsx"]]
+SHIPMENT_FILE_NAME = os.path.join(DATA_DIR, "MSY Data - Shipment.csv")
+INGREDIENT_FILE_NAME = os.path.join(DATA_DIR, "MSY Data - Ingredient.csv")
+
+def get_loaders(use_cache:bool) -> tuple:
+    '''(sale, shipment, ingredient) loaders, going through the on-disk cache when use_cache is set'''
+    if use_cache:
+        return cached_sale_data, cached_shipment_data, cached_ingredient_data
+    return process_sale_data, process_shipment_data, process_ingredient_data
+
+def get_level_loader(use_cache:bool):
+    '''Workbook loader that keeps the group/category/item sheets apart (same cache entry as the sale loader)'''
+    return cached_sale_levels if use_cache else process_sale_levels
+
+def resolve_workers(workers) -> int:
+    '''None means one worker per core'''
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+def load_source_data(sale_file_names:list, shipment_file_name:str, ingredient_file_name:str,
+                     use_cache:bool = True, workers = 1, progress = None) -> tuple:
+    '''Loads every month workbook plus the shipment and ingredient CSVs.
+
+    Workbooks come back as their sheet levels (see process_sale_levels, levels_to_sale_data gives the
+    sale data), in the order of sale_file_names whichever worker finishes first. With more than one
+    worker the workbooks and both CSVs are parsed side by side in a process pool.
+    progress, if given, is called as progress(file_name, files_done, files_total) after each file.
+    '''
+    _, load_shipment, load_ingredient = get_loaders(use_cache)
+    load_sale_levels = get_level_loader(use_cache)
+    total = len(sale_file_names) + 2
+    done = [0]
+    def report(file_name):
+        done[0] += 1
+        if progress is not None:
+            progress(file_name, done[0], total)
+    workers = min(resolve_workers(workers), total)
+    if workers <= 1:
+        sale_levels = []
+        for file in sale_file_names:
+            sale_levels.append(load_recorded("load_sale", load_sale_levels, file))
+            report(file)
+        shipment_data = load_recorded("load_shipment", load_shipment, shipment_file_name)
+        report(shipment_file_name)
+        ingredient_data = load_recorded("load_ingredient", load_ingredient, ingredient_file_name)
+        report(ingredient_file_name)
+        return sale_levels, shipment_data, ingredient_data
+    submit = submit_recorded if is_enabled() else submit_plain
+    with stage("load_source_data.pool", workers=workers), ProcessPoolExecutor(max_workers=workers) as pool:
+        shipment_future = submit(pool, "load_shipment", load_shipment, shipment_file_name)
+        ingredient_future = submit(pool, "load_ingredient", load_ingredient, ingredient_file_name)
+        sale_futures = [submit(pool, "load_sale", load_sale_levels, file) for file in sale_file_names]
+        future_files = dict(zip([shipment_future, ingredient_future] + sale_futures,
+                                [shipment_file_name, ingredient_file_name] + sale_file_names))
+        for future in as_completed(future_files):
+            report(future_files[future]) #Counted on this thread in completion order, pool callbacks would race
+        sale_levels = [get_result(future) for future in sale_futures] #Futures are kept in month order
+        return sale_levels, get_result(shipment_future), get_result(ingredient_future)
+
+# ---------------------------
+# Per-file stages, plain loader calls unless instrumentation is enabled
+# ---------------------------
+
+def load_recorded(name:str, loader, file:str):
+    with stage(name, "file", file=file) as recorded:
+        result = loader(file)
+        recorded.set_rows(count_rows(result))
+    return result
+
+def submit_plain(pool, name:str, loader, file:str):
+    return pool.submit(loader, file)
+
+def submit_recorded(pool, name:str, loader, file:str):
+    future = pool.submit(call_recorded, name, "file", {"file": file}, loader, file)
+    future.recorded = True
+    return future
+
+def get_result(future):
+    '''Result of a submit_* future, moving the worker's events into this process when it was recorded'''
+    if not getattr(future, "recorded", False):
+        return future.result()
+    result, worker_events = future.result()
+    add_events(worker_events)
+    return result
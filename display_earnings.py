@@ -1,18 +1,33 @@
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from instrumentation import instrumented
+
+@instrumented()
+def create_earnings_figure(data:list[float]) -> Figure:
+    '''Builds the monthly earnings line chart as a plain Figure, ready to hand to a canvas'''
+    fig = Figure(figsize=(8, 5))  # Set a nice size for the plot
+    ax = fig.add_subplot()
+    ax.plot(range(len(data)), data, marker='o', linestyle='-')
 
-def graph_earnings(data:list[float]):
-        # Create the plot
-    plt.figure(figsize=(8, 5))  # Set a nice size for the plot
-    plt.plot(range(len(data)), data, marker='o', linestyle='-')
-    
     # Add titles and labels for clarity
-    plt.title("Total Monthly Earnings")
-    plt.xlabel("Month")
-    plt.ylabel("Earnings")
-    plt.grid(True, linestyle='--', alpha=0.6)
-    
-    # Display the plot
-    plt.tight_layout()
-    plt.savefig("total_earnings.png")
+    ax.set_title("Total Monthly Earnings")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Earnings")
+    ax.grid(True, linestyle='--', alpha=0.6)
+    fig.tight_layout()
+    return fig
+
+@instrumented()
+def update_earnings_figure(fig:Figure, data:list[float]):
+    '''Swaps new numbers into the existing line instead of building the chart again'''
+    ax = fig.axes[0]
+    ax.lines[0].set_data(range(len(data)), data)
+    ax.relim()
+    ax.autoscale_view()
+
+@instrumented()
+def graph_earnings(data:list[float], path:str = "total_earnings.png") -> str:
+    '''Optional PNG export of the earnings chart'''
+    create_earnings_figure(data).savefig(path)
+    return path
 def get_total_earnings(data:list[float]):
-    return sum(data)
\ No newline at end of file
+    return sum(data)
@@ -1,27 +1,101 @@
+import numpy as np
+
 def predict_next_monthly_earnings(month_count:int,monthly_earnings:list):
     return sum(monthly_earnings)/month_count
 def predict_all_item_popularities(all_month_item_popularities:list[dict], month_count:int):
-    items_popularity = {}
-    for i in range(len(all_month_item_popularities)):
-        for item in all_month_item_popularities[i].keys():
-            items_popularity[item] = 0
-    for month_item_pop in all_month_item_popularities:
-        for item in month_item_pop.keys():
-            items_popularity[item] += month_item_pop[item]
-    for item in items_popularity.keys():
-        items_popularity[item] /= month_count
-    return items_popularity
+    history, keys = dicts_to_matrix(all_month_item_popularities)
+    return matrix_to_dict(history.sum(axis=0)/month_count, keys)
 def predict_all_ingredient_popularities(all_month_ingredient_popularities:list[dict], month_count:int):
-    ingredient_popularity = {}
-    for i in range(len(all_month_ingredient_popularities)):
-        for item in all_month_ingredient_popularities[i].keys():
-            ingredient_popularity[item] = 0
-    for month_item_pop in all_month_ingredient_popularities:
-        for item in month_item_pop.keys():
-            ingredient_popularity[item] += month_item_pop[item]
-    for item in ingredient_popularity.keys():
-        ingredient_popularity[item] /= month_count
-    #Data looks sus, check tomorrow
-    return ingredient_popularity
-
-            
\ No newline at end of file
+    history, keys = dicts_to_matrix(all_month_ingredient_popularities)
+    return matrix_to_dict(history.sum(axis=0)/month_count, keys)
+
+# ---------------------------
+# Batched forecasting: every series is a column of a months x series matrix
+# ---------------------------
+
+MOVING_AVERAGE_WINDOW = 3
+SMOOTHING_ALPHA = 0.5
+MIN_BACKTEST_HISTORY = 2 #Months a model sees before its first backtest forecast
+
+def dicts_to_matrix(all_month_pops:list[dict]) -> tuple:
+    '''months x series matrix from per-month dicts (missing keys are 0), plus the column keys'''
+    keys = {}
+    for month_pop in all_month_pops:
+        for key in month_pop.keys():
+            if key not in keys:
+                keys[key] = len(keys)
+    history = np.zeros((len(all_month_pops), len(keys)))
+    for month, month_pop in enumerate(all_month_pops):
+        history[month, [keys[key] for key in month_pop.keys()]] = list(month_pop.values())
+    return history, list(keys)
+
+def matrix_to_dict(values:np.ndarray, keys:list) -> dict:
+    return dict(zip(keys, values.tolist()))
+
+def forecast_mean(history:np.ndarray) -> np.ndarray:
+    '''Average month, what the dashboard has always shown'''
+    return history.mean(axis=0)
+
+def forecast_moving_average(history:np.ndarray, window:int = MOVING_AVERAGE_WINDOW) -> np.ndarray:
+    return history[-window:].mean(axis=0)
+
+def forecast_linear_trend(history:np.ndarray) -> np.ndarray:
+    '''Least-squares line through each column, extended one month'''
+    month_count = history.shape[0]
+    if month_count < 2:
+        return history.mean(axis=0)
+    x = np.arange(month_count) - (month_count-1)/2
+    slope = (x @ (history - history.mean(axis=0)))/(x @ x)
+    return history.mean(axis=0) + slope*(month_count - (month_count-1)/2)
+
+def forecast_exponential_smoothing(history:np.ndarray, alpha:float = SMOOTHING_ALPHA) -> np.ndarray:
+    '''Simple exponential smoothing starting from the first month, as one weighted sum over the months'''
+    month_count = history.shape[0]
+    weights = alpha*(1-alpha)**np.arange(month_count-1, -1, -1)
+    weights[0] = (1-alpha)**(month_count-1) #The first month is the starting level
+    return weights @ history
+
+FORECAST_MODELS = {"mean": forecast_mean, "moving_average": forecast_moving_average,
+                   "linear_trend": forecast_linear_trend, "exponential_smoothing": forecast_exponential_smoothing}
+
+def backtest_model(history:np.ndarray, model, min_history:int = MIN_BACKTEST_HISTORY) -> np.ndarray:
+    '''Mean absolute one-step-ahead error per series, refitting on each growing prefix of the history'''
+    month_count = history.shape[0]
+    if month_count <= min_history:
+        return np.full(history.shape[1], np.nan)
+    errors = np.zeros(history.shape[1])
+    for month in range(min_history, month_count):
+        errors += np.abs(model(history[:month]) - history[month])
+    return errors/(month_count - min_history)
+
+def forecast_all(history:np.ndarray, models:dict = None) -> dict:
+    '''Fits every model to every column at once and picks the one with the lowest backtest error per series.
+
+    Returns {"forecasts": {model: array}, "errors": {model: array},
+             "best_model": array of model names, "best_forecast": array}.
+    '''
+    models = models or FORECAST_MODELS
+    names = list(models)
+    history = np.asarray(history, dtype=np.float64)
+    if history.shape[0] == 0:
+        empty = np.zeros(history.shape[1])
+        return {"forecasts": {name: empty for name in names}, "errors": {name: empty for name in names},
+                "best_model": np.array([names[0]]*history.shape[1]), "best_forecast": empty}
+    forecasts = {name: models[name](history) for name in names}
+    errors = {name: backtest_model(history, models[name]) for name in names}
+    error_table = np.vstack([errors[name] for name in names])
+    best = np.argmin(np.where(np.isnan(error_table), np.inf, error_table), axis=0) #No backtest yet: first model
+    forecast_table = np.vstack([forecasts[name] for name in names])
+    return {"forecasts": forecasts, "errors": errors, "best_model": np.array(names)[best],
+            "best_forecast": forecast_table[best, np.arange(history.shape[1])]}
+
+def forecast_popularities(all_month_pops:list[dict], models:dict = None) -> dict:
+    '''forecast_all over per-month dicts, with the best forecast, model and error handed back per key'''
+    history, keys = dicts_to_matrix(all_month_pops)
+    result = forecast_all(history, models)
+    best_errors = np.vstack([result["errors"][name] for name in result["errors"]])
+    model_index = {name: i for i, name in enumerate(result["errors"])}
+    chosen = [model_index[name] for name in result["best_model"].tolist()]
+    return {"forecast": matrix_to_dict(result["best_forecast"], keys),
+            "model": dict(zip(keys, result["best_model"].tolist())),
+            "error": matrix_to_dict(best_errors[chosen, np.arange(len(keys))] if keys else np.zeros(0), keys)}
@@ -0,0 +1,171 @@
+import fnmatch
+import os
+from data_loading import DATA_DIR, DATA_YEAR, get_loaders
+from store_aggregation import get_month_key, month_sort_key
+
+SALE_PATTERN = "*_Data_Matrix*.xlsx"
+SHIPMENT_PATTERN = "MSY Data - Shipment*.csv"
+INGREDIENT_PATTERN = "MSY Data - Ingredient*.csv"
+WATCH_PATTERNS = [SALE_PATTERN, SHIPMENT_PATTERN, INGREDIENT_PATTERN]
+
+#tab -> the report_data fields it shows -> the inputs each is built from, so a change only refreshes
+#the fields (and tabs) that show it; ingredient rankings need the recipes, nothing reads shipments
+TAB_INPUTS = {"overall": {"profits_data": {"sales"}, "overall_top_items": {"sales"},
+                          "overall_top_ingredients": {"sales", "ingredients"}, "category_shares": {"sales"}},
+              "month": {"monthly_top_items": {"sales"}, "monthly_top_ingredients": {"sales", "ingredients"},
+                        "month_views": {"sales", "ingredients"}, "month_labels": {"sales"}},
+              "future": {"predicted_profit": {"sales"}, "predicted_top_items": {"sales"},
+                         "predicted_top_ingredients": {"sales", "ingredients"}}}
+
+def is_temporary(name:str) -> bool:
+    #Excel's "~$May_Data_Matrix.xlsx" lock files and hidden/editor files match the patterns but aren't data
+    return name.startswith("~$") or name.startswith(".")
+
+def get_file_kind(path:str) -> str:
+    '''"sales", "shipment" or "ingredients" from the file name, None for anything else'''
+    name = os.path.basename(path)
+    if is_temporary(name):
+        return None
+    if fnmatch.fnmatch(name, SALE_PATTERN):
+        return "sales"
+    if fnmatch.fnmatch(name, SHIPMENT_PATTERN):
+        return "shipment"
+    if fnmatch.fnmatch(name, INGREDIENT_PATTERN):
+        return "ingredients"
+    return None
+
+def scan_directory(directory:str, patterns:list = WATCH_PATTERNS) -> dict:
+    '''path -> (size, mtime_ns) for every matching file, one stat per file and no reads'''
+    found = {}
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return found
+    for entry in entries:
+        if is_temporary(entry.name):
+            continue
+        if entry.is_file() and any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+            stat = entry.stat()
+            found[os.path.join(directory, entry.name)] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+class directory_watcher:
+    '''Polls a directory for added, changed and removed source files.
+
+    A file is only reported once its size and mtime held still for one poll, so a workbook that is
+    still being copied in is picked up on the poll after it finishes instead of half written. Reported
+    changes count as seen only once commit() is called for them, so a change that failed to apply is
+    reported again (after it holds still for another poll).
+    '''
+
+    def __init__(self, directory:str = DATA_DIR, patterns:list = WATCH_PATTERNS):
+        self.directory = directory
+        self.patterns = patterns
+        self.known = scan_directory(directory, patterns)
+        self.pending = {}
+        self.reported = {} #path -> fingerprint polled but not committed yet, None for a removal
+
+    def poll(self) -> dict:
+        '''{"added": [...], "changed": [...], "removed": [...]} since the last commit, lists may be empty'''
+        current = scan_directory(self.directory, self.patterns)
+        changes = {"added": [], "changed": [], "removed": []}
+        for path, fingerprint in current.items():
+            if self.known.get(path) == fingerprint:
+                self.pending.pop(path, None)
+                continue
+            if self.pending.get(path) != fingerprint:
+                self.pending[path] = fingerprint #Seen moving, wait for it to settle
+                continue
+            del self.pending[path]
+            changes["added" if path not in self.known else "changed"].append(path)
+            self.reported[path] = fingerprint
+        for path in self.known:
+            if path not in current:
+                self.pending.pop(path, None)
+                changes["removed"].append(path)
+                self.reported[path] = None
+        return changes
+
+    def commit(self, changes:dict):
+        '''Records changes from poll() as applied, call it only once they were'''
+        for path in changes.get("added", []) + changes.get("changed", []) + changes.get("removed", []):
+            if path not in self.reported:
+                continue
+            fingerprint = self.reported.pop(path)
+            if fingerprint is None:
+                self.known.pop(path, None)
+            else:
+                self.known[path] = fingerprint
+
+def has_changes(changes:dict) -> bool:
+    return any(changes.values())
+
+# ---------------------------
+# Patching a running overall_insights
+# ---------------------------
+
+def same_file(a:str, b:str) -> bool:
+    return a is not None and b is not None and os.path.abspath(a) == os.path.abspath(b)
+
+def find_month(insights, path:str) -> int:
+    for index, file_name in enumerate(insights.sale_file_names):
+        if same_file(file_name, path):
+            return index
+    return -1
+
+def get_insert_index(insights, path:str, year:int = DATA_YEAR) -> int:
+    '''Position that keeps the months in date order, by year-qualified month keys (see get_month_key)'''
+    key = month_sort_key(get_month_key(path, year))
+    for index, file_name in enumerate(insights.sale_file_names):
+        if file_name is not None and month_sort_key(get_month_key(str(file_name), year)) > key:
+            return index
+    return len(insights.sale_file_names)
+
+def get_changed_fields(inputs:set) -> dict:
+    '''tab -> fields that read from any of inputs, tabs with none left out'''
+    changed = {}
+    for tab, fields in TAB_INPUTS.items():
+        names = [name for name, field_inputs in fields.items() if field_inputs & inputs]
+        if names:
+            changed[tab] = names
+    return changed
+
+def apply_changes(insights, changes:dict, year:int = DATA_YEAR) -> dict:
+    '''Re-parses only the changed files and patches insights in place.
+
+    Sales workbooks go through replace_month/insert_month/remove_month so only that month and the
+    running totals are touched; a new recipe or shipment CSV replaces that input and invalidates
+    what was built from it. year places new month files that don't name one. Returns {"inputs":
+    kinds that changed, "months": indexes patched, "tabs": dashboard tabs to refresh, "fields":
+    tab -> the fields of it to refresh}.
+    '''
+    _, load_shipment, load_ingredient = get_loaders(insights.use_cache)
+    inputs = set()
+    months = []
+    for path in changes.get("removed", []):
+        index = find_month(insights, path)
+        if index >= 0:
+            insights.remove_month(index)
+            inputs.add("sales")
+    for path in changes.get("added", []) + changes.get("changed", []):
+        kind = get_file_kind(path)
+        if kind == "sales":
+            month_data, category_rows = insights.load_month(path)
+            index = find_month(insights, path)
+            if index >= 0:
+                insights.replace_month(index, month_data, category_rows=category_rows)
+            else:
+                index = get_insert_index(insights, path, year)
+                insights.insert_month(index, month_data, path, category_rows)
+            months.append(index)
+        elif kind == "ingredients" and same_file(path, insights.ingredient_file_name):
+            insights.ingredient_data = load_ingredient(path)
+            insights.invalidate("ingredient_data")
+        elif kind == "shipment" and same_file(path, insights.shipment_file_name):
+            insights.shipment_data = load_shipment(path)
+            insights.invalidate("shipment_data")
+        else:
+            continue
+        inputs.add(kind)
+    fields = get_changed_fields(inputs)
+    return {"inputs": sorted(inputs), "months": months, "tabs": list(fields), "fields": fields}
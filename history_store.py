@@ -0,0 +1,316 @@
+"""
+history_store.py
+
+Persistent month history on disk, so long multi-store histories can be queried without the
+spreadsheets and without holding them in RAM.
+
+Each store is a directory of fixed-layout binary column files, one row per ingested month:
+
+    segment<n>.earnings.f8              calculate_monthly_earnings of the month
+    segment<n>.item_counts.i8           month x item counts (as get_monthly_item_popularity)
+    segment<n>.item_amounts.f8          month x item amounts
+    segment<n>.ingredient_usage.f8      month x ingredient usage (as the ingredient popularities)
+    meta.json                           name catalogs, row labels and segments
+
+Rows are only ever appended. A row holds a fixed number of item/ingredient slots (the segment
+capacity); once the catalog outgrows it a new segment with twice the slots starts and older files
+stay as they are. Files are opened with np.memmap, so a query like the last 24 months of two items
+only touches the pages holding those cells.
+
+Rows are keyed by year-qualified month ("2025-05", see get_month_key), so the same month of two
+years is two rows rather than one replacing the other.
+
+    python history_store.py ingest --root history [--stores stores.json]
+    python history_store.py query --root history --store "Mai Shen Yun" --column item_amounts --names Ramen --last 24
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from data_loading import SHIPMENT_FILE_NAME, INGREDIENT_FILE_NAME
+from ingredient_matrix import REMOVED_VALUES
+from store_aggregation import MONTH_NAMES, get_file_label, get_month_key, load_stores, month_sort_key
+
+HISTORY_VERSION = 2 #2: rows keyed "YYYY-MM" instead of the bare month name
+ITEM_CAPACITY = 1024
+INGREDIENT_CAPACITY = 256
+#column -> (catalog it is indexed by, dtype), earnings has one value per row
+COLUMNS = {"earnings": (None, np.float64), "item_counts": ("items", np.int64),
+           "item_amounts": ("items", np.float64), "ingredient_usage": ("ingredients", np.float64)}
+
+def get_monthly_item_amounts(data) -> dict:
+    '''Amounts keyed like get_monthly_item_popularity, from the row whose count it kept'''
+    amounts = {}
+    counts = {}
+    for item in data:
+        name = item["name"]
+        if name not in REMOVED_VALUES and item["count"] >= counts.get(name, item["count"]):
+            counts[name] = item["count"]
+            amounts[name] = item["amount"]
+    return amounts
+
+class history_store:
+    '''One store's append-only month history, see the module notes for the layout'''
+
+    def __init__(self, directory:str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self.read_meta()
+        self.catalogs = {kind: {name: i for i, name in enumerate(self.meta[kind])} for kind in ("items", "ingredients")}
+        self.maps = {}
+
+    def read_meta(self) -> dict:
+        path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(path):
+            return {"version": HISTORY_VERSION, "items": [], "ingredients": [], "rows": [], "segments": []}
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != HISTORY_VERSION:
+            raise ValueError(f"{path} is history version {meta.get('version')}, expected {HISTORY_VERSION}")
+        return meta
+
+    def write_meta(self):
+        path = os.path.join(self.directory, "meta.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, path) #The new rows count only once this lands
+
+    # ---------------
+    # Layout
+    # ---------------
+    def get_file(self, segment:dict, column:str) -> str:
+        return os.path.join(self.directory, f"{segment['name']}.{column}.{np.dtype(COLUMNS[column][1]).str[1:]}")
+
+    def get_width(self, segment:dict, column:str) -> int:
+        kind = COLUMNS[column][0]
+        return 1 if kind is None else segment[kind]
+
+    def get_segment_rows(self, index:int) -> int:
+        segments = self.meta["segments"]
+        end = segments[index + 1]["first_row"] if index + 1 < len(segments) else len(self.meta["rows"])
+        return end - segments[index]["first_row"]
+
+    def get_map(self, index:int, column:str) -> np.ndarray:
+        '''Read-only memmap of one column of one segment, (rows, width)'''
+        segment = self.meta["segments"][index]
+        rows = self.get_segment_rows(index)
+        cached = self.maps.get((index, column))
+        if cached is not None and cached[0] == rows:
+            return cached[1]
+        width = self.get_width(segment, column)
+        if rows == 0:
+            array = np.zeros((0, width), dtype=COLUMNS[column][1])
+        else:
+            array = np.memmap(self.get_file(segment, column), dtype=COLUMNS[column][1], mode="r", shape=(rows, width))
+        self.maps[(index, column)] = (rows, array)
+        return array
+
+    # ---------------
+    # Writing
+    # ---------------
+    def intern(self, kind:str, names) -> list:
+        catalog = self.catalogs[kind]
+        indexes = []
+        for name in names:
+            if name not in catalog:
+                catalog[name] = len(self.meta[kind])
+                self.meta[kind].append(name)
+            indexes.append(catalog[name])
+        return indexes
+
+    def get_write_segment(self) -> int:
+        '''Current segment, or a new wider one when the catalogs no longer fit'''
+        segments = self.meta["segments"]
+        items, ingredients = len(self.meta["items"]), len(self.meta["ingredients"])
+        if segments and segments[-1]["items"] >= items and segments[-1]["ingredients"] >= ingredients:
+            return len(segments) - 1
+        last = segments[-1] if segments else {"items": ITEM_CAPACITY//2, "ingredients": INGREDIENT_CAPACITY//2}
+        segments.append({"name": f"segment{len(segments)}", "first_row": len(self.meta["rows"]),
+                         "items": max(last["items"]*2, items), "ingredients": max(last["ingredients"]*2, ingredients)})
+        return len(segments) - 1
+
+    def append_month(self, label:str, earnings:float, item_counts:dict, item_amounts:dict, ingredient_usage:dict):
+        '''Adds one month as a new row. Appending a label again supersedes the older row in queries'''
+        values = {"item_counts": (self.intern("items", item_counts.keys()), list(item_counts.values())),
+                  "item_amounts": (self.intern("items", item_amounts.keys()), list(item_amounts.values())),
+                  "ingredient_usage": (self.intern("ingredients", ingredient_usage.keys()), list(ingredient_usage.values()))}
+        index = self.get_write_segment()
+        segment = self.meta["segments"][index]
+        rows = self.get_segment_rows(index)
+        for column, (_, dtype) in COLUMNS.items():
+            row = np.zeros(self.get_width(segment, column), dtype=dtype)
+            if column == "earnings":
+                row[0] = earnings
+            else:
+                row[values[column][0]] = values[column][1]
+            path = self.get_file(segment, column)
+            with open(path, "ab") as f:
+                f.truncate(rows*row.nbytes) #Drops a half-written row left by an interrupted append
+                f.seek(rows*row.nbytes)
+                f.write(row.tobytes())
+        self.meta["rows"].append(label)
+        self.write_meta()
+
+    def append_insights(self, insights, year:int = None, labels:list = None, skip_existing:bool = True) -> list:
+        '''Appends every month of an overall_insights, returns the labels written.
+
+        A month's label is get_month_key of its file, the year coming from the file name or year;
+        labels (one per month) overrides that. A month whose year can't be told raises ValueError
+        rather than landing on another year's row.
+        '''
+        if labels is not None and len(labels) != len(insights.sale_file_names):
+            raise ValueError(f"Got {len(labels)} labels for {len(insights.sale_file_names)} months")
+        written = []
+        for index, file_name in enumerate(insights.sale_file_names):
+            if labels is not None:
+                label = labels[index]
+            elif file_name is None or get_month_key(str(file_name), year) in MONTH_NAMES:
+                raise ValueError(f"No year for month {index} ({file_name}), pass year or labels")
+            else:
+                label = get_month_key(str(file_name), year)
+            if skip_existing and label in self.meta["rows"]:
+                continue
+            self.append_month(label, insights.yearly_earnings[index], insights.item_pops[index],
+                              get_monthly_item_amounts(insights.sales_data[index][1]), insights.ingredient_pops[index])
+            written.append(label)
+        return written
+
+    # ---------------
+    # Queries
+    # ---------------
+    @property
+    def months(self) -> list:
+        '''Month labels in the order first ingested'''
+        return list(dict.fromkeys(self.meta["rows"]))
+
+    @property
+    def items(self) -> list:
+        return list(self.meta["items"])
+
+    @property
+    def ingredients(self) -> list:
+        return list(self.meta["ingredients"])
+
+    def get_rows(self, months:list = None, last:int = None) -> tuple:
+        '''(labels, row of the latest version of each), optionally limited to months and/or the last few'''
+        latest = {}
+        for row, label in enumerate(self.meta["rows"]):
+            latest[label] = row
+        labels = self.months if months is None else [label for label in months if label in latest]
+        if last is not None:
+            labels = labels[-last:] if last > 0 else []
+        return labels, [latest[label] for label in labels]
+
+    def query(self, column:str, names:list = None, months:list = None, last:int = None) -> dict:
+        '''{"months", "names", "values": months x names array} for one column.
+
+        Only the requested cells are read from the memory maps. Names never seen read as 0.
+        '''
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column '{column}', expected one of {list(COLUMNS)}")
+        kind = COLUMNS[column][0]
+        if kind is None:
+            names = ["earnings"]
+            indexes = np.zeros(1, dtype=np.int64)
+        else:
+            names = list(self.meta[kind]) if names is None else list(names)
+            indexes = np.array([self.catalogs[kind].get(name, -1) for name in names], dtype=np.int64)
+        labels, rows = self.get_rows(months, last)
+        values = np.zeros((len(rows), len(names)), dtype=COLUMNS[column][1])
+        rows = np.array(rows, dtype=np.int64)
+        for index, segment in enumerate(self.meta["segments"]):
+            in_segment = np.nonzero((rows >= segment["first_row"]) & (rows < segment["first_row"] + self.get_segment_rows(index)))[0]
+            if len(in_segment) == 0:
+                continue
+            width = self.get_width(segment, column)
+            columns = np.nonzero((indexes >= 0) & (indexes < width))[0] #Names added after this segment stay 0
+            values[np.ix_(in_segment, columns)] = self.get_map(index, column)[np.ix_(rows[in_segment] - segment["first_row"], indexes[columns])]
+        return {"months": labels, "names": names, "values": values}
+
+    def earnings(self, months:list = None, last:int = None) -> dict:
+        '''month label -> earnings'''
+        result = self.query("earnings", months=months, last=last)
+        return dict(zip(result["months"], result["values"][:, 0].tolist()))
+
+    def get_month(self, column:str, month:str) -> dict:
+        '''One month of a column as a name -> value dict, leaving out zeros'''
+        result = self.query(column, months=[month])
+        if not result["months"]:
+            raise KeyError(month)
+        return {name: value for name, value in zip(result["names"], result["values"][0].tolist()) if value}
+
+    def totals(self, column:str, names:list = None, months:list = None, last:int = None) -> dict:
+        result = self.query(column, names, months, last)
+        return dict(zip(result["names"], result["values"].sum(axis=0).tolist()))
+
+# ---------------------------
+# Several stores under one root
+# ---------------------------
+
+def open_stores(root:str) -> dict:
+    '''store name -> history_store for every store directory under root'''
+    stores = {}
+    if os.path.isdir(root):
+        for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+            meta_path = os.path.join(entry.path, "meta.json")
+            if entry.is_dir() and os.path.exists(meta_path):
+                with open(meta_path, encoding="utf-8") as f:
+                    stores[json.load(f).get("store", entry.name)] = history_store(entry.path)
+    return stores
+
+def open_store(root:str, store_name:str) -> history_store:
+    store = history_store(os.path.join(root, get_file_label(store_name)))
+    if store.meta.get("store") != store_name:
+        store.meta["store"] = store_name
+        store.write_meta()
+    return store
+
+def query_stores(root:str, column:str, names:list = None, months:list = None, last:int = None) -> dict:
+    '''query() on every store, plus the chain total per month label'''
+    results = {store_name: store.query(column, names, months, last) for store_name, store in open_stores(root).items()}
+    all_months = sorted({month for result in results.values() for month in result["months"]}, key=month_sort_key)
+    all_names = list(dict.fromkeys(name for result in results.values() for name in result["names"]))
+    total = np.zeros((len(all_months), len(all_names)))
+    month_index = {month: i for i, month in enumerate(all_months)}
+    name_index = {name: j for j, name in enumerate(all_names)}
+    for result in results.values():
+        total[np.ix_([month_index[m] for m in result["months"]], [name_index[n] for n in result["names"]])] += result["values"]
+    return {"stores": results, "total": {"months": all_months, "names": all_names, "values": total}}
+
+def ingest_stores(root:str, stores:dict, use_cache:bool = True) -> dict:
+    '''Loads each store's workbooks once and appends the months its history doesn't have yet'''
+    from overall_insights import overall_insights
+    written = {}
+    for store_name, store in stores.items():
+        insights = overall_insights(use_cache=use_cache, sale_file_names=store["sale_files"],
+                                    shipment_file_name=store.get("shipment_file", SHIPMENT_FILE_NAME),
+                                    ingredient_file_name=store.get("ingredient_file", INGREDIENT_FILE_NAME))
+        written[store_name] = open_store(root, store_name).append_insights(insights, store.get("year"))
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only memory-mapped month history")
+    parser.add_argument("command", choices=["ingest", "query"])
+    parser.add_argument("--root", default="history")
+    parser.add_argument("--stores", default=None, help="ingest: JSON file of stores, see batch_report.py")
+    parser.add_argument("--store", default=None, help="query: one store, all stores summed when left out")
+    parser.add_argument("--column", default="item_counts", choices=list(COLUMNS))
+    parser.add_argument("--names", nargs="*", default=None)
+    parser.add_argument("--last", type=int, default=None)
+    args = parser.parse_args()
+    if args.command == "ingest":
+        for store_name, labels in ingest_stores(args.root, load_stores(args.stores)).items():
+            print(f"{store_name}: appended {labels}")
+        return
+    if args.store is not None:
+        result = open_store(args.root, args.store).query(args.column, args.names, last=args.last)
+    else:
+        result = query_stores(args.root, args.column, args.names, last=args.last)["total"]
+    print("month," + ",".join(result["names"]))
+    for month, row in zip(result["months"], result["values"].tolist()):
+        print(month + "," + ",".join(str(v) for v in row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import difflib
+import numpy as np
+from compact_sales import month_sales
+
+REMOVED_VALUES = ["Drink","Water","Appetizer"]
+
+class recipe_matrix:
+    '''Recipe table from process_ingredient_data as an items x ingredients array with name -> index maps'''
+
+    def __init__(self, item_ingredient_quantity:dict):
+        self.items = [item for item in item_ingredient_quantity.keys() if item not in REMOVED_VALUES]
+        self.ingredients = []
+        for item in self.items:
+            for ingredient in item_ingredient_quantity[item].keys():
+                if ingredient not in REMOVED_VALUES and ingredient not in self.ingredients:
+                    self.ingredients.append(ingredient)
+        self.item_index = {item: i for i, item in enumerate(self.items)}
+        self.ingredient_index = {ingredient: j for j, ingredient in enumerate(self.ingredients)}
+        self.quantities = np.zeros((len(self.items), len(self.ingredients)))
+        for item, i in self.item_index.items():
+            for ingredient, amount in item_ingredient_quantity[item].items():
+                if ingredient in self.ingredient_index:
+                    self.quantities[i, self.ingredient_index[ingredient]] = amount
+
+def build_sales_matrix(all_monthly_sales:list, item_index:dict) -> np.ndarray:
+    '''months x items count matrix, sale rows that aren't recipe items are left out'''
+    counts = np.zeros((len(all_monthly_sales), len(item_index)))
+    for month, monthly_sales in enumerate(all_monthly_sales):
+        if isinstance(monthly_sales, month_sales):
+            #Compact rows: each distinct name ID is looked up once
+            name_ids, rows = np.unique(monthly_sales.name_ids, return_inverse=True)
+            names = monthly_sales.catalog.names
+            columns = np.array([item_index.get(names[i], -1) for i in name_ids.tolist()], dtype=np.int64)[rows]
+            values = monthly_sales.counts.astype(np.float64)
+        else:
+            columns = np.array([item_index.get(sale["name"], -1) for sale in monthly_sales], dtype=np.int64)
+            values = np.array([sale["count"] for sale in monthly_sales], dtype=np.float64)
+        matched = columns >= 0
+        np.add.at(counts[month], columns[matched], values[matched]) #Repeated names add up like the old loop
+    return counts
+
+def calculate_ingredient_demand(sales_matrix:np.ndarray, recipes:recipe_matrix) -> np.ndarray:
+    '''months x ingredients demand, all months and ingredients in a single matrix multiply'''
+    return sales_matrix @ recipes.quantities
+
+def demand_to_dicts(demand:np.ndarray, recipes:recipe_matrix) -> list[dict]:
+    return [dict(zip(recipes.ingredients, row)) for row in demand.tolist()]
+
+def find_unmatched_items(sale_names, recipes:recipe_matrix, items:list = None) -> dict:
+    '''Recipe items (all of them, or just items) missing from sale_names, with the closest sale names as likely spellings'''
+    sale_name_set = set(sale_names)
+    sale_names = sorted(sale_name_set)
+    unmatched = {}
+    for item in recipes.items if items is None else items:
+        if item not in sale_name_set:
+            unmatched[item] = difflib.get_close_matches(item, sale_names, n=3, cutoff=0.6)
+    return unmatched
@@ -1,22 +1,17 @@
+from ingredient_matrix import *
+
 def get_monthly_item_popularity(data:list):
     removed_values = ["Drink","Water","Appetizer"]
-    sorted_data = sorted(data, key=lambda d: d["count"])
     item_popularities = {}
-    for item in sorted_data:
+    for item in data:
         if item["name"] not in removed_values:
-            item_popularities[item["name"]] = item["count"]
+            #A name can show up as both a category and an item, keep the bigger count
+            item_popularities[item["name"]] = max(item["count"], item_popularities.get(item["name"], item["count"]))
     return item_popularities
 def get_monthly_ingredient_popularity(monthly_sales:list,item_ingredient_quantity:dict):
-    removed_values = ["Drink","Water","Appetizer"]
-    ingredient_popularity = {}
-    for item in item_ingredient_quantity["Beef Tossed Ramen"].keys():
-        if item not in removed_values:
-            ingredient_popularity[item] = 0
-    for sale in monthly_sales:
-        if sale["name"] in item_ingredient_quantity.keys() and sale["name"] not in removed_values:
-            for key in ingredient_popularity.keys():
-                ingredient_popularity[key] += item_ingredient_quantity[sale["name"]][key]*sale["count"]
-                #Pork cutlet doesn't work, fix it tomorrow
-    return ingredient_popularity
-
-
+    return get_all_ingredient_popularities([monthly_sales],item_ingredient_quantity)[0]
+def get_all_ingredient_popularities(all_monthly_sales:list,item_ingredient_quantity:dict) -> list[dict]:
+    '''Ingredient usage for every month at once, one months x items by items x ingredients multiply'''
+    recipes = recipe_matrix(item_ingredient_quantity)
+    sales_matrix = build_sales_matrix(all_monthly_sales,recipes.item_index)
+    return demand_to_dicts(calculate_ingredient_demand(sales_matrix,recipes),recipes)
@@ -0,0 +1,308 @@
+"""
+insights_server.py
+
+Local JSON HTTP API over overall_insights, so other tools get the dashboard's numbers without
+parsing the spreadsheets themselves.
+
+    python insights_server.py --port 8765
+
+    GET  /                                  endpoint list and data version
+    GET  /months                            month labels in order
+    GET  /earnings                          earnings per month
+    GET  /months/<month>/top/items?k=7      top items of a month (<month> is a label or an index)
+    GET  /months/<month>/top/ingredients    top ingredients of a month
+    GET  /months/<month>/categories         each category's share of the month's earnings
+    GET  /totals                            total earnings, top items/ingredients and category shares overall
+    GET  /predictions                       predicted profit, top items/ingredients, earnings forecast
+    POST /reload                            re-reads the source files in the background
+
+Every body is built once per data version and kept as bytes with a content ETag, so a request is a
+dict lookup (or a 304 when If-None-Match matches). Loading runs on a thread, the old responses keep
+being served until the new ones are ready, and until the first load finishes requests get a 503.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+from urllib.parse import parse_qs, unquote, urlsplit
+from overall_insights import overall_insights
+from report_data import *
+from store_aggregation import get_month_label
+
+TOP_N = 7
+MAX_HEADER_BYTES = 64*1024
+MAX_RESPONSES = 10000 #Past this, on-demand responses (odd k values) are built per request and not kept
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Content Too Large", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+
+class http_error(Exception):
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+class snapshot:
+    '''One loaded data version: the insights, its month labels and every response built from it.
+
+    Replaced as a whole by refresh(), so a request reads one consistent set through a single reference.
+    '''
+
+    def __init__(self, insights, months:list, responses:dict):
+        self.insights = insights
+        self.months = months
+        self.responses = responses
+
+EMPTY_SNAPSHOT = snapshot(None, [], {})
+
+def make_response(data) -> tuple:
+    '''(body bytes, ETag) for a JSON-able value'''
+    body = json.dumps(data).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+# ---------------------------
+# Response cache
+# ---------------------------
+
+class insights_service:
+    '''Holds the loaded overall_insights and every response built from it.
+
+    load_insights is called with no arguments on a worker thread, so a reload never blocks the
+    event loop. refresh() rebuilds the responses from the current (or given) insights, for callers
+    that patched it in place (e.g. add_month).
+    '''
+
+    def __init__(self, load_insights = overall_insights, top_n:int = TOP_N):
+        self.load_insights = load_insights
+        self.top_n = top_n
+        self.current = EMPTY_SNAPSHOT
+        self.version = 0
+        self.loading = None
+        self.error = None
+
+    @property
+    def insights(self):
+        return self.current.insights
+
+    @property
+    def months(self) -> list:
+        return self.current.months
+
+    @property
+    def responses(self) -> dict:
+        return self.current.responses
+
+    def refresh(self, insights = None):
+        insights = insights if insights is not None else self.current.insights
+        months = [get_month_label(str(path)) for path in insights.sale_file_names]
+        responses = {}
+        month_data = get_month_data(insights, self.top_n)
+        for index, (label, view) in enumerate(zip(months, month_data["month_views"])):
+            for kind in ("items", "ingredients"):
+                responses[f"/months/{index}/top/{kind}"] = make_response(
+                    {"month": label, "index": index, "k": self.top_n, kind: view[kind]})
+            responses[f"/months/{index}/categories"] = make_response(
+                {"month": label, "index": index, "category_shares": view["categories"]})
+        overall = get_overall_data(insights, self.top_n)
+        future = get_future_data(insights, self.top_n)
+        responses["/months"] = make_response({"months": months})
+        responses["/earnings"] = make_response({"months": months, "earnings": list(overall["profits_data"])})
+        responses["/totals"] = make_response({"total_earnings": insights.total_earnings,
+                                              "top_items": overall["overall_top_items"],
+                                              "top_ingredients": overall["overall_top_ingredients"],
+                                              "category_shares": overall["category_shares"]})
+        responses["/predictions"] = make_response({"predicted_profit": future["predicted_profit"],
+                                                   "top_items": future["predicted_top_items"],
+                                                   "top_ingredients": future["predicted_top_ingredients"],
+                                                   "earnings_forecast": insights.earnings_forecast})
+        self.version += 1
+        responses["/"] = make_response({"version": self.version, "months": len(months),
+                                        "endpoints": sorted(responses) + ["/reload"]})
+        #One reference swapped at the end, readers see either the old snapshot or the new one
+        self.current = snapshot(insights, months, responses)
+
+    async def reload(self):
+        '''Loads the data on a thread and swaps in fresh responses, concurrent callers share one load'''
+        if self.loading is None:
+            self.loading = asyncio.ensure_future(self.run_load())
+        loading = self.loading
+        await asyncio.shield(loading)
+
+    async def run_load(self):
+        try:
+            loop = asyncio.get_running_loop()
+            insights = await loop.run_in_executor(None, self.load_insights)
+            await loop.run_in_executor(None, self.refresh, insights) #Rankings and forecasts off the loop too
+            self.error = None
+        except Exception as e:
+            self.error = e
+        finally:
+            self.loading = None
+
+    def get_response(self, path:str, query:dict) -> tuple:
+        '''(body, ETag) for a GET, building and keeping uncommon ones (other k, month labels) on first use'''
+        key = path + ("?" + "&".join(f"{name}={query[name]}" for name in sorted(query)) if query else "")
+        current = self.current #Everything below reads this one snapshot even if a reload swaps in another
+        if key in current.responses:
+            return current.responses[key]
+        if current.insights is None:
+            raise http_error(503, "Data is still loading" if self.error is None else f"Loading failed: {self.error}")
+        response = self.build_response(current, path, query)
+        if len(current.responses) < MAX_RESPONSES:
+            current.responses[key] = response
+        return response
+
+    def build_response(self, current:snapshot, path:str, query:dict) -> tuple:
+        insights = current.insights
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if len(parts) == 4 and parts[0] == "months" and parts[2] == "top" and parts[3] in ("items", "ingredients"):
+            index = get_month_index(current.months, parts[1])
+            k = get_k(query, self.top_n)
+            top = get_top_items(insights, k, index) if parts[3] == "items" else get_top(insights, "ingredients", k, index)
+            return make_response({"month": current.months[index], "index": index, "k": k, parts[3]: top})
+        if len(parts) == 3 and parts[0] == "months" and parts[2] == "categories":
+            index = get_month_index(current.months, parts[1])
+            return make_response({"month": current.months[index], "index": index,
+                                  "category_shares": get_category_shares(insights, index)})
+        if path in ("/totals", "/predictions") and "k" in query:
+            k = get_k(query, self.top_n)
+            if path == "/totals":
+                return make_response({"total_earnings": insights.total_earnings,
+                                      "top_items": get_top_items(insights, k),
+                                      "top_ingredients": get_top(insights, "total_ingredients", k)})
+            return make_response({"predicted_profit": insights.projected_earnings,
+                                  "top_items": get_predicted_items(insights, k),
+                                  "top_ingredients": get_top(insights, "projected_ingredients", k),
+                                  "earnings_forecast": insights.earnings_forecast})
+        if path in current.responses:
+            return current.responses[path] #Unknown query parameters are ignored
+        raise http_error(404, f"No endpoint {path}")
+
+def get_month_index(months:list, month:str) -> int:
+    if month.isdigit() and int(month) < len(months):
+        return int(month)
+    if month in months:
+        return months.index(month)
+    raise http_error(404, f"Unknown month '{month}', expected one of {months}")
+
+def get_k(query:dict, default:int) -> int:
+    if "k" not in query:
+        return default
+    try:
+        k = int(query["k"])
+    except ValueError:
+        raise http_error(400, f"k must be a number, got '{query['k']}'")
+    if k < 1:
+        raise http_error(400, "k must be at least 1")
+    return k
+
+# ---------------------------
+# HTTP/1.1 on asyncio streams
+# ---------------------------
+
+async def handle_connection(service:insights_service, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+    '''Serves requests on one keep-alive connection until the client closes it'''
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                await write_response(writer, 400, *make_response({"error": "Malformed request line"}), keep_alive=False)
+                return
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            length = get_content_length(headers)
+            if length is None:
+                await write_response(writer, 400, *make_response({"error": "Content-Length must be a non-negative integer"}),
+                                     keep_alive=False)
+                return
+            if length or "transfer-encoding" in headers:
+                #No endpoint takes a body, so refuse it unread and close rather than skip past it
+                await write_response(writer, 413, *make_response({"error": "Requests must not have a body"}),
+                                     keep_alive=False)
+                return
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            status, body, etag = await dispatch(service, method, target, headers)
+            await write_response(writer, status, body, etag, keep_alive, head_only=method == "HEAD")
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+def get_content_length(headers:dict) -> int:
+    '''Body length from the headers, 0 without one, None when it isn't a non-negative integer'''
+    value = headers.get("content-length", "") or "0"
+    if not (value.isascii() and value.isdigit()): #Also rejects signs, so "-1" and "+5" are refused rather than parsed
+        return None
+    return int(value)
+
+async def dispatch(service:insights_service, method:str, target:str, headers:dict) -> tuple:
+    '''(status, body, ETag) for one request'''
+    url = urlsplit(target)
+    path = url.path.rstrip("/") or "/"
+    query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+    try:
+        if path == "/reload":
+            if method != "POST":
+                raise http_error(405, "Use POST /reload")
+            await service.reload()
+            if service.error is not None:
+                raise http_error(500, f"Reload failed: {service.error}")
+            return (200, *service.current.responses["/"])
+        if method not in ("GET", "HEAD"):
+            raise http_error(405, f"{method} is not supported")
+        body, etag = service.get_response(path, query)
+        if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+            return 304, b"", etag
+        return 200, body, etag
+    except http_error as e:
+        return (e.status, *make_response({"error": str(e)}))
+    except Exception as e:
+        return (500, *make_response({"error": f"{type(e).__name__}: {e}"}))
+
+async def write_response(writer:asyncio.StreamWriter, status:int, body:bytes, etag:str, keep_alive:bool = True,
+                         head_only:bool = False):
+    headers = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+               "Content-Type: application/json",
+               f"Content-Length: {0 if status == 304 else len(body)}",
+               f"ETag: {etag}",
+               "Cache-Control: no-cache", #Clients keep the body but check the ETag every time
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+    if status != 304 and not head_only:
+        writer.write(body)
+    await writer.drain()
+
+async def serve(service:insights_service, host:str = "127.0.0.1", port:int = 8765):
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer),
+                                        host, port, limit=MAX_HEADER_BYTES)
+    asyncio.ensure_future(service.reload()) #Serve 503s right away instead of waiting for the parse
+    print(f"Serving insights on http://{host}:{port}/")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the dashboard numbers as a local JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--top", type=int, default=TOP_N, help="default k for the top-k endpoints")
+    parser.add_argument("--workers", type=int, default=1, help="processes used to parse the workbooks on (re)load")
+    args = parser.parse_args()
+    service = insights_service(lambda: overall_insights(workers=args.workers, compact=True), args.top)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+#Set MSY_TRACE=<path> to turn the hooks on for a dashboard run and write the trace there on exit
+TRACE_ENV_VAR = "MSY_TRACE"
+
+ENABLED = False
+TRACK_MEMORY = False
+events = []
+events_lock = threading.Lock()
+#tracemalloc keeps one peak for the whole process, so only one open stage at a time (the outermost
+#one when it started) resets and reads it. Stages nested in it or running on other threads meanwhile
+#get no peak rather than one another stage's reset has cut short.
+memory_lock = threading.Lock()
+memory_owner = None
+
+def enable(memory:bool = True):
+    '''Starts recording stages, memory=True also tracks peak memory with tracemalloc (slower).
+
+    Peaks cover this process's Python allocations only, not pool workers or native buffers tracemalloc doesn't see.
+    '''
+    global ENABLED, TRACK_MEMORY
+    ENABLED = True
+    TRACK_MEMORY = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    global ENABLED, TRACK_MEMORY
+    if TRACK_MEMORY and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    ENABLED = False
+    TRACK_MEMORY = False
+
+def is_enabled() -> bool:
+    return ENABLED
+
+def reset() -> list:
+    '''Forgets everything recorded so far, returns the dropped events'''
+    global events
+    with events_lock:
+        dropped, events = events, []
+    return dropped
+
+def enable_from_env() -> str:
+    '''Enables the hooks when MSY_TRACE is set, returns the trace path (None when not set)'''
+    path = os.environ.get(TRACE_ENV_VAR)
+    if path:
+        enable()
+    return path or None
+
+# ---------------------------
+# Stages
+# ---------------------------
+
+class null_stage:
+    '''What stage() hands out while disabled, every call on it does nothing'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_rows(self, rows):
+        pass
+
+NULL_STAGE = null_stage()
+
+class recorded_stage:
+    '''One timed stage: wall time, CPU time, peak memory above the start and an optional row count.
+
+    The peak is only recorded for a stage that owns tracemalloc's peak while it runs, see memory_owner.
+    '''
+
+    def __init__(self, name:str, category:str, args:dict):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.rows = None
+
+    def set_rows(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        global memory_owner
+        if TRACK_MEMORY and tracemalloc.is_tracing():
+            with memory_lock:
+                if memory_owner is None:
+                    memory_owner = self
+                    tracemalloc.reset_peak()
+                    self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_cpu = time.thread_time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global memory_owner
+        wall_ns = time.perf_counter_ns() - self.start_ns
+        cpu_ns = time.thread_time_ns() - self.start_cpu
+        event = {"name": self.name, "cat": self.category, "start_ns": self.start_ns, "wall_ns": wall_ns,
+                 "cpu_ns": cpu_ns, "pid": os.getpid(), "tid": threading.get_ident(), "args": dict(self.args)}
+        if memory_owner is self:
+            with memory_lock:
+                if tracemalloc.is_tracing():
+                    event["peak_bytes"] = tracemalloc.get_traced_memory()[1] - self.start_memory
+                memory_owner = None
+        if self.rows is not None:
+            event["rows"] = self.rows
+        if exc_type is not None:
+            event["args"]["error"] = exc_type.__name__
+        with events_lock:
+            events.append(event)
+        return False
+
+def stage(name:str, category:str = "stage", **args):
+    '''with stage("parse", file=path) as s: ... s.set_rows(n)
+
+    Costs one flag check while disabled.
+    '''
+    if not ENABLED:
+        return NULL_STAGE
+    return recorded_stage(name, category, args)
+
+def instrumented(name:str = None, category:str = "stage"):
+    '''Decorator form of stage(), named after the function's qualified name by default'''
+    def decorate(func):
+        stage_name = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with recorded_stage(stage_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count_rows(value):
+    '''Rows in a loader/stage result: list/dict length, summed over a tuple of them (e.g. sale data) or a dict of lists (sale levels)'''
+    if isinstance(value, tuple):
+        return sum(count_rows(part) or 0 for part in value)
+    if isinstance(value, dict) and value and all(isinstance(part, list) for part in value.values()):
+        return sum(len(part) for part in value.values())
+    if isinstance(value, (list, dict)):
+        return len(value)
+    shape = getattr(value, "shape", None)
+    return shape[0] if shape else None
+
+# ---------------------------
+# Worker processes
+# ---------------------------
+
+def call_recorded(name:str, category:str, args:dict, func, *func_args) -> tuple:
+    '''Runs func in a pool worker as a recorded stage, returns (result, the worker's events).
+
+    The worker has its own copy of this module, so its events are shipped back with the result
+    and handed to add_events in the parent.
+    '''
+    enable(memory=False) #tracemalloc in every worker costs more than the memory number is worth
+    reset()
+    with recorded_stage(name, category, args) as recorded:
+        result = func(*func_args)
+        recorded.set_rows(count_rows(result))
+    return result, reset()
+
+def add_events(new_events:list):
+    with events_lock:
+        events.extend(new_events)
+
+# ---------------------------
+# Output
+# ---------------------------
+
+def summary() -> dict:
+    '''stage name -> {"calls", "wall_s", "cpu_s", "peak_mb", "rows"} summed over every call'''
+    stages = {}
+    with events_lock:
+        recorded = list(events)
+    for event in recorded:
+        totals = stages.setdefault(event["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mb": None, "rows": None})
+        totals["calls"] += 1
+        totals["wall_s"] += event["wall_ns"]/1e9
+        totals["cpu_s"] += event["cpu_ns"]/1e9
+        if "peak_bytes" in event:
+            totals["peak_mb"] = max(totals["peak_mb"] or 0, event["peak_bytes"]/2**20)
+        if "rows" in event:
+            totals["rows"] = (totals["rows"] or 0) + event["rows"]
+    return stages
+
+def format_summary(stages:dict = None) -> str:
+    stages = summary() if stages is None else stages
+    lines = [f"{'stage':48s} {'calls':>5s} {'wall ms':>10s} {'cpu ms':>10s} {'peak MB':>8s} {'rows':>8s}"]
+    for name, totals in sorted(stages.items(), key=lambda kv: kv[1]["wall_s"], reverse=True):
+        peak = "" if totals["peak_mb"] is None else f"{totals['peak_mb']:.1f}"
+        rows = "" if totals["rows"] is None else str(totals["rows"])
+        lines.append(f"{name:48s} {totals['calls']:5d} {totals['wall_s']*1000:10.1f} {totals['cpu_s']*1000:10.1f} {peak:>8s} {rows:>8s}")
+    return "\n".join(lines)
+
+def to_trace_events() -> list:
+    '''Events in the Chrome trace event format ("X" complete events, microseconds)'''
+    with events_lock:
+        recorded = sorted(events, key=lambda event: event["start_ns"])
+    if not recorded:
+        return []
+    origin = recorded[0]["start_ns"] #perf_counter is system-wide here, so worker events line up too
+    trace = []
+    for event in recorded:
+        args = dict(event["args"], cpu_ms=event["cpu_ns"]/1e6)
+        if "peak_bytes" in event:
+            args["peak_mb"] = event["peak_bytes"]/2**20
+        if "rows" in event:
+            args["rows"] = event["rows"]
+        trace.append({"name": event["name"], "cat": event["cat"], "ph": "X", "ts": (event["start_ns"] - origin)/1000,
+                      "dur": event["wall_ns"]/1000, "pid": event["pid"], "tid": event["tid"], "args": args})
+    return trace
+
+def write_trace(path:str) -> str:
+    '''Writes a trace file chrome://tracing and ui.perfetto.dev can open, returns the path'''
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": to_trace_events(), "displayTimeUnit": "ms"}, f, default=str)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,235 @@
+"""
+inventory_simulation.py
+
+Day-level stock simulation: does the shipment schedule actually cover ingredient demand?
+
+Every shipment line ("Beef, 40 lbs, 3 shipments, weekly") becomes deliveries on days of the month,
+recipe usage (grams/counts) is converted into the shipment's unit (lbs/rolls/pieces), and daily demand
+is drawn around the month's usage for thousands of Monte Carlo runs at once, in batches spread over a
+process pool. Per shipped ingredient it reports the stockout probability, expected stockout days and
+shortfall, and the surplus left at the end.
+
+    python inventory_simulation.py --runs 5000 --days 30 --stores stores.json --out inventory.json
+
+Recipe columns that can't be tied to a shipment (no shipment of it, or units that don't convert, e.g.
+chicken thighs in pieces against chicken in lbs) are listed under "unmatched" instead of guessed.
+"""
+
+import argparse
+import json
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from data_loading import INGREDIENT_FILE_NAME, SHIPMENT_FILE_NAME, resolve_workers
+from instrumentation import instrumented
+from overall_insights import overall_insights
+from shipment_processing import SHIPMENTS_PER_MONTH
+from store_aggregation import load_stores
+
+DAYS_PER_MONTH = 30
+RUNS = 2000
+BATCH_SIZE = 500
+DEMAND_SPREAD = 0.25 #Coefficient of variation of one day's demand
+
+#Weights in grams; count-like units are all "one of it"
+UNIT_GRAMS = {"g": 1.0, "kg": 1000.0, "lb": 453.592, "lbs": 453.592, "oz": 28.3495}
+COUNT_UNITS = {"count", "pcs", "pieces", "piece", "eggs", "egg", "rolls", "roll", "whole onion"}
+
+#Recipe column name (unit stripped, lowercase) -> shipment ingredient, where the names differ
+SUPPLY_ALIASES = {"braised beef used": "beef", "braised chicken": "chicken", "peas": "peas + carrot",
+                  "carrot": "peas + carrot", "boychoy": "bokchoy"}
+
+# ---------------------------
+# Units and the recipe -> shipment mapping
+# ---------------------------
+
+def split_unit(name:str) -> tuple:
+    '''("braised beef used", "g") from "braised beef used (g)", unit None when there is none'''
+    match = re.match(r"^(.*?)\s*\(([^)]*)\)\s*$", name)
+    if match:
+        return match.group(1).strip().lower(), match.group(2).strip().lower()
+    return name.strip().lower(), None
+
+def get_unit_factor(recipe_unit:str, shipment_unit:str) -> float:
+    '''How many shipment units one recipe unit is, None when they don't convert.
+
+    Recipe columns without a unit are taken as grams, like most of the ingredient CSV.
+    '''
+    recipe_unit = recipe_unit or "g"
+    shipment_unit = shipment_unit.strip().lower()
+    if recipe_unit in UNIT_GRAMS and shipment_unit in UNIT_GRAMS:
+        return UNIT_GRAMS[recipe_unit]/UNIT_GRAMS[shipment_unit]
+    if recipe_unit in COUNT_UNITS and shipment_unit in COUNT_UNITS:
+        return 1.0
+    return None
+
+class supply_plan:
+    '''Shipments and recipe usage lined up in shipment units, one column per shipped ingredient'''
+
+    def __init__(self, shipment_data:list, recipe_ingredients:list):
+        self.supplies = [shipment["ingredient"] for shipment in shipment_data]
+        self.units = [shipment["unit_of_shipment"] for shipment in shipment_data]
+        self.shipments = shipment_data
+        supply_index = {split_unit(supply)[0]: j for j, supply in enumerate(self.supplies)}
+        self.recipe_ingredients = list(recipe_ingredients)
+        #conversion[i, j]: shipment j units per recipe unit of ingredient i
+        self.conversion = np.zeros((len(self.recipe_ingredients), len(self.supplies)))
+        self.unmatched = {}
+        for i, ingredient in enumerate(self.recipe_ingredients):
+            name, unit = split_unit(ingredient)
+            j = supply_index.get(SUPPLY_ALIASES.get(name, name))
+            if j is None:
+                self.unmatched[ingredient] = "no shipment"
+                continue
+            factor = get_unit_factor(unit, self.units[j])
+            if factor is None:
+                self.unmatched[ingredient] = f"{unit or 'g'} does not convert to {self.units[j]}"
+                continue
+            self.conversion[i, j] = factor
+
+    def to_supply_units(self, ingredient_usage) -> np.ndarray:
+        '''{recipe ingredient: usage} -> usage per shipped ingredient in shipment units'''
+        usage = np.array([ingredient_usage.get(ingredient, 0) for ingredient in self.recipe_ingredients], dtype=np.float64)
+        return usage @ self.conversion
+
+    def get_delivery(self, shipment:dict) -> float:
+        return shipment["quantity_per_shipment"]*shipment["number_of_shipments"]
+
+    def monthly_supply(self) -> np.ndarray:
+        '''Delivered per DAYS_PER_MONTH, the shipment data's amount_per_month'''
+        return np.array([self.get_delivery(shipment)*SHIPMENTS_PER_MONTH[shipment["frequency"]]
+                         for shipment in self.shipments], dtype=np.float64)
+
+    def expand_schedule(self, days:int = DAYS_PER_MONTH) -> np.ndarray:
+        '''(days, supplies) delivered amounts, a delivery on day 0 and then SHIPMENTS_PER_MONTH evenly spaced
+        per DAYS_PER_MONTH (days 0, 7, 15, 22 for weekly)'''
+        deliveries = np.zeros((days, len(self.supplies)))
+        for j, shipment in enumerate(self.shipments):
+            period = DAYS_PER_MONTH/SHIPMENTS_PER_MONTH[shipment["frequency"]]
+            delivery_days = np.arange(0, days, period).astype(np.int64)
+            deliveries[delivery_days, j] += self.get_delivery(shipment)
+        return deliveries
+
+# ---------------------------
+# Monte Carlo
+# ---------------------------
+
+def run_batch(job:tuple) -> tuple:
+    '''One batch of runs, vectorized over runs and ingredients; a plain function so pool workers can take it.
+
+    Each day the deliveries land, then a gamma-distributed demand around the daily mean is served from
+    stock; whatever can't be served is shortfall and that day counts as a stockout.
+    Returns (stockout_days, shortfall, end_stock), each (runs, supplies).
+    '''
+    daily_mean, deliveries, initial_stock, spread, runs, seed = job
+    rng = np.random.default_rng(seed)
+    shape = 1/spread**2
+    scale = daily_mean*spread**2
+    stock = np.tile(initial_stock, (runs, 1))
+    stockout_days = np.zeros(stock.shape, dtype=np.int64)
+    shortfall = np.zeros(stock.shape)
+    for delivered in deliveries:
+        stock += delivered
+        demand = rng.gamma(shape, scale, size=stock.shape)
+        missing = demand - stock
+        short = missing > 0
+        stockout_days += short
+        shortfall += np.where(short, missing, 0)
+        stock = np.maximum(-missing, 0)
+    return stockout_days, shortfall, stock
+
+def get_monthly_usage(insights, month:int = None) -> dict:
+    '''Recipe ingredient usage of one month, or the projected next month when month is None'''
+    if month is None:
+        return insights.projected_pop_ingredients
+    return insights.ingredient_pops[month]
+
+@instrumented()
+def simulate(plan:supply_plan, ingredient_usage, runs:int = RUNS, days:int = DAYS_PER_MONTH,
+             spread:float = DEMAND_SPREAD, initial_stock = None, batch_size:int = BATCH_SIZE,
+             workers = 1, seed:int = None) -> dict:
+    '''Stockout probability and surplus per shipped ingredient over runs simulated days-long periods.
+
+    ingredient_usage is a month's {recipe ingredient: usage}, e.g. from get_monthly_usage. Batches get
+    their own seeds spawned from seed, so results don't depend on the number of workers.
+    '''
+    if not spread > 0: #The gamma shape is 1/spread**2
+        raise ValueError(f"spread must be greater than 0, got {spread}")
+    monthly_demand = plan.to_supply_units(ingredient_usage)
+    daily_mean = monthly_demand/DAYS_PER_MONTH
+    deliveries = plan.expand_schedule(days)
+    initial_stock = np.zeros(len(plan.supplies)) if initial_stock is None else np.asarray(initial_stock, dtype=np.float64)
+    batch_runs = [min(batch_size, runs - start) for start in range(0, runs, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_runs))
+    jobs = [(daily_mean, deliveries, initial_stock, spread, n, s) for n, s in zip(batch_runs, seeds)]
+    workers = min(resolve_workers(workers), len(jobs))
+    if workers <= 1:
+        results = [run_batch(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_batch, jobs))
+    stockout_days, shortfall, end_stock = (np.concatenate(parts) for parts in zip(*results))
+    return summarize(plan, monthly_demand, stockout_days, shortfall, end_stock, runs, days)
+
+def summarize(plan:supply_plan, monthly_demand:np.ndarray, stockout_days:np.ndarray, shortfall:np.ndarray,
+              end_stock:np.ndarray, runs:int, days:int) -> dict:
+    stockout_probability = (stockout_days > 0).mean(axis=0)
+    surplus_percentiles = np.percentile(end_stock, [5, 50, 95], axis=0)
+    supply = plan.monthly_supply()
+    ingredients = {}
+    for j, supply_name in enumerate(plan.supplies):
+        ingredients[supply_name] = {"unit": plan.units[j],
+                                    "monthly_supply": float(supply[j]),
+                                    "monthly_demand": float(monthly_demand[j]),
+                                    "stockout_probability": float(stockout_probability[j]),
+                                    "expected_stockout_days": float(stockout_days[:, j].mean()),
+                                    "expected_shortfall": float(shortfall[:, j].mean()),
+                                    "expected_surplus": float(end_stock[:, j].mean()),
+                                    "surplus_p5": float(surplus_percentiles[0, j]),
+                                    "surplus_p50": float(surplus_percentiles[1, j]),
+                                    "surplus_p95": float(surplus_percentiles[2, j])}
+    return {"runs": runs, "days": days, "ingredients": ingredients, "unmatched": plan.unmatched}
+
+# ---------------------------
+# Every store
+# ---------------------------
+
+def simulate_store(store:dict, month:int = None, use_cache:bool = True, **kwargs) -> dict:
+    insights = overall_insights(use_cache=use_cache, sale_file_names=store["sale_files"],
+                                shipment_file_name=store.get("shipment_file", SHIPMENT_FILE_NAME),
+                                ingredient_file_name=store.get("ingredient_file", INGREDIENT_FILE_NAME))
+    plan = supply_plan(insights.shipment_data, insights.recipes.ingredients)
+    return simulate(plan, get_monthly_usage(insights, month), **kwargs)
+
+def simulate_stores(stores:dict, month:int = None, use_cache:bool = True, **kwargs) -> dict:
+    return {store_name: simulate_store(store, month, use_cache, **kwargs) for store_name, store in stores.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate daily stock against the shipment schedule for every store")
+    parser.add_argument("--stores", default=None, help="JSON file mapping store name -> {sale_files, ingredient_file, shipment_file}")
+    parser.add_argument("--month", type=int, default=None, help="month index to draw demand from (default: projected next month)")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Monte Carlo runs per store")
+    parser.add_argument("--days", type=int, default=DAYS_PER_MONTH, help="days per run")
+    parser.add_argument("--spread", type=float, default=DEMAND_SPREAD, help="coefficient of variation of daily demand")
+    parser.add_argument("--workers", type=int, default=None, help="simulation processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default=None, help="write the full results as JSON here")
+    parser.add_argument("--no-cache", action="store_true", help="re-parse every source file")
+    args = parser.parse_args()
+    if not args.spread > 0:
+        parser.error(f"--spread must be greater than 0, got {args.spread}")
+    results = simulate_stores(load_stores(args.stores), args.month, not args.no_cache, runs=args.runs, days=args.days,
+                              spread=args.spread, workers=args.workers, seed=args.seed)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    for store_name, result in results.items():
+        print(f"{store_name}: {result['runs']} runs of {result['days']} days")
+        for supply_name, stats in result["ingredients"].items():
+            print(f"  {supply_name:<16} stockout {stats['stockout_probability']:6.1%}  "
+                  f"surplus {stats['expected_surplus']:10.1f} {stats['unit']}")
+        for ingredient, reason in result["unmatched"].items():
+            print(f"  not simulated: {ingredient} ({reason})")
+
+if __name__ == "__main__":
+    main()
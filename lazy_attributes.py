@@ -0,0 +1,69 @@
+import instrumentation
+
+class lazy_attribute:
+    '''Attribute computed on first access and then kept in the instance dict.
+
+    Used as @lazy_attribute("input", ...) on a method. The names are the attributes it is built
+    from, so invalidate() can drop everything downstream of a changed input and nothing else.
+    Once computed the value sits in __dict__, so later reads never go through the descriptor.
+    '''
+
+    def __init__(self, *depends_on:str):
+        self.depends_on = depends_on
+        self.compute = None
+        self.name = None
+
+    def __call__(self, compute):
+        self.compute = compute
+        self.name = compute.__name__
+        self.__doc__ = compute.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner = None):
+        if instance is None:
+            return self
+        if instrumentation.ENABLED:
+            with instrumentation.stage(f"{type(instance).__name__}.{self.name}", "lazy_attribute") as recorded:
+                value = self.compute(instance)
+                recorded.set_rows(instrumentation.count_rows(value))
+        else:
+            value = self.compute(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+def get_dependents(cls) -> dict:
+    '''name -> lazy attributes built directly from it, for every lazy attribute on cls'''
+    dependents = {}
+    for klass in reversed(cls.__mro__):
+        for name, attribute in vars(klass).items():
+            if isinstance(attribute, lazy_attribute):
+                for dependency in attribute.depends_on:
+                    dependents.setdefault(dependency, set()).add(name)
+    return dependents
+
+def is_computed(instance, name:str) -> bool:
+    return name in instance.__dict__
+
+def invalidate(instance, *names:str) -> set:
+    '''Forgets the given lazy attributes and everything that depends on them, returns what was dropped.
+
+    Plain input attributes passed in are kept (they were just changed by the caller), only what is
+    derived from them goes.
+    '''
+    dependents = get_dependents(type(instance))
+    pending = list(names)
+    seen = set(names)
+    dropped = set()
+    while pending:
+        name = pending.pop()
+        if isinstance(getattr(type(instance), name, None), lazy_attribute) and name in instance.__dict__:
+            del instance.__dict__[name]
+            dropped.add(name)
+        for dependent in dependents.get(name, ()):
+            if dependent not in seen:
+                seen.add(dependent)
+                pending.append(dependent)
+    return dropped
@@ -1,4 +1,9 @@
+import copy
 import heapq
+import warnings
+import numpy as np
+from collections import Counter
+from collections.abc import Mapping
 from display_earnings import *
 from ingredients_processing import *
 from sale_processing import *
@@ -6,29 +11,401 @@ from shipment_processing import *
 from calculate_total import *
 from ingredient_popularity import *
 from estimate_future_values import *
+from data_cache import *
+from data_loading import *
+from lazy_attributes import *
+from transaction_processing import *
+from instrumentation import instrumented
+from compact_sales import *
+from rollup_cube import get_cube_month_labels, rollup_cube
+#metric name -> attribute it ranks, list attributes are per month
+RANKING_METRICS = {"items": "item_pops", "ingredients": "ingredient_pops",
+                   "total_items": "total_pop_items", "total_ingredients": "total_pop_ingredients",
+                   "projected_items": "projected_pop_items", "projected_ingredients": "projected_pop_ingredients"}
+
 class overall_insights:
-    
-    
-    def __init__(self):
-        self.sales_data = []
-        self.sale_file_names = ['mai-shen-yun-main\May_Data_Matrix (1).xlsx','mai-shen-yun-main\June_Data_Matrix.xlsx',
-                    'mai-shen-yun-main\July_Data_Matrix (1).xlsx','mai-shen-yun-main\August_Data_Matrix (1).xlsx',
-                    'mai-shen-yun-main\September_Data_Matrix.xlsx','mai-shen-yun-main\October_Data_Matrix_20251103_214000.xlsx',]
-        for file in self.sale_file_names:
-            self.sales_data.append(process_sale_data(file))
-        self.shipment_data = process_shipment_data("mai-shen-yun-main\MSY Data - Shipment.csv")
-        self.ingredient_data = process_ingredient_data("mai-shen-yun-main\MSY Data - Ingredient.csv")
-        self.yearly_earnings = calculate_yearly_earnings(self.sales_data)
-        self.item_pops = []
-        self.ingredient_pops = []
-        for i in range(len(self.sales_data)):
-            self.item_pops.append(get_monthly_item_popularity(self.sales_data[i][1]))
-            self.ingredient_pops.append(get_monthly_ingredient_popularity(self.sales_data[i][1],self.ingredient_data))
-        graph_earnings(calculate_yearly_earnings(self.sales_data))
-
-        self.total_pop_items = calculate_total_item_popularities(self.item_pops)
-        self.total_pop_ingredients = calculate_total_ingredient_popularities(self.ingredient_pops)
-
-        self.projected_earnings = predict_next_monthly_earnings(6,self.yearly_earnings)
-        self.projected_pop_items = predict_all_item_popularities(self.item_pops,6)
-        self.projected_pop_ingredients = predict_all_ingredient_popularities(self.ingredient_pops,6)
+    '''Loads the source files up front, everything derived from them is computed on first access.
+
+    Inputs are sales_data, sale_file_names, category_row_counts, shipment_data and ingredient_data.
+    After changing one of them call invalidate(name) so only the attributes built from it get recomputed.
+    '''
+
+    @instrumented()
+    def __init__(self, use_cache:bool = True, workers = 1, sale_file_names:list = None,
+                 shipment_file_name:str = SHIPMENT_FILE_NAME, ingredient_file_name:str = INGREDIENT_FILE_NAME,
+                 progress = None, compact:bool = False):
+        #workers > 1 (or None for one per core) parses the workbooks in a process pool
+        #progress(file_name, files_done, files_total) is called as each source file finishes
+        #compact keeps sales rows and monthly popularities as typed arrays over this instance's name catalog
+        self.use_cache = use_cache
+        self.compact = compact
+        self.sale_file_names = list(sale_file_names) if sale_file_names is not None else list(SALE_FILE_NAMES)
+        self.shipment_file_name = shipment_file_name
+        self.ingredient_file_name = ingredient_file_name
+        sale_levels, self.shipment_data, self.ingredient_data = load_source_data(
+            self.sale_file_names, shipment_file_name, ingredient_file_name, use_cache, workers, progress)
+        self.sales_data = [levels_to_sale_data(levels) for levels in sale_levels]
+        #How many leading rows of each month's item rows came from its Category sheet, so the cube can
+        #tell categories from items without reading the workbooks again
+        self.category_row_counts = [len(levels["category"]) for levels in sale_levels]
+        #Owned by the instance, so the interned names go away with it instead of piling up for the whole process
+        self.catalog = name_catalog() if compact else None
+        if compact:
+            self.sales_data = [compact_sale_data(month_data, self.catalog) for month_data in self.sales_data]
+
+    def invalidate(self, *names:str) -> set:
+        '''Drops the cached attributes built from the given inputs/attributes'''
+        return invalidate(self, *names)
+
+    def is_computed(self, name:str) -> bool:
+        return is_computed(self, name)
+
+    def copy(self):
+        '''Copy that can be patched (insert_month, apply_changes) while this one is still being read.
+
+        The lists, dicts and counters patching edits in place are copied one level deep; the months'
+        data, popularities and rows in them are shared, patching only adds or drops them.
+        '''
+        other = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (list, dict)):
+                other.__dict__[name] = value.copy()
+            elif isinstance(value, monthly_average):
+                other.__dict__[name] = monthly_average(other, value.totals_name) #Views read through their instance
+            elif isinstance(value, rollup_cube):
+                other.__dict__[name] = value.copy()
+        return other
+
+    def get_month_levels(self, index:int) -> dict:
+        '''One month's {"group", "category", "item"} rows (see process_sale_levels), split back out of sales_data'''
+        group_data, rows = self.sales_data[index]
+        category_rows = self.category_row_counts[index]
+        return {"group": group_data, "category": rows[:category_rows], "item": rows[category_rows:]}
+
+    def to_month_popularity(self, popularity:dict):
+        '''A month's popularity dict as it is kept, compact_popularity in compact mode'''
+        return compact_popularity.from_dict(popularity, self.catalog) if self.compact else popularity
+
+    # ---------------
+    # Per-month values
+    # ---------------
+    @lazy_attribute("ingredient_data")
+    def recipes(self):
+        return recipe_matrix(self.ingredient_data)
+
+    @lazy_attribute("sales_data")
+    def yearly_earnings(self):
+        return calculate_yearly_earnings(self.sales_data)
+
+    @lazy_attribute("sales_data")
+    def item_pops(self):
+        return [self.to_month_popularity(get_monthly_item_popularity(month_data[1])) for month_data in self.sales_data]
+
+    @lazy_attribute("sales_data", "recipes")
+    def sales_rows(self):
+        '''One recipe-item count row per month, a list so a patch moves row references instead of copying a matrix'''
+        return list(build_sales_matrix([month_data[1] for month_data in self.sales_data],self.recipes.item_index))
+
+    @lazy_attribute("sales_rows", "recipes")
+    def ingredient_pops(self):
+        sales_matrix = np.array(self.sales_rows) if self.sales_rows else np.zeros((0, len(self.recipes.item_index)))
+        return [self.to_month_popularity(month_pop) for month_pop in
+                demand_to_dicts(calculate_ingredient_demand(sales_matrix,self.recipes),self.recipes)]
+
+    # ---------------
+    # Running totals, patched in place by insert_month/remove_month once computed
+    # ---------------
+    @lazy_attribute("yearly_earnings")
+    def total_earnings(self):
+        return sum(self.yearly_earnings)
+
+    @lazy_attribute("item_pops")
+    def item_month_counts(self):
+        '''How many months each item shows up in, to know when a total can go'''
+        return Counter(item for month_pop in self.item_pops for item in month_pop)
+
+    @lazy_attribute("item_pops", "item_month_counts")
+    def total_pop_items(self):
+        self.item_month_counts #Built together so patch_month can always update both
+        return calculate_total_item_popularities(self.item_pops)
+
+    @lazy_attribute("ingredient_pops")
+    def ingredient_month_counts(self):
+        return Counter(ingredient for month_pop in self.ingredient_pops for ingredient in month_pop)
+
+    @lazy_attribute("ingredient_pops", "ingredient_month_counts")
+    def total_pop_ingredients(self):
+        self.ingredient_month_counts
+        return calculate_total_ingredient_popularities(self.ingredient_pops)
+
+    @lazy_attribute("sales_data")
+    def cube(self):
+        '''Month x category x item rollups from the workbooks' sheets, see rollup_cube; patched a month at a time'''
+        return rollup_cube.from_insights(self)
+
+    @lazy_attribute("sales_data")
+    def sale_name_counts(self):
+        return Counter(name for month_data in self.sales_data for name in set(sale["name"] for sale in month_data[1]))
+
+    # ---------------
+    # Projections and outputs
+    # ---------------
+    @lazy_attribute("total_earnings", "sales_data")
+    def projected_earnings(self):
+        '''Next month's forecast is the average month'''
+        return self.total_earnings/len(self.sales_data) if self.sales_data else 0
+
+    @lazy_attribute("total_pop_items", "sales_data")
+    def projected_pop_items(self):
+        return monthly_average(self, "total_pop_items")
+
+    @lazy_attribute("total_pop_ingredients", "sales_data")
+    def projected_pop_ingredients(self):
+        return monthly_average(self, "total_pop_ingredients")
+
+    @lazy_attribute("yearly_earnings")
+    def earnings_forecast(self) -> dict:
+        '''Every model's next-month earnings, its backtest error and the best pick'''
+        result = forecast_all(np.array(self.yearly_earnings, dtype=np.float64).reshape(-1, 1))
+        return {"forecast": float(result["best_forecast"][0]), "model": str(result["best_model"][0]),
+                "forecasts": {name: float(v[0]) for name, v in result["forecasts"].items()},
+                "errors": {name: float(v[0]) for name, v in result["errors"].items()}}
+
+    @lazy_attribute("item_pops")
+    def item_forecasts(self) -> dict:
+        '''Best-model forecast, model name and backtest error per item, see forecast_popularities'''
+        return forecast_popularities(self.item_pops)
+
+    @lazy_attribute("ingredient_pops")
+    def ingredient_forecasts(self) -> dict:
+        return forecast_popularities(self.ingredient_pops)
+
+    @lazy_attribute("sale_name_counts", "recipes")
+    def unmatched_recipe_items(self):
+        '''Recipe items no sale matched, e.g. spelling differences between the menu export and the recipe sheet'''
+        unmatched = find_unmatched_items(self.sale_name_counts.keys(),self.recipes)
+        for item, suggestions in unmatched.items():
+            warnings.warn(f"Recipe item '{item}' matches no sales (closest sale names: {suggestions})")
+        return unmatched
+
+    def patch_unmatched_items(self, sale_names:set, sign:int):
+        '''Updates unmatched_recipe_items for one month's sale names instead of re-checking every recipe item'''
+        unmatched = self.unmatched_recipe_items
+        if sign > 0:
+            for name in sale_names:
+                unmatched.pop(name, None)
+            lost = []
+        else:
+            lost = [name for name in sale_names if name in self.recipes.item_index and name not in self.sale_name_counts]
+        #The month's names can change the closest spellings of items that were already unmatched too
+        found = find_unmatched_items(self.sale_name_counts.keys(), self.recipes, list(unmatched) + lost)
+        for item in lost:
+            warnings.warn(f"Recipe item '{item}' matches no sales (closest sale names: {found[item]})")
+        unmatched.update(found)
+
+    @lazy_attribute("yearly_earnings")
+    def earnings_chart(self) -> str:
+        '''Optional PNG export: writes total_earnings.png the first time a caller asks for it, returns the path'''
+        return graph_earnings(self.yearly_earnings)
+
+    # ---------------
+    # Rankings
+    # ---------------
+    @lazy_attribute("item_pops", "ingredient_pops", "total_pop_items", "total_pop_ingredients",
+                    "projected_pop_items", "projected_pop_ingredients")
+    def rankings(self):
+        '''(metric, month) -> the longest ranked list asked for so far'''
+        return {}
+
+    def get_metric(self, metric:str, month:int = None) -> dict:
+        if metric not in RANKING_METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {list(RANKING_METRICS)}")
+        values = getattr(self, RANKING_METRICS[metric])
+        if isinstance(values, list):
+            if month is None:
+                raise ValueError(f"Metric '{metric}' is per month, pass month")
+            return values[month]
+        return values
+
+    def top_k(self, metric:str, k:int = None, month:int = None) -> list:
+        '''Highest k (name, value) pairs of a metric, k=None ranks everything.
+
+        Uses partial selection (heapq.nlargest) and keeps the result per metric and month,
+        so asking again for the same or a smaller k is just a slice.
+        '''
+        key = (metric, month)
+        cached = self.rankings.get(key)
+        if cached is not None and (cached[0] is None or (k is not None and k <= cached[0])):
+            return cached[1][:k]
+        values = self.get_metric(metric, month)
+        if k is None or k >= len(values):
+            ranked = sorted(values.items(), key=lambda kv: kv[1], reverse=True)
+            self.rankings[key] = (None, ranked)
+        else:
+            ranked = heapq.nlargest(k, values.items(), key=lambda kv: kv[1])
+            self.rankings[key] = (k, ranked)
+        return ranked[:k]
+
+    # ---------------
+    # Incremental updates
+    # ---------------
+    def add_month(self, month_data:tuple, file_name:str = None, category_rows:int = 0):
+        '''Appends one month (the tuple from process_sale_data) and updates the totals and projections'''
+        self.insert_month(len(self.sales_data), month_data, file_name, category_rows)
+
+    def load_month(self, path:str) -> tuple:
+        '''(sale data, category rows) of one month workbook, what insert_month and replace_month take'''
+        levels = get_level_loader(self.use_cache)(path)
+        return levels_to_sale_data(levels), len(levels["category"])
+
+    @instrumented()
+    def add_month_file(self, path:str):
+        '''Parses one more month workbook and appends it'''
+        month_data, category_rows = self.load_month(path)
+        self.add_month(month_data, path, category_rows)
+
+    @instrumented()
+    def add_transaction_log(self, path:str, **kwargs) -> list:
+        '''Streams a point-of-sale log (see process_transaction_log) into months, returns the month keys.
+
+        Months already fed from the same log are replaced, so re-running after the log grew is safe.
+        '''
+        state = process_transaction_log(path, **kwargs)
+        for month in sorted(state["months"]):
+            file_name = f"{path}#{month}"
+            month_data = to_sale_data(state["months"][month])
+            if file_name in self.sale_file_names:
+                self.replace_month(self.sale_file_names.index(file_name), month_data)
+            else:
+                self.add_month(month_data, file_name)
+        return sorted(state["months"])
+
+    def insert_month(self, index:int, month_data:tuple, file_name:str = None, category_rows:int = 0):
+        '''Puts a month at position index, costs only as much as that month's rows.
+
+        category_rows is how many leading rows of month_data[1] are Category sheet rows (see load_month),
+        0 for item rows only such as a transaction log month.
+        '''
+        if self.compact:
+            month_data = compact_sale_data(month_data, self.catalog)
+        month = self.get_month_values(month_data)
+        self.sales_data.insert(index, month_data)
+        self.sale_file_names.insert(index, file_name)
+        self.category_row_counts.insert(index, category_rows)
+        self.patch_month(index, month, 1)
+
+    def remove_month(self, index:int) -> tuple:
+        '''Drops the month at position index from the history and the running totals, returns its sale data'''
+        month = self.get_month_values(self.sales_data[index])
+        month_data = self.sales_data.pop(index)
+        self.sale_file_names.pop(index)
+        self.category_row_counts.pop(index)
+        self.patch_month(index, month, -1)
+        return month_data
+
+    def replace_month(self, index:int, month_data:tuple, file_name:str = None, category_rows:int = 0):
+        '''Swaps in corrected data for an existing month'''
+        old_file_name = self.sale_file_names[index]
+        self.remove_month(index)
+        self.insert_month(index, month_data, file_name if file_name is not None else old_file_name, category_rows)
+
+    def get_month_values(self, month_data:tuple) -> dict:
+        sales_row = build_sales_matrix([month_data[1]],self.recipes.item_index)
+        return {"earnings": calculate_monthly_earnings(month_data[0]),
+                "item_pop": get_monthly_item_popularity(month_data[1]),
+                "ingredient_pop": demand_to_dicts(calculate_ingredient_demand(sales_row,self.recipes),self.recipes)[0],
+                "sales_row": sales_row[0],
+                "sale_names": set(sale["name"] for sale in month_data[1])}
+
+    def patch_month(self, index:int, month:dict, sign:int):
+        '''Adds (sign=1) or takes away (sign=-1) one month from whatever is already computed.
+
+        Called once sales_data holds the change. Anything not computed yet is left alone and will be
+        built from sales_data on first access.
+        '''
+        per_month = {"yearly_earnings": month["earnings"], "item_pops": self.to_month_popularity(month["item_pop"]),
+                     "ingredient_pops": self.to_month_popularity(month["ingredient_pop"])}
+        for name, value in per_month.items():
+            if self.is_computed(name):
+                if sign > 0:
+                    getattr(self, name).insert(index, value)
+                else:
+                    getattr(self, name).pop(index)
+        if self.is_computed("sales_rows"):
+            if sign > 0:
+                self.sales_rows.insert(index, month["sales_row"])
+            else:
+                self.sales_rows.pop(index)
+        if self.is_computed("total_earnings"):
+            self.total_earnings += sign*month["earnings"]
+        if self.is_computed("total_pop_items"):
+            add_to_totals(self.total_pop_items, self.item_month_counts, month["item_pop"], sign)
+        elif self.is_computed("item_month_counts"):
+            add_to_counts(self.item_month_counts, month["item_pop"].keys(), sign)
+        if self.is_computed("total_pop_ingredients"):
+            add_to_totals(self.total_pop_ingredients, self.ingredient_month_counts, month["ingredient_pop"], sign)
+        elif self.is_computed("ingredient_month_counts"):
+            add_to_counts(self.ingredient_month_counts, month["ingredient_pop"].keys(), sign)
+        if self.is_computed("sale_name_counts"):
+            add_to_counts(self.sale_name_counts, month["sale_names"], sign)
+            if self.is_computed("unmatched_recipe_items"):
+                self.patch_unmatched_items(month["sale_names"], sign)
+        if self.is_computed("cube"):
+            self.patch_cube(index, sign)
+        #projected_pop_items/ingredients read the patched totals live; these are O(1) or rebuilt on demand
+        self.invalidate("projected_earnings", "earnings_chart", "rankings",
+                        "earnings_forecast", "item_forecasts", "ingredient_forecasts")
+
+    def patch_cube(self, index:int, sign:int):
+        '''Adds or drops the cube's slice for the month at index (sales_data already patched)'''
+        labels = get_cube_month_labels(self.sale_file_names)
+        if sign < 0:
+            self.cube.remove_month(index, labels)
+        elif not self.cube.insert_month(index, self.get_month_levels(index), labels):
+            self.invalidate("cube") #A new category, rebuilt from sales_data on next access
+
+class monthly_average(Mapping):
+    '''Read-only {key: total/months} over a running total, reading the live totals and month count.
+
+    Nothing to rebuild when a month is inserted or removed: the totals are patched in place and the
+    month count is just len(sales_data).
+    '''
+
+    def __init__(self, insights, totals_name:str):
+        self.insights = insights
+        self.totals_name = totals_name
+
+    def get_totals(self) -> dict:
+        return getattr(self.insights, self.totals_name)
+
+    def __getitem__(self, key):
+        return self.get_totals()[key]/len(self.insights.sales_data)
+
+    def __iter__(self):
+        return iter(self.get_totals())
+
+    def __len__(self):
+        return len(self.get_totals())
+
+    def items(self) -> list:
+        month_count = len(self.insights.sales_data)
+        return [(key, total/month_count) for key, total in self.get_totals().items()]
+
+    def values(self) -> list:
+        return [value for _, value in self.items()]
+
+def add_to_totals(totals:dict, month_counts:Counter, month_pop:dict, sign:int):
+    for key, value in month_pop.items():
+        if key not in totals:
+            totals[key] = 0
+        totals[key] += sign*value
+        month_counts[key] += sign
+        if month_counts[key] <= 0:
+            del totals[key] #No month left that has this key
+            del month_counts[key]
+
+def add_to_counts(counts:Counter, keys, sign:int):
+    for key in keys:
+        counts[key] += sign
+        if counts[key] <= 0:
+            del counts[key]
@@ -0,0 +1,71 @@
+import csv
+from ingredient_matrix import REMOVED_VALUES
+from instrumentation import instrumented
+
+#Shared by the Tk dashboard and the headless batch report, so both show the same numbers
+
+def get_top(insights, metric, k, month=None):
+    '''(name, int value) pairs from the insights ranking index, k=None for everything'''
+    return [(name, int(v)) for name, v in insights.top_k(metric, k, month)]
+
+def get_cube_items(insights, k, month=None):
+    '''(name, count) of menu items from the rollup cube, leaving out REMOVED_VALUES like the popularities do'''
+    return insights.cube.top_items(k, month, exclude=REMOVED_VALUES)
+
+def get_top_items(insights, k, month=None):
+    '''(name, int count) of menu items from the rollup cube, category rows no longer mixed in'''
+    return [(name, int(v)) for name, v in get_cube_items(insights, k, month)]
+
+def get_predicted_items(insights, k):
+    '''(name, int count) forecast for next month: the item's average month, cut to an int like get_top does.
+
+    Same rounding as get_top(insights, "projected_items", k), but over item rows only, so it differs
+    from projected_pop_items where that has a category row (e.g. "Ramen" is both a category and an
+    item) or a name repeated within one month's sheet (summed here, projected_pop_items keeps one row).
+    '''
+    month_count = max(1, len(insights.cube.months))
+    return [(name, int(total/month_count)) for name, total in get_cube_items(insights, k)]
+
+def get_category_shares(insights, month=None):
+    '''(category, % of earnings) highest first over one month or all of them, unsold categories left out'''
+    shares = insights.cube.category_share(month)
+    return [(name, round(100*share, 1)) for name, share in sorted(shares.items(), key=lambda x: -x[1]) if share]
+
+@instrumented()
+def get_overall_data(insights, top_n=3):
+    return {"profits_data": insights.cube.month_earnings(),
+            "overall_top_items": get_top_items(insights, top_n),
+            "overall_top_ingredients": get_top(insights, "total_ingredients", top_n),
+            "category_shares": get_category_shares(insights)}
+
+@instrumented()
+def get_month_data(insights, top_n=7):
+    views = []
+    for month in range(len(insights.sales_data)):
+        views.append({"items": get_top_items(insights, top_n, month),
+                      "ingredients": get_top(insights, "ingredients", top_n, month),
+                      "categories": get_category_shares(insights, month)})
+    return {"monthly_top_items": insights.item_pops,
+            "monthly_top_ingredients": insights.ingredient_pops,
+            "month_views": views,
+            "month_labels": list(insights.cube.months)}
+
+@instrumented()
+def get_future_data(insights, top_n=7):
+    return {"predicted_profit": insights.projected_earnings,
+            "predicted_top_items": get_predicted_items(insights, top_n),
+            "predicted_top_ingredients": get_top(insights, "projected_ingredients", top_n)}
+
+def write_predictions_csv(path:str, predicted_profit:float, items:list, ingredients:list):
+    '''The predictions export: profit, then every predicted item and ingredient'''
+    with open(path, "w", newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Predicted profit", f"{predicted_profit:.2f}"])
+        writer.writerow([])
+        writer.writerow(["Predicted top items","predicted"])
+        for n,v in items:
+            writer.writerow([n,v])
+        writer.writerow([])
+        writer.writerow(["Predicted top ingredients","predicted"])
+        for n,v in ingredients:
+            writer.writerow([n,v])
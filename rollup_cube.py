@@ -0,0 +1,336 @@
+import copy
+import re
+import numpy as np
+from data_loading import get_level_loader
+from store_aggregation import DEFAULT_STORES, get_month_key, get_month_label, month_sort_key
+
+OTHER_CATEGORY = "Other" #Item grouping for names item_categories doesn't map, not a sheet category
+METRICS = ("count", "amount")
+
+# ---------------------------
+# Items -> categories
+# ---------------------------
+
+def get_name_words(name:str) -> tuple:
+    '''Lowercase words without sizes or plurals, "Chicken Tossed Rice Noodles (8)" -> ("chicken", "tossed", "rice", "noodle")'''
+    name = re.sub(r"[(（][^)）]*[)）]", " ", name.lower())
+    return tuple(word[:-1] if len(word) > 3 and word.endswith("s") else word for word in re.findall(r"[a-z0-9]+", name))
+
+def contains_words(words:tuple, part:tuple) -> bool:
+    return any(words[i:i + len(part)] == part for i in range(len(words) - len(part) + 1))
+
+def match_category(item:str, category_words:dict) -> str:
+    '''Best guess at an item's category: the category whose name appears in the item's name, the longest one when several do.
+
+    The workbooks list categories and items in separate sheets with nothing linking them (the item
+    sheet is ordered by amount, not by category), so the name is all there is: "Beef Tossed Ramen"
+    goes to "Tossed Ramen" rather than "Ramen". It is a guess and can be wrong ("Chicken Tender combo
+    w fries and drink" lands in "Drink"); None if nothing matches.
+    '''
+    words = get_name_words(item)
+    matches = [(len(part), category) for category, part in category_words.items() if part and contains_words(words, part)]
+    return max(matches, key=lambda match: match[0])[1] if matches else None
+
+def guess_item_categories(items, categories) -> dict:
+    '''item -> match_category guess for the items it can place, an item_categories mapping for callers a guess is good enough for'''
+    category_words = {category: get_name_words(category) for category in categories}
+    guesses = {item: match_category(item, category_words) for item in items}
+    return {item: category for item, category in guesses.items() if category is not None}
+
+# ---------------------------
+# The cube
+# ---------------------------
+
+class rollup_cube:
+    '''Store x month x item sales with category, menu group and store rollups built once.
+
+    Arrays hold one extra store row, the sum over every store, so store=None is a lookup like any
+    store. Month prefix sums make any month range a subtraction, and items are laid out category by
+    category so one category's items are a contiguous slice.
+
+    Category and group totals (category_share, top_categories) come straight from their sheets and
+    are exact. Which items belong to which category is not in the workbooks, so item_category only
+    comes from an explicit item_categories mapping (guess_item_categories builds a name-based one for
+    callers that accept a guess). It drives category_items, top(..., category=...) and the category
+    totals of months without a Category sheet (transaction logs). Unmapped items are grouped under
+    OTHER_CATEGORY, which is not one of the sheet categories and has no share.
+    '''
+
+    def __init__(self, store_months:dict, item_categories:dict = None, months:list = None):
+        #store_months: store -> [(month label, {"group", "category", "item"} records), ...]
+        #months fixes the month order, by default every label in calendar order
+        self.stores = list(store_months)
+        self.set_months(months if months is not None else sorted(
+            {label for store in store_months.values() for label, _ in store}, key=month_sort_key))
+        all_levels = [levels for months in store_months.values() for _, levels in months]
+        self.item_categories = dict(item_categories or {})
+        self.groups = get_level_names(all_levels, "group")
+        self.group_index = {group: g for g, group in enumerate(self.groups)}
+        self.categories = get_level_names(all_levels, "category")
+        self.category_position = {category: c for c, category in enumerate(self.categories)}
+        self.item_category = {}
+        self.set_items(get_level_names(all_levels, "item"))
+        self.build_arrays(store_months)
+
+    def copy(self):
+        '''Copy that insert_month/remove_month can patch without touching this one.
+
+        Patching swaps in new arrays rather than writing into the shared ones, so the name lists and
+        dicts holding them are copied one level deep and the arrays are shared.
+        '''
+        other = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (list, dict)):
+                other.__dict__[name] = value.copy()
+        return other
+
+    def set_months(self, months:list):
+        self.months = list(months)
+        self.month_index = {label: m for m, label in enumerate(self.months)}
+
+    def set_items(self, new_items:list):
+        '''Adds items after the known ones, keeping every category's items one contiguous slice'''
+        for item in new_items:
+            category = self.item_categories.get(item)
+            self.item_category[item] = category if category in self.category_position else OTHER_CATEGORY
+        item_groups = {category: c for c, category in enumerate(self.categories + [OTHER_CATEGORY])}
+        items = getattr(self, "items", []) + list(new_items)
+        self.items = sorted(items, key=lambda item: item_groups[self.item_category[item]])
+        self.item_index = {item: i for i, item in enumerate(self.items)}
+        self.category_slices = {}
+        for i, item in enumerate(self.items):
+            start, _ = self.category_slices.get(self.item_category[item], (i, i))
+            self.category_slices[self.item_category[item]] = (start, i + 1)
+
+    def get_axes(self) -> dict:
+        return {"item": (self.items, self.item_index), "category": (self.categories, self.category_position),
+                "group": (self.groups, self.group_index)}
+
+    def build_month(self, levels:dict) -> dict:
+        '''(level, metric) -> one month's values of one store'''
+        month = {}
+        for level, (names, index) in self.get_axes().items():
+            for metric in METRICS:
+                month[(level, metric)] = np.zeros(len(names))
+            for record in levels.get(level, []):
+                column = index[record["name"]]
+                #Repeated names within one sheet add up, like build_sales_matrix does
+                month[(level, "count")][column] += record["count"]
+                month[(level, "amount")][column] += record["amount"]
+        if not levels.get("category"):
+            #No category sheet (e.g. a transaction log month), roll up the items item_categories maps;
+            #unmapped ones under OTHER_CATEGORY are left out of the shares
+            for metric in METRICS:
+                month[("category", metric)] = self.sum_by_category(month[("item", metric)])
+        return month
+
+    def build_arrays(self, store_months:dict):
+        shape = (len(self.stores) + 1, len(self.months))
+        self.values = {(level, metric): np.zeros(shape + (len(names),))
+                       for level, (names, _) in self.get_axes().items() for metric in METRICS}
+        for s, months in enumerate(store_months.values()):
+            for label, levels in months:
+                m = self.month_index[label]
+                for key, values in self.build_month(levels).items():
+                    self.values[key][s, m] = values
+        for array in self.values.values():
+            array[-1] = array[:-1].sum(axis=0)
+        self.prefix = {key: np.zeros((shape[0], shape[1] + 1) + array.shape[2:]) for key, array in self.values.items()}
+        self.update_months(0)
+
+    def update_months(self, start:int):
+        '''Prefix sums from month position start on (the ones before it are unchanged), earnings and shares of every month'''
+        #Earnings are the Group sheet's total, the same number calculate_monthly_earnings gives
+        self.earnings = self.values[("group", "amount")].sum(axis=2)
+        for key, array in self.values.items():
+            self.prefix[key][:, start + 1:] = self.prefix[key][:, start:start + 1] + array[:, start:].cumsum(axis=1)
+        category_amounts = self.values[("category", "amount")]
+        category_totals = category_amounts.sum(axis=2, keepdims=True)
+        self.category_shares = np.divide(category_amounts, category_totals, out=np.zeros_like(category_amounts),
+                                          where=category_totals != 0)
+
+    def sum_by_category(self, item_values:np.ndarray) -> np.ndarray:
+        totals = np.zeros(len(self.categories))
+        for category, (start, end) in self.category_slices.items():
+            if category in self.category_position:
+                totals[self.category_position[category]] = item_values[start:end].sum()
+        return totals
+
+    # ---------------
+    # Patching one month
+    # ---------------
+    def add_names(self, levels:dict) -> bool:
+        '''Makes room for the month's unseen items and groups, False when it brings a new category'''
+        if any(record["name"] not in self.category_position for record in levels.get("category", [])):
+            return False #Items would move between category slices, rebuild instead
+        new_groups = [group for group in get_level_names([levels], "group") if group not in self.group_index]
+        if new_groups:
+            self.groups += new_groups
+            self.group_index = {group: g for g, group in enumerate(self.groups)}
+            for metric in METRICS:
+                for arrays in (self.values, self.prefix):
+                    array = arrays[("group", metric)]
+                    arrays[("group", metric)] = np.concatenate([array, np.zeros(array.shape[:2] + (len(new_groups),))], axis=2)
+        new_items = [item for item in get_level_names([levels], "item") if item not in self.item_index]
+        if new_items:
+            old_index = self.item_index
+            self.set_items(new_items)
+            take = np.array([old_index.get(item, -1) for item in self.items])
+            known = take >= 0
+            for metric in METRICS:
+                for arrays in (self.values, self.prefix):
+                    array = arrays[("item", metric)]
+                    moved = np.zeros(array.shape[:2] + (len(self.items),))
+                    moved[:, :, known] = array[:, :, take[known]]
+                    arrays[("item", metric)] = moved
+        return True
+
+    def insert_month(self, position:int, levels:dict, months:list, store:str = None) -> bool:
+        '''Adds one month of a store's sales at position, months being the month labels afterwards.
+
+        Only that month is built from its rows; later prefix sums shift by it. False (cube unchanged)
+        when the month brings a category the cube doesn't have, the caller should rebuild then.
+        '''
+        if not self.add_names(levels):
+            return False
+        s = self.get_store_row(store if store is not None else self.stores[0])
+        for key, values in self.build_month(levels).items():
+            month = np.zeros((len(self.stores) + 1, 1, len(values)))
+            month[s, 0] = month[-1, 0] = values
+            self.values[key] = np.concatenate([self.values[key][:, :position], month, self.values[key][:, position:]], axis=1)
+            prefix = self.prefix[key]
+            self.prefix[key] = np.concatenate([prefix[:, :position + 1], prefix[:, position:]], axis=1)
+        self.set_months(months)
+        self.update_months(position)
+        return True
+
+    def remove_month(self, position:int, months:list):
+        '''Drops the month at position, months being the month labels afterwards.
+
+        Names only that month had stay as zero columns, which top() and the shares leave out.
+        '''
+        for key in self.values:
+            self.values[key] = np.delete(self.values[key], position, axis=1)
+            self.prefix[key] = np.delete(self.prefix[key], position + 1, axis=1)
+        self.set_months(months)
+        self.update_months(position)
+
+    @classmethod
+    def from_insights(cls, insights, store_name:str = None, item_categories:dict = None):
+        '''One store's cube from the sheet levels a loaded overall_insights holds (see get_month_levels), no files read'''
+        store_name = store_name if store_name is not None else next(iter(DEFAULT_STORES))
+        labels = get_cube_month_labels(insights.sale_file_names)
+        months = [(label, insights.get_month_levels(index)) for index, label in enumerate(labels)]
+        #Same month order as insights, so a month index means the same month in both
+        return cls({store_name: months}, item_categories, labels)
+
+    @classmethod
+    def from_stores(cls, stores:dict, use_cache:bool = True, item_categories:dict = None):
+        '''Cube over every store in a stores mapping (see store_aggregation.load_stores)'''
+        load_levels = get_level_loader(use_cache)
+        return cls({store_name: [(get_month_key(path, store.get("year")), load_levels(path)) for path in store["sale_files"]]
+                    for store_name, store in stores.items()}, item_categories)
+
+    # ---------------
+    # Lookups
+    # ---------------
+    def get_store_row(self, store:str = None) -> int:
+        return len(self.stores) if store is None else self.stores.index(store)
+
+    def get_month(self, month) -> int:
+        '''Position of a month given as an index or a label'''
+        return month if isinstance(month, int) else self.month_index[month]
+
+    def get_month_span(self, months = None) -> tuple:
+        '''(start, end) positions for None (every month), one month or an inclusive (first, last) pair'''
+        if months is None:
+            return 0, len(self.months)
+        if isinstance(months, tuple):
+            return self.get_month(months[0]), self.get_month(months[1]) + 1
+        month = self.get_month(months)
+        return month, month + 1
+
+    def get_totals(self, level:str, metric:str = "count", months = None, store:str = None) -> np.ndarray:
+        '''Values of every item/category/group summed over months, two prefix rows apart'''
+        start, end = self.get_month_span(months)
+        prefix = self.prefix[(level, metric)][self.get_store_row(store)]
+        return prefix[end] - prefix[start]
+
+    def get_names(self, level:str) -> list:
+        return {"item": self.items, "category": self.categories, "group": self.groups}[level]
+
+    # ---------------
+    # Queries
+    # ---------------
+    def month_earnings(self, store:str = None) -> list:
+        return self.earnings[self.get_store_row(store)].tolist()
+
+    def category_share(self, months = None, store:str = None) -> dict:
+        '''category -> share of the earnings over a month, a month range or everything'''
+        if isinstance(months, (int, str)):
+            shares = self.category_shares[self.get_store_row(store), self.get_month(months)]
+        else:
+            totals = self.get_totals("category", "amount", months, store)
+            shares = totals/totals.sum() if totals.sum() else totals
+        return dict(zip(self.categories, shares.tolist()))
+
+    def top(self, level:str, k:int = None, metric:str = "count", months = None, store:str = None,
+            category:str = None, exclude = ()) -> list:
+        '''(name, value) pairs, highest first, k=None for everything with a non-zero value.
+
+        category narrows items to one category's slice, e.g. top("item", 5, category="Ramen", months=("May", "July")).
+        Names in exclude are left out; only the largest k + len(exclude) values get sorted.
+        '''
+        totals = self.get_totals(level, metric, months, store)
+        names = self.get_names(level)
+        offset = 0
+        if category is not None:
+            offset, end = self.category_slices.get(category, (0, 0))
+            totals = totals[offset:end]
+        exclude = set(exclude)
+        order = get_largest(totals, None if k is None else k + len(exclude))
+        order = order[totals[order] != 0]
+        ranked = [(names[offset + i], value) for i, value in zip(order.tolist(), totals[order].tolist())
+                  if names[offset + i] not in exclude]
+        return ranked[:k]
+
+    def top_items(self, k:int = None, months = None, store:str = None, category:str = None, metric:str = "count",
+                  exclude = ()) -> list:
+        return self.top("item", k, metric, months, store, category, exclude)
+
+    def top_categories(self, k:int = None, months = None, store:str = None, metric:str = "amount") -> list:
+        return self.top("category", k, metric, months, store)
+
+    def category_items(self, category:str) -> list:
+        '''Items item_categories puts in a category, OTHER_CATEGORY for the unmapped ones'''
+        start, end = self.category_slices.get(category, (0, 0))
+        return self.items[start:end]
+
+def get_largest(values:np.ndarray, n:int = None) -> np.ndarray:
+    '''Positions of the n largest values, highest first with ties in position order (what a stable argsort
+    gives), n=None for all of them. Partial selection, so only the values at or above the cut get sorted.
+    '''
+    if n is None or n >= len(values):
+        return np.argsort(-values, kind="stable")
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    cut = np.partition(values, len(values) - n)[len(values) - n]
+    candidates = np.flatnonzero(values >= cut) #Every value tied at the cut, so the pick doesn't depend on the partition
+    return candidates[np.argsort(-values[candidates], kind="stable")][:n]
+
+def get_level_names(all_levels:list, level:str) -> list:
+    '''Names of one sheet level in first-seen order'''
+    return list(dict.fromkeys(record["name"] for levels in all_levels for record in levels.get(level, [])))
+
+def get_cube_month_label(file_name, index:int, taken:list) -> str:
+    '''Label from the file name, made unique when two files share one'''
+    label = get_month_label(str(file_name)) if file_name is not None else f"Month {index + 1}"
+    if label in taken:
+        label = f"{label} ({index + 1})"
+    return label
+
+def get_cube_month_labels(file_names:list) -> list:
+    labels = []
+    for index, file_name in enumerate(file_names):
+        labels.append(get_cube_month_label(file_name, index, labels))
+    return labels
@@ -1,34 +1,49 @@
 import pandas as pd
-import re
+
+NAME_COLUMNS = ["Group", "Category", "Item Name"]
+VALUE_COLUMNS = ["Count", "Amount"]
+
+#Sheet level -> the name column that marks it
+SALE_LEVELS = {"group": "Group", "category": "Category", "item": "Item Name"}
 
 def process_sale_data(path:str) -> tuple:
-    sheet_names = ["data 1","data 2", "data 3"]
-    all_data_raw = "" #Kind of unhinged, but puts all the product data into one colossal string
-    total_sales_raw = "" #Puts all of the sales data into one colossal string
-    for sheet in sheet_names:
-        temp_data = pd.read_excel(path,sheet_name=sheet)
-        str_data = temp_data.to_string()
-        if "Group" in str_data:
-            total_sales_raw += str_data
-        else:
-            all_data_raw += str_data
-    all_data_raw = re.sub(r"\s+(source_page)\s+(source_table).+","",all_data_raw)
-    total_sales_raw = re.sub(r"\s+(source_page)\s+(source_table).+","",total_sales_raw)
-    return make_dictionary(total_sales_raw),make_dictionary(all_data_raw)
-
-def make_dictionary(raw_data:str) -> dict:
-    rows = raw_data.split('\n')
-    data_for_items = []
-    for row in rows:
-        if row == "":
+    '''Opens the workbook once and splits its tables into (group totals, item/category rows)'''
+    return levels_to_sale_data(process_sale_levels(path))
+
+def process_sale_levels(path:str) -> dict:
+    '''{"group": [...], "category": [...], "item": [...]} records, each sheet level kept apart'''
+    sheets = pd.read_excel(path, sheet_name=None) #Every sheet in a single pass instead of one read per sheet
+    levels = {level: [] for level in SALE_LEVELS}
+    column_levels = {column: level for level, column in SALE_LEVELS.items()}
+    for sheet in sheets.values():
+        name_column = find_name_column(sheet)
+        if name_column is None:
             continue
-        data_for_item = {}
-        info = re.split(pattern=r"\s{2,}(?![\(-])",string=row)
-        data_for_item["name"] = info[3]
-        data_for_item["count"] = int(re.sub(r"[$,]","",info[4]))
-        data_for_item["amount"] = float(re.sub(r"[$,]","",info[5]))
-        data_for_items.append(data_for_item)
-    return data_for_items
+        levels[column_levels[name_column]] += make_records(sheet, name_column)
+    return levels
+
+def levels_to_sale_data(levels:dict) -> tuple:
+    '''(group totals, category rows followed by item rows), the shape the rest of the code reads'''
+    return levels["group"], levels["category"] + levels["item"]
+
+def find_name_column(sheet:pd.DataFrame):
+    '''Finds which kind of table a sheet holds from its columns, None if it is not a sales table'''
+    for column in VALUE_COLUMNS:
+        if column not in sheet.columns:
+            return None
+    for column in NAME_COLUMNS:
+        if column in sheet.columns:
+            return column
+    return None
 
+def make_records(sheet:pd.DataFrame, name_column:str) -> list:
+    '''Builds the name/count/amount records straight from the table columns'''
+    sheet = sheet.dropna(subset=[name_column])
+    names = sheet[name_column].astype(str).str.strip().to_list()
+    counts = to_number(sheet["Count"]).astype(int).to_list()
+    amounts = to_number(sheet["Amount"]).astype(float).to_list()
+    return [{"name": name, "count": count, "amount": amount} for name, count, amount in zip(names, counts, amounts)]
 
-data_for_items = process_sale_data("mai-shen-yun-main\October_Data_Matrix_20251103_214000.xlsx")
\ No newline at end of file
+def to_number(column:pd.Series) -> pd.Series:
+    '''Strips the $ and thousands separators from a column'''
+    return column.astype(str).str.replace(r"[$,]", "", regex=True)
@@ -0,0 +1,117 @@
+import numpy as np
+from calculate_total import calculate_monthly_earnings
+from ingredient_matrix import build_sales_matrix, recipe_matrix
+
+CHUNK_SIZE = 4096 #Scenarios evaluated per array pass, bounds the scenarios x ingredients temporaries
+PERCENTILES = (5, 25, 50, 75, 95)
+
+class scenario_engine:
+    '''What-if evaluator for one month: many count/price perturbations at once.
+
+    A scenario is a count multiplier and a price multiplier per item (1 = unchanged, 0 count =
+    dropped). Earnings move by each item's amount times (count x price multiplier - 1) on top of the
+    month's real earnings; ingredient demand is the month's recipe-item counts times the count
+    multipliers through the recipe table.
+
+    item_data must be the workbook's item-level rows only (process_sale_levels(path)["item"]). The
+    combined rows process_sale_data returns also hold the category totals, which would count every
+    amount twice and let a category be "dropped" without touching its items' ingredients.
+    '''
+
+    def __init__(self, group_data:list, item_data:list, item_ingredient_quantity:dict, recipes:recipe_matrix = None):
+        self.recipes = recipes if recipes is not None else recipe_matrix(item_ingredient_quantity)
+        counts, amounts = get_item_totals(item_data)
+        self.items = list(counts)
+        self.item_index = {item: i for i, item in enumerate(self.items)}
+        self.ingredients = list(self.recipes.ingredients)
+        self.base_earnings = calculate_monthly_earnings(group_data)
+        self.base_counts = np.array([counts[item] for item in self.items], dtype=np.float64)
+        self.base_amounts = np.array([amounts[item] for item in self.items], dtype=np.float64)
+        #Each item's ingredient usage at its real count, so demand is just multipliers @ this
+        sales_row = build_sales_matrix([item_data], self.recipes.item_index)[0]
+        self.item_demand = np.zeros((len(self.items), len(self.ingredients)))
+        for item, i in self.recipes.item_index.items():
+            if sales_row[i]:
+                self.item_demand[self.item_index[item]] = sales_row[i]*self.recipes.quantities[i]
+
+    @classmethod
+    def from_insights(cls, insights, month:int):
+        '''Engine for one month of a loaded overall_insights, from the item rows it already holds'''
+        levels = insights.get_month_levels(month)
+        return cls(levels["group"], levels["item"], insights.ingredient_data, insights.recipes)
+
+    # ---------------
+    # Building scenarios
+    # ---------------
+    def identity(self, scenario_count:int = 1) -> np.ndarray:
+        return np.ones((scenario_count, len(self.items)))
+
+    def make_scenarios(self, changes:list) -> tuple:
+        '''(count multipliers, price multipliers) from a list of {item: (count multiplier, price multiplier)}
+
+        e.g. [{"Beef Ramen": (1.2, 1.0)}, {"Chicken Ramen": (0, 1)}] is "Beef Ramen sells 20% more" and
+        "Chicken Ramen is dropped". Unknown items (including category names) raise KeyError.
+        '''
+        counts = self.identity(len(changes))
+        prices = self.identity(len(changes))
+        for s, change in enumerate(changes):
+            for item, (count_multiplier, price_multiplier) in change.items():
+                if item not in self.item_index:
+                    raise KeyError(f"'{item}' is not an item sold this month")
+                counts[s, self.item_index[item]] = count_multiplier
+                prices[s, self.item_index[item]] = price_multiplier
+        return counts, prices
+
+    def random_scenarios(self, scenario_count:int, count_spread:float = 0.1, price_spread:float = 0.0,
+                         seed:int = None) -> tuple:
+        '''Independent normal perturbations around 1 for a sweep, clipped at 0'''
+        rng = np.random.default_rng(seed)
+        shape = (scenario_count, len(self.items))
+        counts = np.clip(rng.normal(1.0, count_spread, shape), 0, None)
+        prices = np.clip(rng.normal(1.0, price_spread, shape), 0, None) if price_spread else np.ones(shape)
+        return counts, prices
+
+    # ---------------
+    # Evaluation
+    # ---------------
+    def evaluate(self, count_multipliers:np.ndarray, price_multipliers:np.ndarray = None,
+                 chunk_size:int = CHUNK_SIZE) -> dict:
+        '''{"earnings": (scenarios,), "ingredient_demand": (scenarios, ingredients), "item_counts": (scenarios, items)}
+
+        Takes scenarios x items multiplier arrays (a single 1-D vector is one scenario).
+        '''
+        counts = np.atleast_2d(np.asarray(count_multipliers, dtype=np.float64))
+        prices = np.ones_like(counts) if price_multipliers is None else np.atleast_2d(np.asarray(price_multipliers, dtype=np.float64))
+        if counts.shape[1] != len(self.items) or prices.shape != counts.shape:
+            raise ValueError(f"Expected scenarios x {len(self.items)} multipliers, got {counts.shape} and {prices.shape}")
+        earnings = np.empty(counts.shape[0])
+        demand = np.empty((counts.shape[0], len(self.ingredients)))
+        fixed_earnings = self.base_earnings - self.base_amounts.sum()
+        for start in range(0, counts.shape[0], chunk_size):
+            chunk = slice(start, start + chunk_size)
+            earnings[chunk] = fixed_earnings + (counts[chunk]*prices[chunk]) @ self.base_amounts
+            demand[chunk] = counts[chunk] @ self.item_demand
+        return {"earnings": earnings, "ingredient_demand": demand, "item_counts": counts*self.base_counts}
+
+    def summarize(self, result:dict, percentiles = PERCENTILES) -> dict:
+        '''Distribution of earnings and of each ingredient's demand over the scenarios'''
+        return {"earnings": describe(result["earnings"], percentiles),
+                "ingredients": {ingredient: describe(result["ingredient_demand"][:, j], percentiles)
+                                for j, ingredient in enumerate(self.ingredients)}}
+
+def get_item_totals(item_data:list) -> tuple:
+    '''({item: count}, {item: amount}) in first-seen order, repeated names adding up like build_sales_matrix'''
+    counts = {}
+    amounts = {}
+    for row in item_data:
+        name = row["name"]
+        counts[name] = counts.get(name, 0) + row["count"]
+        amounts[name] = amounts.get(name, 0.0) + row["amount"]
+    return counts, amounts
+
+def describe(values:np.ndarray, percentiles = PERCENTILES) -> dict:
+    stats = {"mean": float(values.mean()), "std": float(values.std()),
+             "min": float(values.min()), "max": float(values.max())}
+    for p, value in zip(percentiles, np.percentile(values, percentiles).tolist()):
+        stats[f"p{p}"] = value
+    return stats
@@ -1,6 +1,10 @@
 import pandas as pd
 import re
 
+#Deliveries per month at each frequency, "biweekly" being every two weeks. inventory_simulation spaces
+#its deliveries from this same table, so amount_per_month is what it delivers over a month
+SHIPMENTS_PER_MONTH = {"weekly":4,"biweekly":2,"monthly":1}
+
 def process_shipment_data(path:str) -> dict:
     ingredients_data = []
     all_data_raw = ""
@@ -8,12 +12,15 @@ def process_shipment_data(path:str) -> dict:
     all_data_raw = temp_data.to_string()
     rows = all_data_raw.split("\n")
     rows.pop(0)
-    shipment_amount = {"weekly":4,"biweekly":8,"monthly":1}
     for row in rows:
         temp = re.split(pattern=r"\s{2,}",string=row)
         ingredient_data = {}
         ingredient_data["ingredient"] = temp[1]
         ingredient_data["unit_of_shipment"] = temp[3]
-        ingredient_data["amount_per_month"] = int(temp[2])*int(temp[4])*shipment_amount[temp[5].lower()]
+        ingredient_data["amount_per_month"] = int(temp[2])*int(temp[4])*SHIPMENTS_PER_MONTH[temp[5].lower()]
+        #Schedule kept so the inventory simulation can place deliveries on days
+        ingredient_data["quantity_per_shipment"] = int(temp[2])
+        ingredient_data["number_of_shipments"] = int(temp[4])
+        ingredient_data["frequency"] = temp[5].lower()
         ingredients_data.append(ingredient_data)
     return ingredients_data
\ No newline at end of file
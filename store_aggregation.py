@@ -0,0 +1,211 @@
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from calculate_total import calculate_monthly_earnings
+from data_loading import DATA_YEAR, INGREDIENT_FILE_NAME, SALE_FILE_NAMES, get_loaders, resolve_workers
+from ingredient_matrix import build_sales_matrix, calculate_ingredient_demand, demand_to_dicts, recipe_matrix
+from ingredient_popularity import get_monthly_item_popularity
+from lazy_attributes import invalidate, is_computed, lazy_attribute
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+YEAR_PATTERN = re.compile(r"(?<!\d)((?:19|20)\d\d)")
+
+def get_month_label(path:str) -> str:
+    '''"May" from ".../May_Data_Matrix (1).xlsx", the part of the file name before the first underscore'''
+    return os.path.basename(path).split("_")[0]
+
+def get_file_year(path:str) -> int:
+    '''First 19xx/20xx in the file name, e.g. 2025 from "October_Data_Matrix_20251103_214000.xlsx", None without one'''
+    match = YEAR_PATTERN.search(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+def get_month_key(path:str, year:int = None) -> str:
+    '''"2025-05" for ".../May_Data_Matrix (1).xlsx" in 2025, so the same month of two years stays apart.
+
+    A year in the file name wins over year. Months fed from a transaction log ("pos.jsonl#2025-11")
+    already carry their key. Without a year, or for labels that aren't month names, this is just
+    get_month_label.
+    '''
+    if "#" in path:
+        return path.rsplit("#", 1)[1]
+    label = get_month_label(path)
+    year = get_file_year(path) or year
+    if label not in MONTH_NAMES or year is None:
+        return label
+    return f"{year}-{MONTH_NAMES.index(label) + 1:02d}"
+
+def get_file_label(label:str) -> str:
+    '''Store/month name made safe for a file name'''
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "unnamed"
+
+def month_sort_key(label:str):
+    #Calendar names sort by month, anything else (e.g. "2025-05") as text after them, which is date order for month keys
+    if label in MONTH_NAMES:
+        return (0, MONTH_NAMES.index(label), "")
+    return (1, 0, label)
+
+# ---------------------------
+# Partials: per-store results that add up into chain totals
+# ---------------------------
+
+def empty_partial() -> dict:
+    return {"stores": [], "earnings": {}, "items": {}, "ingredients": {}}
+
+def build_store_partial(store_name:str, sale_files:list, ingredient_file:str = INGREDIENT_FILE_NAME,
+                        use_cache:bool = True, year:int = None) -> dict:
+    '''Map step: one store's workbooks reduced to earnings, item counts and ingredient usage per month key'''
+    load_sale, _, load_ingredient = get_loaders(use_cache)
+    recipes = recipe_matrix(load_ingredient(ingredient_file))
+    partial = empty_partial()
+    partial["stores"] = [store_name]
+    for path in sale_files:
+        group_data, item_data = load_sale(path)
+        month = get_month_key(path, year)
+        ingredient_pop = demand_to_dicts(calculate_ingredient_demand(build_sales_matrix([item_data], recipes.item_index), recipes), recipes)[0]
+        add_month_values(partial, month, calculate_monthly_earnings(group_data),
+                         get_monthly_item_popularity(item_data), ingredient_pop)
+    return partial
+
+def add_month_values(partial:dict, month:str, earnings:float, item_pop:dict, ingredient_pop:dict):
+    partial["earnings"][month] = partial["earnings"].get(month, 0) + earnings
+    add_counts(partial["items"].setdefault(month, {}), item_pop)
+    add_counts(partial["ingredients"].setdefault(month, {}), ingredient_pop)
+
+def add_counts(totals:dict, counts:dict):
+    for key, value in counts.items():
+        totals[key] = totals.get(key, 0) + value
+
+def merge_partials(a:dict, b:dict) -> dict:
+    '''Reduce step: sums two partials into a new one. Associative and commutative, so any grouping works'''
+    merged = empty_partial()
+    merged["stores"] = sorted(set(a["stores"]) | set(b["stores"]))
+    for partial in (a, b):
+        for month, earnings in partial["earnings"].items():
+            merged["earnings"][month] = merged["earnings"].get(month, 0) + earnings
+        for field in ("items", "ingredients"):
+            for month, counts in partial[field].items():
+                add_counts(merged[field].setdefault(month, {}), counts)
+    return merged
+
+def merge_all(partials) -> dict:
+    return reduce(merge_partials, partials, empty_partial())
+
+def add_partial(total:dict, key_counts:Counter, partial:dict, sign:int):
+    '''Adds (sign=1) or takes back out (sign=-1) one store's partial from a running total in place.
+
+    key_counts holds how many partials have each month/key, so a key leaves the total with the last
+    partial that had it instead of lingering at (almost) zero.
+    '''
+    stores = set(total["stores"])
+    total["stores"] = sorted(stores | set(partial["stores"]) if sign > 0 else stores - set(partial["stores"]))
+    for month, earnings in partial["earnings"].items():
+        add_value(total["earnings"], key_counts, ("earnings", month), month, sign*earnings, sign)
+    for field in ("items", "ingredients"):
+        for month, counts in partial[field].items():
+            month_totals = total[field].setdefault(month, {})
+            for key, value in counts.items():
+                add_value(month_totals, key_counts, (field, month, key), key, sign*value, sign)
+            key_counts[(field, month)] += sign
+            if key_counts[(field, month)] <= 0:
+                del total[field][month]
+
+def add_value(totals:dict, key_counts:Counter, count_key:tuple, key, value, sign:int):
+    totals[key] = totals.get(key, 0) + value
+    key_counts[count_key] += sign
+    if key_counts[count_key] <= 0:
+        del totals[key]
+
+def to_month_lists(partial:dict) -> dict:
+    '''Partial as month-ordered lists, the same shapes overall_insights uses'''
+    months = sorted(set(partial["earnings"]) | set(partial["items"]) | set(partial["ingredients"]), key=month_sort_key)
+    return {"months": months,
+            "yearly_earnings": [partial["earnings"].get(month, 0) for month in months],
+            "item_pops": [partial["items"].get(month, {}) for month in months],
+            "ingredient_pops": [partial["ingredients"].get(month, {}) for month in months]}
+
+def get_store_partial(args:tuple) -> dict:
+    return build_store_partial(*args)
+
+# ---------------------------
+# Chain rollup
+# ---------------------------
+
+class store_rollup:
+    '''Keeps one partial per store and the chain total merged from them.
+
+    stores maps a store name to {"sale_files": [...], "ingredient_file": path (optional)}.
+    Stores are processed side by side in a process pool, so a full rollup takes about as long as
+    the slowest store. Months are keyed "YYYY-MM" (see get_month_key), a store's "year" entry covering
+    files whose names carry no year. update_store re-processes one store and moves the total by that
+    store's difference, the other partials aren't merged again.
+    '''
+
+    def __init__(self, stores:dict, use_cache:bool = True, workers = None):
+        self.stores = dict(stores)
+        self.use_cache = use_cache
+        self.partials = process_stores(self.stores, use_cache, workers)
+
+    def update_store(self, store_name:str, store:dict = None):
+        '''Re-runs one store (new or changed) without touching the others'''
+        if store is not None:
+            self.stores[store_name] = store
+        partial = build_store_partial(*get_store_args(store_name, self.stores[store_name], self.use_cache))
+        self.patch_total(self.partials.get(store_name), partial)
+        self.partials[store_name] = partial
+
+    def remove_store(self, store_name:str):
+        del self.stores[store_name]
+        self.patch_total(self.partials.pop(store_name), None)
+
+    def patch_total(self, old:dict, new:dict):
+        '''Subtracts a store's old partial from the total and adds its new one'''
+        if is_computed(self, "running_total"):
+            total, key_counts = self.running_total
+            if old is not None:
+                add_partial(total, key_counts, old, -1)
+            if new is not None:
+                add_partial(total, key_counts, new, 1)
+        invalidate(self, "month_lists")
+
+    @lazy_attribute("partials")
+    def running_total(self) -> tuple:
+        '''(total, key_counts), see add_partial'''
+        total, key_counts = empty_partial(), Counter()
+        for store_name in sorted(self.partials):
+            add_partial(total, key_counts, self.partials[store_name], 1)
+        return total, key_counts
+
+    @lazy_attribute("running_total")
+    def total(self) -> dict:
+        return self.running_total[0]
+
+    @lazy_attribute("total")
+    def month_lists(self) -> dict:
+        return to_month_lists(self.total)
+
+def get_store_args(store_name:str, store:dict, use_cache:bool) -> tuple:
+    return (store_name, list(store["sale_files"]), store.get("ingredient_file", INGREDIENT_FILE_NAME), use_cache,
+            store.get("year"))
+
+def process_stores(stores:dict, use_cache:bool = True, workers = None) -> dict:
+    '''store name -> partial, one process per store when workers allows'''
+    args = [get_store_args(store_name, store, use_cache) for store_name, store in stores.items()]
+    workers = min(resolve_workers(workers), max(1, len(args)))
+    if workers <= 1:
+        return {arg[0]: build_store_partial(*arg) for arg in args}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return {arg[0]: partial for arg, partial in zip(args, pool.map(get_store_partial, args))}
+
+DEFAULT_STORES = {"Mai Shen Yun": {"sale_files": SALE_FILE_NAMES, "year": DATA_YEAR}}
+
+def load_stores(path:str = None) -> dict:
+    '''Stores from a JSON file (store name -> {"sale_files", "ingredient_file", "shipment_file", "year"}), DEFAULT_STORES without one'''
+    if path is None:
+        return DEFAULT_STORES
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,93 @@
+import csv
+import os
+import random
+import pandas as pd
+from store_aggregation import MONTH_NAMES
+
+GROUP_NAMES = ["Lunch Menu", "All Day Menu", "Signature Drinks", "Open Food"]
+CATEGORY_COUNT = 20
+SHIPMENT_FREQUENCIES = ["weekly", "biweekly", "monthly"]
+
+def get_item_names(item_count:int) -> list:
+    return [f"Item {i}" for i in range(item_count)]
+
+def get_ingredient_names(ingredient_count:int) -> list:
+    return [f"Ingredient {j} (g)" for j in range(ingredient_count)]
+
+def get_month_labels(month_count:int) -> list:
+    #Calendar names for the first year (like the real exports), then YYYY-MM
+    if month_count <= len(MONTH_NAMES):
+        return MONTH_NAMES[:month_count]
+    return [f"{2020 + m//12}-{m%12 + 1:02d}" for m in range(month_count)]
+
+def format_count(value:int) -> str:
+    return f"{value:,}"
+
+def format_amount(value:float) -> str:
+    return f"${value:,.2f}"
+
+def make_table(name_column:str, names:list, counts:list, amounts:list) -> pd.DataFrame:
+    return pd.DataFrame({"source_page": 1, "source_table": 1, name_column: names,
+                         "Count": [format_count(c) for c in counts], "Amount": [format_amount(a) for a in amounts]})
+
+def write_month_workbook(path:str, item_names:list, rng:random.Random):
+    '''One *_Data_Matrix workbook with the same three tables as the real exports'''
+    counts = [rng.randint(0, 500) for _ in item_names]
+    amounts = [count*rng.uniform(5, 20) for count in counts]
+    categories = [f"Category {i % CATEGORY_COUNT}" for i in range(len(item_names))]
+    category_counts = {}
+    category_amounts = {}
+    for category, count, amount in zip(categories, counts, amounts):
+        category_counts[category] = category_counts.get(category, 0) + count
+        category_amounts[category] = category_amounts.get(category, 0) + amount
+    total_amount = sum(amounts)
+    shares = [rng.random() for _ in GROUP_NAMES]
+    group_amounts = [total_amount*share/sum(shares) for share in shares]
+    group_counts = [int(sum(counts)*share/sum(shares)) for share in shares]
+    with pd.ExcelWriter(path) as writer:
+        make_table("Group", GROUP_NAMES, group_counts, group_amounts).to_excel(writer, sheet_name="data 1", index=False)
+        make_table("Category", list(category_counts), list(category_counts.values()),
+                   list(category_amounts.values())).to_excel(writer, sheet_name="data 2", index=False)
+        make_table("Item Name", item_names, counts, amounts).to_excel(writer, sheet_name="data 3", index=False)
+
+def write_ingredient_csv(path:str, item_names:list, ingredient_names:list, rng:random.Random, density:float = 0.3):
+    '''Recipe matrix in the MSY Data - Ingredient.csv layout, blanks where an item doesn't use an ingredient'''
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Item name"] + ingredient_names)
+        for item in item_names:
+            writer.writerow([item] + [round(rng.uniform(1, 200), 1) if rng.random() < density else ""
+                                      for _ in ingredient_names])
+
+def write_shipment_csv(path:str, ingredient_names:list, rng:random.Random):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Ingredient", "Quantity per shipment", "Unit of shipment", "Number of shipments", "frequency"])
+        for ingredient in ingredient_names:
+            writer.writerow([ingredient, rng.randint(5, 100), "lbs", rng.randint(1, 5), rng.choice(SHIPMENT_FREQUENCIES)])
+
+def generate_dataset(directory:str, items:int = 100, ingredients:int = 20, months:int = 6, stores:int = 1,
+                     seed:int = 0) -> dict:
+    '''Writes a synthetic dataset and returns its layout.
+
+    Every store gets its own folder of month workbooks. The ingredient and shipment CSVs are shared.
+    Returns {"ingredient_file", "shipment_file", "stores": {store: {"sale_files": [...]}}}.
+    '''
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    item_names = get_item_names(items)
+    ingredient_names = get_ingredient_names(ingredients)
+    dataset = {"ingredient_file": os.path.join(directory, "MSY Data - Ingredient.csv"),
+               "shipment_file": os.path.join(directory, "MSY Data - Shipment.csv"), "stores": {}}
+    write_ingredient_csv(dataset["ingredient_file"], item_names, ingredient_names, rng)
+    write_shipment_csv(dataset["shipment_file"], ingredient_names, rng)
+    for store in range(stores):
+        store_dir = os.path.join(directory, f"store_{store}")
+        os.makedirs(store_dir, exist_ok=True)
+        sale_files = []
+        for label in get_month_labels(months):
+            path = os.path.join(store_dir, f"{label}_Data_Matrix.xlsx")
+            write_month_workbook(path, item_names, rng)
+            sale_files.append(path)
+        dataset["stores"][f"store_{store}"] = {"sale_files": sale_files, "ingredient_file": dataset["ingredient_file"]}
+    return dataset
@@ -0,0 +1,71 @@
+import os
+import shutil
+import pytest
+from data_loading import DATA_DIR
+from file_watcher import apply_changes, directory_watcher, get_file_kind, scan_directory
+from overall_insights import overall_insights
+
+SALE_NAMES = ["May_Data_Matrix (1).xlsx", "June_Data_Matrix.xlsx", "July_Data_Matrix (1).xlsx",
+              "August_Data_Matrix (1).xlsx", "September_Data_Matrix.xlsx", "October_Data_Matrix_20251103_214000.xlsx"]
+
+@pytest.fixture
+def data_dir(tmp_path) -> str:
+    directory = str(tmp_path / "data")
+    shutil.copytree(DATA_DIR, directory)
+    return directory
+
+def load(directory:str, names:list) -> overall_insights:
+    return overall_insights(use_cache=False, sale_file_names=[os.path.join(directory, name) for name in names],
+                            shipment_file_name=os.path.join(directory, "MSY Data - Shipment.csv"),
+                            ingredient_file_name=os.path.join(directory, "MSY Data - Ingredient.csv"))
+
+def settle(watcher:directory_watcher) -> dict:
+    '''Polls until a change held still for a poll and is reported'''
+    watcher.poll()
+    return watcher.poll()
+
+def test_lock_and_hidden_files_are_ignored(data_dir):
+    shutil.copy(os.path.join(data_dir, "June_Data_Matrix.xlsx"), os.path.join(data_dir, "~$June_Data_Matrix.xlsx"))
+    open(os.path.join(data_dir, ".November_Data_Matrix.xlsx"), "w").close()
+    assert get_file_kind("~$June_Data_Matrix.xlsx") is None
+    assert not any(os.path.basename(path).startswith(("~$", ".")) for path in scan_directory(data_dir))
+    watcher = directory_watcher(data_dir)
+    open(os.path.join(data_dir, "~$May_Data_Matrix (1).xlsx"), "w").close()
+    assert settle(watcher) == {"added": [], "changed": [], "removed": []}
+
+def test_failed_change_is_reported_again_until_committed(data_dir):
+    insights = load(data_dir, SALE_NAMES)
+    watcher = directory_watcher(data_dir)
+    broken = os.path.join(data_dir, "November_Data_Matrix.xlsx")
+    with open(broken, "wb") as f:
+        f.write(b"not a workbook")
+    changes = settle(watcher)
+    assert changes["added"] == [broken]
+    with pytest.raises(Exception):
+        apply_changes(insights.copy(), changes)
+    assert settle(watcher)["added"] == [broken] #Not committed, so it comes back
+    watcher.commit(changes)
+    assert settle(watcher) == {"added": [], "changed": [], "removed": []}
+
+def test_patched_copy_matches_a_fresh_load(data_dir):
+    insights = load(data_dir, SALE_NAMES)
+    earnings = list(insights.yearly_earnings)
+    insights.projected_earnings, insights.top_k("items", 3, 0), insights.cube.month_earnings() #Computed before the patch
+    watcher = directory_watcher(data_dir)
+    os.remove(os.path.join(data_dir, "June_Data_Matrix.xlsx"))
+    shutil.copy(os.path.join(data_dir, "May_Data_Matrix (1).xlsx"), os.path.join(data_dir, "November_Data_Matrix.xlsx"))
+    changes = settle(watcher)
+    patched = insights.copy()
+    result = apply_changes(patched, changes)
+    assert result["inputs"] == ["sales"]
+    fresh = load(data_dir, [name for name in SALE_NAMES if name != "June_Data_Matrix.xlsx"] + ["November_Data_Matrix.xlsx"])
+    assert [os.path.basename(path) for path in patched.sale_file_names] == [os.path.basename(path) for path in fresh.sale_file_names]
+    assert patched.yearly_earnings == fresh.yearly_earnings
+    assert patched.total_pop_items == fresh.total_pop_items
+    assert patched.total_pop_ingredients == pytest.approx(fresh.total_pop_ingredients)
+    assert patched.projected_earnings == pytest.approx(fresh.projected_earnings)
+    assert patched.top_k("items", 3, 0) == fresh.top_k("items", 3, 0)
+    assert list(patched.cube.months) == list(fresh.cube.months)
+    assert list(patched.cube.month_earnings()) == pytest.approx(list(fresh.cube.month_earnings()))
+    assert insights.yearly_earnings == earnings and len(insights.sale_file_names) == len(SALE_NAMES) #Original untouched
+    assert insights.cube.month_earnings() == pytest.approx(earnings)
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+import pytest
+from history_store import history_store
+
+def make_insights(file_names:list, earnings:list) -> SimpleNamespace:
+    '''The parts of overall_insights append_insights reads, one "Ramen" row per month'''
+    return SimpleNamespace(sale_file_names=file_names, yearly_earnings=earnings,
+                           item_pops=[{"Ramen": i + 1} for i in range(len(file_names))],
+                           sales_data=[([], [{"name": "Ramen", "count": i + 1, "amount": 10.0*(i + 1)}]) for i in range(len(file_names))],
+                           ingredient_pops=[{"Noodles (g)": 100.0*(i + 1)} for i in range(len(file_names))])
+
+def test_same_month_of_two_years_keeps_both_rows(tmp_path):
+    store = history_store(str(tmp_path / "store"))
+    assert store.append_insights(make_insights(["May_Data_Matrix.xlsx"], [100.0]), year=2024) == ["2024-05"]
+    assert store.append_insights(make_insights(["May_Data_Matrix.xlsx"], [200.0]), year=2025) == ["2025-05"]
+    reopened = history_store(str(tmp_path / "store"))
+    assert reopened.months == ["2024-05", "2025-05"]
+    assert reopened.earnings() == {"2024-05": 100.0, "2025-05": 200.0}
+    assert reopened.get_month("item_counts", "2024-05") == {"Ramen": 1}
+
+def test_year_from_the_file_name(tmp_path):
+    store = history_store(str(tmp_path / "store"))
+    written = store.append_insights(make_insights(["May_Data_Matrix_20240601.xlsx", "May_Data_Matrix_20250601.xlsx"], [1.0, 2.0]))
+    assert written == ["2024-05", "2025-05"]
+    assert store.totals("item_amounts") == {"Ramen": 30.0}
+
+def test_month_without_a_year_is_refused(tmp_path):
+    store = history_store(str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+        store.append_insights(make_insights(["May_Data_Matrix.xlsx"], [1.0]))
+    assert store.append_insights(make_insights(["May_Data_Matrix.xlsx"], [1.0]), labels=["May 2023"]) == ["May 2023"]
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from insights_server import dispatch, handle_connection, insights_service
+from overall_insights import overall_insights
+
+@pytest.fixture(scope="module")
+def service() -> insights_service:
+    service = insights_service(lambda: overall_insights(use_cache=False))
+    service.refresh(service.load_insights())
+    return service
+
+def request(service:insights_service, raw:bytes) -> bytes:
+    '''Sends raw to a server on a free port and returns everything it answers before closing'''
+    async def run():
+        server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(raw)
+            await writer.drain()
+            answer = await reader.read()
+            writer.close()
+            return answer
+    return asyncio.run(run())
+
+def test_matching_etag_gets_304(service):
+    status, body, etag = asyncio.run(dispatch(service, "GET", "/earnings", {}))
+    assert status == 200 and body
+    assert asyncio.run(dispatch(service, "GET", "/earnings", {"if-none-match": etag})) == (304, b"", etag)
+    assert asyncio.run(dispatch(service, "GET", "/earnings", {"if-none-match": '"stale"'}))[0] == 200
+
+def test_etag_survives_a_refresh_with_the_same_data(service):
+    _, _, etag = asyncio.run(dispatch(service, "GET", "/totals", {}))
+    service.refresh()
+    assert asyncio.run(dispatch(service, "GET", "/totals", {"if-none-match": etag}))[0] == 304
+
+def test_request_body_is_refused_unread(service):
+    answer = request(service, b"GET /earnings HTTP/1.1\r\nContent-Length: 1000000\r\n\r\nabc")
+    assert answer.startswith(b"HTTP/1.1 413 ")
+    assert b"Connection: close" in answer
+    answer = request(service, b"POST /reload HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\n")
+    assert answer.startswith(b"HTTP/1.1 413 ")
+
+def test_bad_content_length_is_400(service):
+    assert request(service, b"GET / HTTP/1.1\r\nContent-Length: -1\r\n\r\n").startswith(b"HTTP/1.1 400 ")
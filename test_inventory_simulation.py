@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from data_loading import SHIPMENT_FILE_NAME
+from inventory_simulation import DAYS_PER_MONTH, simulate, supply_plan
+from shipment_processing import process_shipment_data
+
+def make_shipment(frequency:str, quantity:int = 10) -> dict:
+    return {"ingredient": f"Rice {frequency}", "unit_of_shipment": "lbs", "amount_per_month": None,
+            "quantity_per_shipment": quantity, "number_of_shipments": 1, "frequency": frequency}
+
+def test_a_month_of_deliveries_is_amount_per_month():
+    shipments = process_shipment_data(SHIPMENT_FILE_NAME)
+    assert {shipment["frequency"] for shipment in shipments} == {"weekly", "biweekly", "monthly"}
+    plan = supply_plan(shipments, [])
+    delivered = plan.expand_schedule(DAYS_PER_MONTH).sum(axis=0)
+    assert list(delivered) == [shipment["amount_per_month"] for shipment in shipments]
+    assert list(plan.monthly_supply()) == list(delivered)
+
+def test_delivery_days():
+    plan = supply_plan([make_shipment("weekly"), make_shipment("biweekly"), make_shipment("monthly")], [])
+    deliveries = plan.expand_schedule(60)
+    assert [list(np.flatnonzero(deliveries[:, j])) for j in range(3)] == [[0, 7, 15, 22, 30, 37, 45, 52], [0, 15, 30, 45], [0, 30]]
+
+@pytest.mark.parametrize("spread", [0, -0.5, float("nan")])
+def test_spread_must_be_positive(spread):
+    plan = supply_plan([make_shipment("weekly")], [])
+    with pytest.raises(ValueError):
+        simulate(plan, {}, runs=10, spread=spread)
+
+def test_same_seed_same_results():
+    plan = supply_plan([make_shipment("weekly"), make_shipment("biweekly")], ["Rice (lbs)"])
+    plan.conversion[0] = [1.0, 1.0]
+    first = simulate(plan, {"Rice (lbs)": 30.0}, runs=300, seed=3, batch_size=100)
+    again = simulate(plan, {"Rice (lbs)": 30.0}, runs=300, seed=3, batch_size=100)
+    assert first == again
+    assert first["ingredients"]["Rice weekly"]["monthly_supply"] == 40.0
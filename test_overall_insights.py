@@ -0,0 +1,83 @@
+import pytest
+from data_loading import SALE_FILE_NAMES
+from overall_insights import overall_insights
+
+PATCHED = ["yearly_earnings", "item_pops", "ingredient_pops", "total_pop_items", "total_pop_ingredients",
+           "projected_earnings", "projected_pop_items", "projected_pop_ingredients", "sales_rows", "unmatched_recipe_items"]
+
+def load(file_names:list = SALE_FILE_NAMES, compact:bool = False) -> overall_insights:
+    insights = overall_insights(use_cache=False, sale_file_names=file_names, compact=compact)
+    for name in PATCHED:
+        getattr(insights, name) #Computed up front, so the patches below update them instead of rebuilding
+    return insights
+
+def assert_close(a, b, name:str):
+    '''Compares nested lists and mappings, floats up to rounding from the order they were summed in'''
+    if hasattr(a, "tolist"):
+        a, b = a.tolist(), b.tolist()
+    if isinstance(a, (list, tuple)):
+        assert len(a) == len(b), name
+        for part_a, part_b in zip(a, b):
+            assert_close(part_a, part_b, name)
+    elif hasattr(a, "items"):
+        assert set(a.keys()) == set(b.keys()), name
+        for key in a.keys():
+            assert_close(a[key], b[key], f"{name}[{key!r}]")
+    elif isinstance(a, float):
+        assert a == pytest.approx(b), name
+    else:
+        assert a == b, name
+
+def assert_same(patched:overall_insights, fresh:overall_insights):
+    assert patched.sale_file_names == fresh.sale_file_names
+    for name in PATCHED:
+        assert_close(getattr(patched, name), getattr(fresh, name), name)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_remove_and_insert_match_a_fresh_load(compact):
+    insights = load(compact=compact)
+    category_rows = insights.category_row_counts[2]
+    month_data = insights.remove_month(2)
+    assert_same(insights, load(SALE_FILE_NAMES[:2] + SALE_FILE_NAMES[3:], compact))
+    insights.insert_month(2, month_data, SALE_FILE_NAMES[2], category_rows)
+    assert_same(insights, load(compact=compact))
+
+def test_add_and_replace_month_files():
+    insights = load(SALE_FILE_NAMES[:3])
+    for path in SALE_FILE_NAMES[3:]:
+        insights.add_month_file(path)
+    assert_same(insights, load())
+    month_data, category_rows = insights.load_month(SALE_FILE_NAMES[1])
+    insights.replace_month(0, month_data, category_rows=category_rows)
+    assert insights.sale_file_names[0] == SALE_FILE_NAMES[0] #Replacing keeps the month's file name
+    assert insights.yearly_earnings[0] == insights.yearly_earnings[1]
+    assert insights.total_earnings == pytest.approx(sum(insights.yearly_earnings))
+
+def ranked(values) -> list:
+    return sorted(values.items(), key=lambda kv: kv[1], reverse=True)
+
+@pytest.mark.parametrize("metric,month", [("items", 0), ("ingredients", 5), ("total_items", None),
+                                          ("total_ingredients", None), ("projected_items", None)])
+def test_top_k_matches_a_full_sort(metric, month):
+    insights = load()
+    full = ranked(insights.get_metric(metric, month))
+    for k in [1, 5, 3]:
+        assert insights.top_k(metric, k, month) == full[:k]
+    assert insights.rankings[(metric, month)][0] == 5 #A smaller k is a slice of the longest so far
+    assert insights.top_k(metric, None, month) == full
+    assert insights.top_k(metric, len(full) + 5, month) == full
+
+def test_top_k_rejects_unknown_metrics_and_missing_months():
+    insights = load(SALE_FILE_NAMES[:2])
+    with pytest.raises(ValueError, match="Unknown metric"):
+        insights.top_k("dishes", 3)
+    with pytest.raises(ValueError, match="per month"):
+        insights.top_k("items", 3)
+
+def test_top_k_follows_month_patches():
+    insights = load()
+    insights.top_k("total_items", 5)
+    month_data = insights.remove_month(0)
+    assert insights.top_k("total_items", 5) == ranked(insights.total_pop_items)[:5]
+    insights.add_month(month_data)
+    assert insights.top_k("total_items", 5) == ranked(load().total_pop_items)[:5]
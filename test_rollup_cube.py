@@ -0,0 +1,84 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from data_loading import DATA_DIR, SALE_FILE_NAMES
+from overall_insights import overall_insights
+from report_data import get_cube_items
+from rollup_cube import OTHER_CATEGORY, get_largest, rollup_cube
+
+def record(name:str, count:int, amount:float) -> dict:
+    return {"name": name, "count": count, "amount": amount}
+
+def make_month(items:list, categories:list = ()) -> dict:
+    return {"group": [record("Food", sum(c for _, c, _ in items), sum(a for _, _, a in items))],
+            "category": [record(*row) for row in categories], "item": [record(*row) for row in items]}
+
+MONTHS = [("May", make_month([("Beef Ramen", 5, 50.0), ("Water", 9, 9.0), ("Wonton", 2, 8.0)],
+                             [("Ramen", 5, 50.0), ("Drink", 9, 9.0), ("Appetizer", 2, 8.0)])),
+          ("June", make_month([("Beef Ramen", 3, 30.0), ("Chicken Ramen", 3, 33.0)], [("Ramen", 6, 63.0)]))]
+
+def assert_same_cube(a:rollup_cube, b:rollup_cube):
+    assert a.months == b.months
+    assert a.month_earnings() == pytest.approx(b.month_earnings())
+    for months in [None, (0, len(a.months) - 1)] + list(range(len(a.months))):
+        assert dict(a.top_items(None, months)) == pytest.approx(dict(b.top_items(None, months)))
+        assert {name: share for name, share in a.category_share(months).items() if share} == pytest.approx(
+            {name: share for name, share in b.category_share(months).items() if share})
+
+def test_shares_come_from_the_category_sheet():
+    cube = rollup_cube({"Store": MONTHS}, months=["May", "June"])
+    assert cube.category_share("June") == {"Ramen": 1.0, "Drink": 0.0, "Appetizer": 0.0}
+    assert sum(cube.category_share().values()) == pytest.approx(1.0)
+    assert cube.month_earnings() == [67.0, 63.0]
+    assert cube.top_items(2, ("May", "June")) == [("Water", 9.0), ("Beef Ramen", 8.0)]
+
+def test_item_categories_only_from_a_mapping():
+    log_month = ("July", make_month([("Beef Ramen", 1, 10.0), ("Water", 1, 1.0)]))
+    cube = rollup_cube({"Store": MONTHS + [log_month]}, months=["May", "June", "July"])
+    assert cube.category_items("Ramen") == []
+    assert cube.category_items(OTHER_CATEGORY) == cube.items
+    assert not any(cube.category_share("July").values()) #No Category sheet and no mapping, no shares
+    mapped = rollup_cube({"Store": MONTHS + [log_month]}, {"Beef Ramen": "Ramen", "Chicken Ramen": "Ramen"},
+                         months=["May", "June", "July"])
+    assert mapped.category_items("Ramen") == ["Beef Ramen", "Chicken Ramen"]
+    assert mapped.category_share("July")["Ramen"] == 1.0
+    assert mapped.top_items(1, category="Ramen") == [("Beef Ramen", 9.0)]
+
+def test_partial_top_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        values = rng.integers(0, 5, size=rng.integers(0, 20)).astype(float)
+        n = int(rng.integers(0, 25))
+        assert get_largest(values, n).tolist() == np.argsort(-values, kind="stable")[:n].tolist()
+    cube = rollup_cube({"Store": MONTHS}, months=["May", "June"])
+    assert cube.top_items(2, exclude=["Water"]) == [("Beef Ramen", 8.0), ("Chicken Ramen", 3.0)]
+    assert cube.top_items(None, exclude={"Water", "Wonton"}) == [("Beef Ramen", 8.0), ("Chicken Ramen", 3.0)]
+
+def test_patched_months_match_a_rebuild():
+    cube = rollup_cube({"Store": MONTHS[:1]}, months=["May"])
+    assert cube.insert_month(0, MONTHS[1][1], ["June", "May"])
+    assert_same_cube(cube, rollup_cube({"Store": [MONTHS[1], MONTHS[0]]}, months=["June", "May"]))
+    cube.remove_month(1, ["June"])
+    assert_same_cube(cube, rollup_cube({"Store": MONTHS[1:]}, months=["June"]))
+    assert not cube.insert_month(1, make_month([("Bingsu", 1, 7.0)], [("Dessert", 1, 7.0)]), ["June", "July"])
+    assert cube.months == ["June"] #A new category is left to a rebuild
+
+def test_insights_cube_needs_no_files(tmp_path):
+    directory = str(tmp_path / "data")
+    shutil.copytree(DATA_DIR, directory)
+    insights = overall_insights(use_cache=False, sale_file_names=[os.path.join(directory, os.path.basename(path)) for path in SALE_FILE_NAMES],
+                                shipment_file_name=os.path.join(directory, "MSY Data - Shipment.csv"),
+                                ingredient_file_name=os.path.join(directory, "MSY Data - Ingredient.csv"))
+    shutil.rmtree(directory) #Built from the rows insights holds, not by parsing the workbooks again
+    cube = insights.cube
+    assert cube.month_earnings() == pytest.approx(insights.yearly_earnings)
+    assert cube.months == ["May", "June", "July", "August", "September", "October"]
+    assert all(cube.category_share(month) for month in range(len(cube.months)))
+    assert all(name != "Water" for name, _ in get_cube_items(insights, 20))
+    category_rows = insights.category_row_counts[2]
+    month_data = insights.remove_month(2)
+    insights.insert_month(2, month_data, "July_Data_Matrix.xlsx", category_rows)
+    insights.add_month(([record("Total", 2, 20.0)], [record("Beef Ramen", 2, 20.0)]), "pos.jsonl#2025-11")
+    assert insights.cube is cube #Patched a month at a time
+    assert_same_cube(cube, rollup_cube.from_insights(insights))
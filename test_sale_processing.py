@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+import data_cache
+from data_cache import cached_sale_data, cached_sale_levels
+from data_loading import SALE_FILE_NAMES
+from sale_processing import process_sale_data, process_sale_levels
+
+def write_workbook(path:str):
+    '''Tables in any sheet order with the extra columns and $/thousands formatting of the real exports'''
+    sheets = {"data 3": pd.DataFrame({"source_page": [1, 1, 1], "Item Name": ["Beef Ramen ", "Water", None],
+                                      "Count": ["1,204", "3", ""], "Amount": ["$15,050.00", "$3.00", ""]}),
+              "notes": pd.DataFrame({"Note": ["exported by POS"]}),
+              "data 1": pd.DataFrame({"Group": ["All Day Menu"], "Count": ["1,207"], "Amount": ["$15,053.00"]}),
+              "data 2": pd.DataFrame({"Category": ["Ramen", "Drink"], "Count": ["1,204", "3"], "Amount": ["$15,050.00", "$3.00"]})}
+    with pd.ExcelWriter(path) as writer:
+        for name, sheet in sheets.items():
+            sheet.to_excel(writer, sheet_name=name, index=False)
+
+def test_tables_are_found_by_their_columns(tmp_path):
+    path = str(tmp_path / "May_Data_Matrix.xlsx")
+    write_workbook(path)
+    levels = process_sale_levels(path)
+    assert levels == {"group": [{"name": "All Day Menu", "count": 1207, "amount": 15053.0}],
+                      "category": [{"name": "Ramen", "count": 1204, "amount": 15050.0},
+                                   {"name": "Drink", "count": 3, "amount": 3.0}],
+                      "item": [{"name": "Beef Ramen", "count": 1204, "amount": 15050.0},
+                               {"name": "Water", "count": 3, "amount": 3.0}]}
+    assert process_sale_data(path) == (levels["group"], levels["category"] + levels["item"])
+
+@pytest.mark.parametrize("path", SALE_FILE_NAMES[:2])
+def test_cache_gives_back_what_the_parser_does(tmp_path, monkeypatch, path):
+    cache_dir = str(tmp_path / "cache")
+    assert cached_sale_data(path, cache_dir) == process_sale_data(path)
+    parse, encode, decode = data_cache.CODECS["sale"]
+    def fail(path):
+        raise AssertionError("parsed again")
+    monkeypatch.setitem(data_cache.CODECS, "sale", (fail, encode, decode))
+    assert cached_sale_data(path, cache_dir) == process_sale_data(path) #Served from the entry
+    assert cached_sale_levels(path, cache_dir) == process_sale_levels(path) #Same entry, other view
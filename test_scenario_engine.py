@@ -0,0 +1,50 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from calculate_total import calculate_monthly_earnings
+from data_loading import DATA_DIR, SALE_FILE_NAMES
+from ingredient_popularity import get_monthly_ingredient_popularity
+from overall_insights import overall_insights
+from scenario_engine import scenario_engine
+
+@pytest.fixture(scope="module")
+def insights() -> overall_insights:
+    return overall_insights(use_cache=False, sale_file_names=SALE_FILE_NAMES[:2])
+
+@pytest.mark.parametrize("month", [0, 1])
+def test_unchanged_scenario_is_the_real_month(insights, month):
+    engine = scenario_engine.from_insights(insights, month)
+    item_data = insights.get_month_levels(month)["item"]
+    assert engine.base_amounts.sum() == pytest.approx(sum(row["amount"] for row in item_data)) #Item rows only, no category totals
+    result = engine.evaluate(engine.identity(3))
+    assert result["earnings"] == pytest.approx([calculate_monthly_earnings(insights.sales_data[month][0])]*3)
+    usage = get_monthly_ingredient_popularity(item_data, insights.ingredient_data)
+    assert result["ingredient_demand"][0] == pytest.approx([usage[ingredient] for ingredient in engine.ingredients])
+
+def test_changes_move_earnings_by_the_item_amount(insights):
+    engine = scenario_engine.from_insights(insights, 0)
+    amount = engine.base_amounts[engine.item_index["Beef Ramen"]]
+    counts, prices = engine.make_scenarios([{"Beef Ramen": (1.2, 1.0)}, {"Beef Ramen": (0, 1)}, {"Beef Ramen": (1, 1.5)}])
+    change = engine.evaluate(counts, prices)["earnings"] - engine.base_earnings
+    assert change == pytest.approx([0.2*amount, -amount, 0.5*amount])
+
+def test_only_items_sold_this_month_can_change(insights):
+    engine = scenario_engine.from_insights(insights, 0)
+    with pytest.raises(KeyError, match="'Fried Chicken' is not an item sold this month"):
+        engine.make_scenarios([{"Fried Chicken": (0, 1)}]) #A category, not an item
+    with pytest.raises(ValueError):
+        engine.evaluate(np.ones((2, len(engine.items) + 1)))
+
+def test_engine_needs_no_files(tmp_path):
+    directory = str(tmp_path / "data")
+    shutil.copytree(DATA_DIR, directory)
+    insights = overall_insights(use_cache=False, sale_file_names=[os.path.join(directory, os.path.basename(SALE_FILE_NAMES[0]))],
+                                shipment_file_name=os.path.join(directory, "MSY Data - Shipment.csv"),
+                                ingredient_file_name=os.path.join(directory, "MSY Data - Ingredient.csv"))
+    insights.add_month(([{"name": "Total", "count": 2, "amount": 20.0}], [{"name": "Beef Ramen", "count": 2, "amount": 20.0}]), "pos.jsonl#2025-11")
+    shutil.rmtree(directory)
+    assert "Fried Chicken" not in scenario_engine.from_insights(insights, 0).items
+    engine = scenario_engine.from_insights(insights, 1) #A transaction log month is item rows only
+    assert engine.items == ["Beef Ramen"]
+    assert engine.evaluate(engine.identity())["earnings"] == pytest.approx([20.0])
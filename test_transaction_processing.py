@@ -0,0 +1,56 @@
+import json
+import os
+import pytest
+from transaction_processing import get_month, load_checkpoint, process_transaction_log, to_sale_data
+
+def event(timestamp, item:str, quantity, amount) -> str:
+    return json.dumps({"timestamp": timestamp, "item": item, "quantity": quantity, "amount": amount}) + "\n"
+
+def test_checkpoint_resumes_after_the_last_full_line(tmp_path):
+    path, checkpoint = str(tmp_path / "pos.jsonl"), str(tmp_path / "pos.ckpt")
+    with open(path, "w") as f:
+        f.write(event("2025-05-03T12:00:00Z", "Beef Ramen", 2, "$30.00"))
+        f.write("not json\n")
+        f.write('{"timestamp": "2025-05-')
+    complete = os.path.getsize(path) - len('{"timestamp": "2025-05-')
+    state = process_transaction_log(path, checkpoint_path=checkpoint, chunk_size=1)
+    assert state["offset"] == complete #The unterminated line is left for the next call
+    assert state["skipped"] == 1
+    assert state["months"] == {"2025-05": {"Beef Ramen": [2, 30.0]}}
+    assert load_checkpoint(checkpoint, path) == state
+    with open(path, "a") as f:
+        f.write('20T10:00:00Z", "item": "Water", "quantity": 3, "amount": 3}\n')
+        f.write(event("2025-06-01T09:00:00Z", "Beef Ramen", 1, 15))
+    state = process_transaction_log(path, checkpoint_path=checkpoint)
+    assert state["offset"] == os.path.getsize(path)
+    assert state["months"] == {"2025-05": {"Beef Ramen": [2, 30.0], "Water": [3, 3.0]},
+                               "2025-06": {"Beef Ramen": [1, 15.0]}} #Earlier lines aren't counted twice
+    assert process_transaction_log(path, checkpoint_path=checkpoint) == state
+
+def test_checkpoint_of_another_log_is_refused(tmp_path):
+    path, checkpoint = str(tmp_path / "pos.jsonl"), str(tmp_path / "pos.ckpt")
+    with open(path, "w") as f:
+        f.write(event("2025-05-03T12:00:00Z", "Water", 1, 1))
+    process_transaction_log(path, checkpoint_path=checkpoint)
+    with pytest.raises(ValueError, match="belongs to"):
+        process_transaction_log(str(tmp_path / "other.jsonl"), checkpoint_path=checkpoint)
+
+def test_csv_log_matches_jsonl(tmp_path):
+    jsonl, csv = str(tmp_path / "pos.jsonl"), str(tmp_path / "pos.csv")
+    with open(jsonl, "w") as f:
+        f.write(event("2025-05-03T12:00:00Z", "Beef Ramen", 2, "$1,030.00"))
+        f.write(event("2025-05-04T12:00:00Z", "Water", 1, 1))
+    with open(csv, "w", encoding="utf-8-sig") as f:
+        f.write('timestamp,item,quantity,amount\n2025-05-03T12:00:00Z,Beef Ramen,2,"$1,030.00"\n2025-05-04T12:00:00Z,Water,1,1\n')
+    assert process_transaction_log(csv)["months"] == process_transaction_log(jsonl)["months"]
+
+def test_months_are_bucketed_in_utc():
+    assert get_month("2025-05-31T22:00:00-05:00") == "2025-06"
+    assert get_month("2025-06-01T00:30:00+02:00") == "2025-05"
+    assert get_month("2025-05-31T22:00:00") == "2025-05" #Naive times are taken as UTC already
+    assert get_month(1748736000) == "2025-06" #2025-06-01T00:00:00Z
+
+def test_month_totals_have_the_sale_data_shape():
+    group_data, item_data = to_sale_data({"Beef Ramen": [2, 30.0], "Water": [3, 3.0]})
+    assert group_data == [{"name": "All Transactions", "count": 5, "amount": 33.0}]
+    assert item_data == [{"name": "Beef Ramen", "count": 2, "amount": 30.0}, {"name": "Water", "count": 3, "amount": 3.0}]
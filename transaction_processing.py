@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+from datetime import datetime, timezone
+
+#Column / key names in the point-of-sale export, override with the fields argument
+DEFAULT_FIELDS = {"time": "timestamp", "name": "item", "count": "quantity", "amount": "amount"}
+CHUNK_SIZE = 10000
+TOTAL_GROUP_NAME = "All Transactions"
+MONTH_ZONE = timezone.utc #Every timestamp is moved to this zone before it is bucketed, naive ones are taken as already in it
+
+def process_transaction_log(path:str, file_format:str = None, fields:dict = None, chunk_size:int = CHUNK_SIZE,
+                            checkpoint_path:str = None) -> dict:
+    '''Streams a JSONL or CSV transaction log into per-month item totals.
+
+    The file is read line by line in chunks of chunk_size events, so memory stays at one chunk
+    plus one running total per month and item. With checkpoint_path the byte offset and totals are
+    saved after every chunk and a later call picks up where the last one stopped. A last line with no
+    newline yet is treated as still being written: it is left for the next call and the offset stays at its start.
+    Returns {"offset", "skipped", "months": {"YYYY-MM": {name: [count, amount]}}}.
+    '''
+    file_format = file_format or guess_format(path)
+    fields = {**DEFAULT_FIELDS, **(fields or {})}
+    state = load_checkpoint(checkpoint_path, path)
+    if file_format == "jsonl":
+        events = parse_jsonl(read_lines(path, state["offset"]))
+    elif file_format == "csv":
+        header, header_end = read_csv_header(path)
+        events = parse_csv(header, read_lines(path, max(state["offset"], header_end)))
+    else:
+        raise ValueError(f"Unsupported transaction log format '{file_format}', expected 'jsonl' or 'csv'")
+    for chunk in make_chunks(events, chunk_size):
+        aggregate_chunk(state, chunk, fields)
+        if checkpoint_path is not None:
+            save_checkpoint(checkpoint_path, state)
+    return state
+
+def guess_format(path:str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    return "jsonl" if extension in (".jsonl", ".ndjson", ".json") else "csv"
+
+# ---------------------------
+# Generator pipeline: lines -> events -> chunks
+# ---------------------------
+
+def read_lines(path:str, offset:int = 0):
+    '''Yields (line, byte offset just past the line) starting at offset, stopping before an unterminated last line'''
+    with open(path, "rb") as f:
+        f.seek(offset)
+        encoding = "utf-8-sig" if offset == 0 else "utf-8" #Only the very first line can carry a BOM
+        while True:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return #End of file, or a line the writer hasn't finished
+            offset += len(line)
+            yield line.decode(encoding), offset
+            encoding = "utf-8"
+
+def parse_jsonl(lines):
+    '''Yields (event, offset), a line that isn't a JSON object comes through as (None, offset)'''
+    for line, offset in lines:
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        yield (event if isinstance(event, dict) else None), offset
+
+def read_csv_header(path:str) -> tuple:
+    '''(column names, byte offset where the data rows start)'''
+    for line, offset in read_lines(path):
+        return next(csv.reader([line]), []), offset
+    return [], 0
+
+def parse_csv(header:list, lines):
+    '''Same as parse_jsonl for CSV rows, one transaction per line'''
+    for line, offset in lines:
+        if not line.strip():
+            continue
+        row = next(csv.reader([line]))
+        yield (dict(zip(header, row)) if len(row) == len(header) else None), offset
+
+def make_chunks(events, chunk_size:int):
+    '''Groups the event stream into lists of at most chunk_size, each with the offset after its last event'''
+    chunk = []
+    offset = None
+    for event, offset in events:
+        chunk.append(event)
+        if len(chunk) >= chunk_size:
+            yield chunk, offset
+            chunk = []
+    if chunk:
+        yield chunk, offset
+
+# ---------------------------
+# Aggregation
+# ---------------------------
+
+def aggregate_chunk(state:dict, chunk:tuple, fields:dict):
+    events, offset = chunk
+    for event in events:
+        try:
+            month = get_month(event[fields["time"]])
+            name = str(event[fields["name"]]).strip()
+            count = int(float(to_number(event.get(fields["count"], 1))))
+            amount = float(to_number(event.get(fields["amount"], 0)))
+        except (TypeError, KeyError, ValueError):
+            state["skipped"] += 1
+            continue
+        totals = state["months"].setdefault(month, {}).setdefault(name, [0, 0.0])
+        totals[0] += count
+        totals[1] += amount
+    state["offset"] = offset
+
+def get_month(timestamp) -> str:
+    '''"YYYY-MM" in MONTH_ZONE from an ISO date/time string (with or without an offset) or a unix timestamp'''
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp, MONTH_ZONE).strftime("%Y-%m")
+    time = datetime.fromisoformat(str(timestamp).strip().replace("Z", "+00:00"))
+    if time.tzinfo is not None:
+        time = time.astimezone(MONTH_ZONE)
+    return time.strftime("%Y-%m")
+
+def to_number(value):
+    if isinstance(value, str):
+        return value.replace("$", "").replace(",", "")
+    return value
+
+def to_sale_data(month_totals:dict) -> tuple:
+    '''One month of totals in the (group totals, item rows) shape process_sale_data returns'''
+    item_data = [{"name": name, "count": count, "amount": amount} for name, (count, amount) in month_totals.items()]
+    group_data = [{"name": TOTAL_GROUP_NAME, "count": sum(d["count"] for d in item_data),
+                   "amount": sum(d["amount"] for d in item_data)}]
+    return group_data, item_data
+
+# ---------------------------
+# Checkpoints
+# ---------------------------
+
+def load_checkpoint(checkpoint_path:str, path:str) -> dict:
+    state = {"path": os.path.abspath(path), "offset": 0, "skipped": 0, "months": {}}
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return state
+    with open(checkpoint_path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("path") != state["path"]:
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to {saved.get('path')}, not {state['path']}")
+    return saved
+
+def save_checkpoint(checkpoint_path:str, state:dict):
+    tmp_path = f"{checkpoint_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, checkpoint_path)